@@ -0,0 +1,178 @@
+"""Local stand-in for the Loyverse ownercab API, serving deterministic synthetic data"""
+import json
+import time
+import random
+import zlib
+import argparse
+import threading
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+MYT = timezone(timedelta(hours=8))
+WAFFLE_ID = 'ware-waffle'
+TOP_ITEMS = [
+    (WAFFLE_ID, "C1 Original Waffle"),
+    ('ware-latte', "Iced Latte"),
+    ('ware-choc', "Chocolate Waffle"),
+    ('ware-tea', "Teh Tarik"),
+    ('ware-water', "Mineral Water"),
+]
+
+class MockLoyverse:
+    """Synthetic data for a merchant with `outlets` outlets, each with about `receipts` receipts a day"""
+
+    def __init__(self, outlets: int = 100, receipts: int = 150, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 7):
+        self.outlets = [(f"Outlet {index:05d}", f"outlet-{index:05d}") for index in range(outlets)]
+        self.receipts = receipts
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        self.errors = random.Random(seed)
+        self.errors_lock = threading.Lock()
+        # Batched requests regenerate the same outlet-days over and over
+        self.outlet_receipts = lru_cache(maxsize=4096)(self._outlet_receipts)
+
+    def _rng(self, outlet_id: str, day: str) -> random.Random:
+        return random.Random(zlib.crc32(f"{self.seed}:{outlet_id}:{day}".encode()))
+
+    @staticmethod
+    def _day(payload: Dict) -> str:
+        return str(payload.get('startDate', '2024-01-01'))[:10]
+
+    @staticmethod
+    def _day_start_ms(day: str) -> int:
+        return int(datetime.fromisoformat(day).replace(tzinfo=MYT).timestamp() * 1000)
+
+    def _outlet_ids(self, payload: Dict) -> List[str]:
+        outlet_ids = payload.get('outletsIds')
+        if outlet_ids == 'all' or not outlet_ids:
+            return [outlet_id for _, outlet_id in self.outlets]
+        return list(outlet_ids)
+
+    def _outlet_receipts(self, outlet_id: str, day: str) -> List[Dict]:
+        """One outlet's receipts for a day, oldest first, between 8am and 11pm"""
+        rng = self._rng(outlet_id, day)
+        start = self._day_start_ms(day)
+        count = max(0, int(rng.gauss(self.receipts, self.receipts / 5)))
+        stamps = sorted(start + rng.randint(8 * 3600, 23 * 3600 - 1) * 1000 for _ in range(count))
+        receipts = []
+        for index, stamp in enumerate(stamps):
+            lines = [{'wareId': ware_id, 'name': name, 'quantity': 1, 'netSales': rng.randint(500, 2500)}
+                     for ware_id, name in rng.sample(TOP_ITEMS, rng.randint(1, 3))]
+            receipts.append({
+                'receiptId': f"{outlet_id}-{day}-{index}",
+                'outletId': outlet_id,
+                'dateTS': stamp,
+                'totalSum': sum(line['netSales'] for line in lines),
+                'lineItems': lines,
+            })
+        return receipts
+
+    def earnings_report(self, payload: Dict) -> Dict:
+        day = self._day(payload)
+        start = self._day_start_ms(day)
+        hours = [0] * 24
+        for outlet_id in self._outlet_ids(payload):
+            for receipt in self.outlet_receipts(outlet_id, day):
+                hours[(receipt['dateTS'] - start) // 3600000] += receipt['totalSum']
+        return {'earningsRows': [{'from': start + hour * 3600000, 'to': start + (hour + 1) * 3600000 - 1,
+                                  'earningsSum': total} for hour, total in enumerate(hours)]}
+
+    def receipts_archive(self, payload: Dict) -> Dict:
+        day = self._day(payload)
+        receipts = [receipt for outlet_id in self._outlet_ids(payload)
+                    for receipt in self.outlet_receipts(outlet_id, day)]
+        receipts.sort(key=lambda receipt: -receipt['dateTS'])
+        offset, limit = int(payload.get('offset', 0)), int(payload.get('limit', 200))
+        return {'receipts': receipts[offset:offset + limit]}
+
+    def wares_report(self, payload: Dict) -> Dict:
+        day = self._day(payload)
+        start = self._day_start_ms(day)
+        sales = {ware_id: [0] * 24 for ware_id, _ in TOP_ITEMS}
+        for outlet_id in self._outlet_ids(payload):
+            for receipt in self.outlet_receipts(outlet_id, day):
+                for line in receipt['lineItems']:
+                    sales[line['wareId']][(receipt['dateTS'] - start) // 3600000] += line['netSales']
+        return {
+            'top5': [{'id': ware_id, 'name': name} for ware_id, name in TOP_ITEMS],
+            'periodsByWare': [{'wareId': ware_id, 'periodsByWare': [
+                {'from': start + hour * 3600000, 'to': start + (hour + 1) * 3600000 - 1, 'netSales': net}
+                for hour, net in enumerate(sales[ware_id])]} for ware_id, _ in TOP_ITEMS],
+        }
+
+    def outlets_list(self, payload: Dict) -> Dict:
+        return {'outlets': [{'id': outlet_id, 'name': name} for name, outlet_id in self.outlets]}
+
+    def should_fail(self) -> bool:
+        with self.errors_lock:
+            return self.errors.random() < self.error_rate
+
+    ROUTES = {
+        'getearningsreport': earnings_report,
+        'getreceiptsarchive': receipts_archive,
+        'getwaresreport': wares_report,
+        'getoutletslist': outlets_list,
+    }
+
+def make_handler(mock: MockLoyverse):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if mock.latency_ms:
+                time.sleep(mock.latency_ms / 1000)
+            route = MockLoyverse.ROUTES.get(self.path.rstrip('/').rsplit('/', 1)[-1])
+            if route is None:
+                return self._send(404, {'error': 'not found'})
+            if mock.should_fail():
+                return self._send(503, {'error': 'injected failure'}, {'Retry-After': '0'})
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                return self._send(400, {'error': 'bad json'})
+            self._send(200, route(mock, payload))
+
+        def _send(self, status: int, body: Dict, headers: Dict = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_server(mock: MockLoyverse, port: int = 0) -> ThreadingHTTPServer:
+    """Serve the mock on 127.0.0.1 in a daemon thread; the base URL is http://127.0.0.1:<port>/data/ownercab"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/data/ownercab"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Loyverse ownercab API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--outlets', type=int, default=100)
+    parser.add_argument('--receipts', type=int, default=150, help="Mean receipts per outlet per day")
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    server = start_server(MockLoyverse(args.outlets, args.receipts, args.latency_ms, args.error_rate), args.port)
+    print(f"Mock Loyverse API at {base_url(server)} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
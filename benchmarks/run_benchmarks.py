@@ -0,0 +1,129 @@
+"""
+Offline throughput benchmark: the real fetch-and-write pipeline against the mock Loyverse server
+
+    python -m benchmarks.run_benchmarks --sizes 10 100 1000 5000 --latency-ms 20 --error-rate 0.01
+
+Each size runs in its own subprocess so peak RSS is measured per run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from typing import Dict, List
+
+from benchmarks.mock_server import MockLoyverse, start_server, base_url
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+REPORT_DATE = '2024-03-01'
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def worker(outlets: int, workbook_dir: str) -> Dict:
+    """Fetch every outlet and write the workbook in this process; LOYVERSE_API_BASE points at the mock"""
+    import requests
+    from src.config import Config
+    from src.scraper import LoyverseScraper, write_workbook
+    from src.utils.tracing import tracer
+
+    config = Config()
+    account = {'email': 'bench@example.com', 'password': '', 'invalid_outlets': []}
+    scraper = LoyverseScraper(account, config, None)
+    scraper.req = requests.session()
+    scraper.cookie = 'bench=1'
+    scraper.name_ids = [(f"Outlet {index:05d}", f"outlet-{index:05d}") for index in range(outlets)]
+    scraper.start_date = scraper.end_date = REPORT_DATE
+
+    start = time.perf_counter()
+    scraper.get_earnings_report()
+    fetched = time.perf_counter()
+    write_workbook(os.path.join(workbook_dir, f"bench_{outlets}.xlsx"), [('bench', scraper)])
+    finished = time.perf_counter()
+
+    latencies = [span['seconds'] for span in tracer.spans if span['name'].startswith('ownercab ')]
+    return {
+        'outlets': outlets,
+        'engine': config.fetch_engine,
+        'fetch_s': round(fetched - start, 3),
+        'write_s': round(finished - fetched, 3),
+        'outlets_per_s': round(outlets / (finished - start), 1),
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'failed': len(scraper.fail_list),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+def run_size(outlets: int, args) -> Dict:
+    """Start a mock for this size and run one worker subprocess against it"""
+    server = start_server(MockLoyverse(outlets, args.receipts, args.latency_ms, args.error_rate))
+    env = dict(os.environ,
+               LOYVERSE_API_BASE=base_url(server),
+               FETCH_ENGINE=args.engine,
+               CACHE_TTL_HOURS='0',
+               SESSION_STORE_KEY='',
+               LOYVERSE_ACCOUNTS='[]')
+    try:
+        with tempfile.TemporaryDirectory() as workbook_dir:
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.run_benchmarks', '--worker', str(outlets),
+                 '--workbook-dir', workbook_dir],
+                env=env, capture_output=True, text=True, timeout=args.timeout)
+    finally:
+        server.shutdown()
+    if completed.returncode != 0:
+        print(completed.stdout[-2000:])
+        print(completed.stderr[-2000:])
+        raise RuntimeError(f"Benchmark worker for {outlets} outlets exited with {completed.returncode}")
+    # The pipeline prints progress; the result is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def print_results(results: List[Dict]) -> None:
+    print(f"\n{'outlets':>8}{'engine':>8}{'outlets/s':>11}{'fetch s':>9}{'write s':>9}{'requests':>10}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'failed':>8}{'RSS MB':>9}")
+    for row in results:
+        print(f"{row['outlets']:>8}{row['engine']:>8}{row['outlets_per_s']:>11.1f}{row['fetch_s']:>9.2f}"
+              f"{row['write_s']:>9.2f}{row['requests']:>10}{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+              f"{row['failed']:>8}{row['peak_rss_mb']:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local mock Loyverse API")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Outlet counts to run")
+    parser.add_argument('--receipts', type=int, default=150, help="Mean receipts per outlet per day")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latency injected into every response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument('--engine', choices=['async', 'threads'], default='async')
+    parser.add_argument('--timeout', type=float, default=1800, help="Seconds before a single size is abandoned")
+    parser.add_argument('--output', help="Also save the results as JSON here")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workbook-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.workbook_dir or tempfile.gettempdir())))
+        return
+
+    results = []
+    for outlets in args.sizes:
+        print(f"Benchmarking {outlets} outlets ({args.engine})...")
+        results.append(run_size(outlets, args))
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
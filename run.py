@@ -1,4 +1,4 @@
-from src.scraper import main
+from src.cli import cli
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    cli()
@@ -0,0 +1,134 @@
+"""
+Command line entry point
+
+Only argparse and the configuration load here; the scraper (selenium, requests, aiohttp, xlsxwriter) is imported
+by the commands that scrape, so `config`, `history`, `cube`, `merge`, `enqueue`, `rebuild` and `send` start in
+well under a second.
+"""
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from src.config import load_env
+from src.utils.shards import parse_shard
+
+def yesterday() -> str:
+    return str(date.today() - timedelta(days=1))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Loyverse daily report scraper")
+    parser.add_argument('--date', help="Report day of the daily run, YYYY-MM-DD (default yesterday)")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="Fetch only shard I of N and write it to SHARD_DIR instead of producing the report")
+    parser.add_argument('--shard-by', choices=['account', 'outlet'], default='account',
+                        help="Split accounts between shards (default), or every account's outlets")
+    subcommands = parser.add_subparsers(dest='command')
+    backfill_parser = subcommands.add_parser('backfill', help="Produce reports for a range of past days")
+    backfill_parser.add_argument('start_date', help="First day, YYYY-MM-DD")
+    backfill_parser.add_argument('end_date', help="Last day, YYYY-MM-DD")
+    backfill_parser.add_argument('--single-workbook', action='store_true',
+                                 help="One workbook with a sheet per account and day")
+    sync_parser = subcommands.add_parser('sync', help="Fetch the days missing from the history store")
+    sync_parser.add_argument('--until', default=yesterday(), help="Last day, YYYY-MM-DD (default yesterday)")
+    sync_parser.add_argument('--days', type=int, default=90, help="How far back to fill (default 90)")
+    history_parser = subcommands.add_parser('history', help="Show an outlet's stored days, offline")
+    history_parser.add_argument('outlet', help="Outlet name or id")
+    history_parser.add_argument('--days', type=int, default=90)
+    history_parser.add_argument('--until', help="Last day, YYYY-MM-DD (default yesterday)")
+    cube_parser = subcommands.add_parser('cube', help="Aggregate hourly sales over a date range, offline")
+    cube_parser.add_argument('start_date', help="First day, YYYY-MM-DD")
+    cube_parser.add_argument('end_date', help="Last day, YYYY-MM-DD")
+    cube_parser.add_argument('--outlet', help="Only this outlet (name or id)")
+    cube_parser.add_argument('--by', choices=['outlet', 'day', 'hour'], default='outlet')
+    subcommands.add_parser('config', help="Validate the configuration and exit")
+    rebuild_parser = subcommands.add_parser('rebuild', help="Write a day's workbook again from the history store")
+    rebuild_parser.add_argument('--date', default=yesterday(), help="Report day, YYYY-MM-DD (default yesterday)")
+    shards_parser = subcommands.add_parser('shards', help="Run N shards as local processes, then merge them")
+    shards_parser.add_argument('count', type=int, help="Number of shards")
+    shards_parser.add_argument('--by', choices=['account', 'outlet'], default='account')
+    shards_parser.add_argument('--date', default=yesterday(), help="Report day, YYYY-MM-DD (default yesterday)")
+    shards_parser.add_argument('--no-send', action='store_true', help="Do not email the merged report")
+    merge_parser = subcommands.add_parser('merge', help="Combine shard files into the day's workbook")
+    merge_parser.add_argument('--date', default=yesterday(), help="Report day, YYYY-MM-DD (default yesterday)")
+    merge_parser.add_argument('--allow-partial', action='store_true', help="Merge even when shards are missing")
+    merge_parser.add_argument('--no-send', action='store_true', help="Do not email the merged report")
+    subcommands.add_parser('daemon', help="Stay logged in and run jobs from the local queue")
+    enqueue_parser = subcommands.add_parser('enqueue', help="Queue a job for the daemon")
+    jobs = enqueue_parser.add_subparsers(dest='kind', required=True)
+    daily_job = jobs.add_parser('daily', help="The daily report")
+    daily_job.add_argument('--date', dest='report_date', help="Report day, YYYY-MM-DD (default yesterday)")
+    backfill_job = jobs.add_parser('backfill', help="Reports for a range of past days")
+    backfill_job.add_argument('start_date', help="First day, YYYY-MM-DD")
+    backfill_job.add_argument('end_date', help="Last day, YYYY-MM-DD")
+    backfill_job.add_argument('--single-workbook', action='store_true')
+    outlet_job = jobs.add_parser('outlet', help="Fetch one outlet for one day")
+    outlet_job.add_argument('outlet', help="Outlet name or id")
+    outlet_job.add_argument('--date', dest='report_date', help="Report day, YYYY-MM-DD (default yesterday)")
+    outlet_job.add_argument('--account', help="Only look in this account (email)")
+    subcommands.add_parser('jobs', help="Show the daemon's queue")
+    send_parser = subcommands.add_parser('send', help="Email an already produced report")
+    send_parser.add_argument('--date', default=yesterday(), help="Report day, YYYY-MM-DD (default yesterday)")
+    return parser
+
+def cli(argv: Optional[List[str]] = None):
+    """The daily report by default, or one of the subcommands"""
+    load_env()
+    args = build_parser().parse_args(argv)
+
+    if args.command in ('history', 'cube', 'config', 'rebuild', 'merge', 'shards', 'enqueue', 'jobs', 'send'):
+        from src import offline
+        if args.command == 'history':
+            offline.print_history(args.outlet, args.days, args.until)
+        elif args.command == 'cube':
+            offline.print_cube(args.start_date, args.end_date, args.outlet, args.by)
+        elif args.command == 'config':
+            if not offline.validate_config():
+                print("\nConfiguration test failed!")
+                sys.exit(1)
+            print("\nConfiguration test passed!")
+        elif args.command == 'rebuild':
+            if offline.rebuild_report(args.date) is None:
+                sys.exit(1)
+        elif args.command == 'merge':
+            if offline.merge_shards(args.date, args.allow_partial, not args.no_send) is None:
+                sys.exit(1)
+        elif args.command == 'shards':
+            from src.utils.shards import run_local
+            failed = run_local(args.count, args.by, args.date)
+            # A failed shard leaves no file, so merge refuses to write an incomplete report
+            if failed or offline.merge_shards(args.date, send=not args.no_send) is None:
+                sys.exit(1)
+        elif args.command == 'enqueue':
+            params = {key: value for key, value in vars(args).items()
+                      if key not in ('command', 'kind', 'date', 'shard', 'shard_by') and value is not None}
+            offline.enqueue_job(args.kind, **params)
+        elif args.command == 'jobs':
+            offline.print_jobs()
+        elif not offline.send_existing_report(args.date):
+            sys.exit(1)
+        return
+
+    if args.command == 'daemon':
+        from src.daemon import serve
+        serve()
+        return
+
+    from src import scraper
+    from src.utils.waits import print_wait_summary
+    start_time = time.time()
+    print(f"Start time {datetime.now()} ...")
+    if args.command == 'backfill':
+        scraper.backfill(args.start_date, args.end_date, args.single_workbook)
+    elif args.command == 'sync':
+        scraper.sync_history(args.until, args.days)
+    elif args.shard:
+        scraper.run_shard(args.shard, args.shard_by, args.date)
+    else:
+        scraper.main(args.date)
+    print_wait_summary()
+    print("--- %s minutes ---" % ((time.time() - start_time) // 60))
+
+if __name__ == "__main__":
+    cli()
@@ -1,14 +1,20 @@
 import os
 import json
 from typing import List, Dict
-from dotenv import load_dotenv
-from selenium.webdriver.chrome.options import Options
 
-# Load environment variables from .env file
-load_dotenv()
+_env_loaded = False
+
+def load_env():
+    """Load environment variables from the .env file, once; done on first use rather than on import"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
 
 class Config:
     def __init__(self):
+        load_env()
         self.accounts = self._load_accounts()
         self.twocaptcha_api_key = os.getenv('TWOCAPTCHA_API_KEY')
         self.email_config = {
@@ -16,7 +22,46 @@ class Config:
             'password': os.getenv('EMAIL_PASSWORD'),
             'recipients': os.getenv('EMAIL_RECIPIENTS', '').split(',')
         }
-        self.chrome_options = self._get_chrome_options()
+        self._chrome_options = None
+        self.session_store_dir = os.getenv('SESSION_STORE_DIR', '.sessions')
+        self.session_store_key = os.getenv('SESSION_STORE_KEY')
+        self.max_accounts = int(os.getenv('MAX_CONCURRENT_ACCOUNTS', '3'))
+        self.max_browsers = int(os.getenv('MAX_CONCURRENT_BROWSERS', '2'))
+        self.api_workers = int(os.getenv('API_WORKERS', '10'))
+        self.fetch_engine = os.getenv('FETCH_ENGINE', 'async').lower()
+        self.outlet_batch_size = int(os.getenv('OUTLET_BATCH_SIZE', '20'))
+        self.backfill_workers = int(os.getenv('BACKFILL_WORKERS', '3'))
+        self.metrics_source = os.getenv('METRICS_SOURCE', 'endpoints').lower()
+        self.metrics_cross_check = int(os.getenv('METRICS_CROSS_CHECK', '3'))
+        self.alert_rules = [name.strip().lower() for name in os.getenv(
+            'ALERT_RULES', 'flatline,zero_hours,baseline,late_open,early_close,waffle_gap').split(',') if name.strip()]
+        self.alert_zero_hours = int(os.getenv('ALERT_ZERO_HOURS', '2'))
+        self.alert_baseline_weeks = int(os.getenv('ALERT_BASELINE_WEEKS', '4'))
+        self.alert_baseline_drop = float(os.getenv('ALERT_BASELINE_DROP', '0.5'))
+        self.alert_open_by = os.getenv('ALERT_OPEN_BY', '10:00 AM')
+        self.alert_close_after = os.getenv('ALERT_CLOSE_AFTER', '09:30 PM')
+        self.alert_waffle_gap_minutes = float(os.getenv('ALERT_WAFFLE_GAP_MINUTES', '30'))
+        self.cache_dir = os.getenv('CACHE_DIR', '.cache')
+        self.cache_ttl_hours = float(os.getenv('CACHE_TTL_HOURS', '24'))
+        self.cache_max_mb = float(os.getenv('CACHE_MAX_MB', '200'))
+        self.retry_pass = os.getenv('RETRY_PASS', 'true').lower() == 'true'
+        self.capture_mode = os.getenv('CAPTURE_MODE', 'cdp').lower()
+        self.browser_profile_dir = os.getenv('BROWSER_PROFILE_DIR', '.profiles')
+        self.captcha_prefetch = os.getenv('CAPTCHA_PREFETCH', 'false').lower() == 'true'
+        self.captcha_cost_per_solve = float(os.getenv('CAPTCHA_COST_PER_SOLVE', '0.00299'))
+        self.trace_dir = os.getenv('TRACE_DIR', '.traces')
+        self.cassette_mode = os.getenv('CASSETTE_MODE', 'off').lower()
+        self.cassette_dir = os.getenv('CASSETTE_DIR', '.cassettes')
+        self.cassette_timing = float(os.getenv('CASSETTE_TIMING', '0'))
+        self.history_db = os.getenv('HISTORY_DB', os.path.join('.history', 'sales.db'))
+        self.cube_dir = os.getenv('CUBE_DIR', os.path.join('.history', 'cube'))
+        self.shard_dir = os.getenv('SHARD_DIR', 'shards')
+        self.queue_dir = os.getenv('QUEUE_DIR', '.queue')
+        self.daemon_poll_seconds = float(os.getenv('DAEMON_POLL_SECONDS', '5'))
+        self.daemon_refresh_minutes = float(os.getenv('DAEMON_REFRESH_MINUTES', '20'))
+        self.daemon_relogin_hours = float(os.getenv('DAEMON_RELOGIN_HOURS', '12'))
+        self.export_formats = [name.strip().lower() for name in os.getenv('EXPORT_FORMATS', '').split(',')
+                               if name.strip()]
         
         # Validate configuration
         self._validate_config()
@@ -37,8 +82,16 @@ class Config:
             print(f"Raw LOYVERSE_ACCOUNTS value: {accounts_json[:100]}...")  # Print first 100 chars for debugging
             return []
 
-    def _get_chrome_options(self) -> Options:
+    @property
+    def chrome_options(self):
+        """Chrome options, built on first use so commands without a browser never import selenium"""
+        if self._chrome_options is None:
+            self._chrome_options = self._get_chrome_options()
+        return self._chrome_options
+
+    def _get_chrome_options(self):
         """Configure Chrome options for both local and CI environments"""
+        from selenium.webdriver.chrome.options import Options
         options = Options()
         
         # Basic options for both environments
@@ -77,6 +130,12 @@ class Config:
         else:
             print("✓ 2captcha API key configured")
         
+        # Check session store
+        if not self.session_store_key:
+            print("❌ No session store key configured (browser login every run)")
+        else:
+            print(f"✓ Session store enabled ({self.session_store_dir})")
+        
         # Check email configuration
         email_status = []
         if not self.email_config['username']:
@@ -92,4 +151,17 @@ class Config:
             for status in email_status:
                 print(status)
         
+        print(f"✓ Concurrency: {self.max_accounts} account(s), {self.max_browsers} browser(s), "
+              f"{self.api_workers} API worker(s) per account, {self.fetch_engine} fetch engine")
+        if self.metrics_source == 'receipts':
+            print(f"✓ Metrics derived from receipts (first {self.metrics_cross_check} outlet(s) cross-checked)")
+        
+        if self.export_formats:
+            print(f"✓ Exporting {', '.join(self.export_formats)} alongside the workbook")
+        
+        if self.cassette_mode in ('record', 'replay'):
+            print(f"✓ Cassette {self.cassette_mode} mode ({self.cassette_dir})")
+        elif self.cassette_mode != 'off':
+            print(f"❌ Unknown CASSETTE_MODE '{self.cassette_mode}' (use off, record or replay)")
+        
         print("-" * 50)
\ No newline at end of file
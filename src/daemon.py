@@ -0,0 +1,206 @@
+import os
+import time
+import signal
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from src.config import Config
+from src.utils.browser_pool import BrowserPool
+from src.utils.exporters import close_exporters, create_exporters
+from src.utils.job_queue import JobQueue
+from src.utils.layout import report_filename
+from src.utils.tracing import tracer
+from src.scraper import (
+    LoyverseScraper, email_report, history_store, pending_days, produce_reports, range_workbook_name,
+    report_trace, response_cache, run_accounts, run_day_jobs, sales_cube,
+)
+
+def yesterday() -> str:
+    return str(date.today() - timedelta(days=1))
+
+class ReportDaemon:
+    """
+    Resident service: keeps every account logged in and runs jobs from the local queue with no per-job startup
+
+    The browser pool, the authenticated requests sessions, the history store and the sales cube stay open
+    between jobs. A session is logged in again once it is DAEMON_RELOGIN_HOURS old, before it can expire,
+    and probed every DAEMON_REFRESH_MINUTES in between so one the server dropped early is replaced too.
+    A job rarely waits for a login.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.queue = JobQueue(config.queue_dir)
+        self.browser_pool = BrowserPool(config, config.max_browsers)
+        self.history = history_store(config)
+        self.cube = sales_cube(config)
+        self.accounts: Dict[str, LoyverseScraper] = {}
+        self.checked_at: Dict[str, float] = {}
+        self.stopping = threading.Event()
+
+    def login(self, accounts: List[Dict], fresh: bool = False) -> None:
+        """
+        Authenticate accounts in parallel through the shared pool; failures stay cold until the next refresh
+
+        A saved session is reused only while it is younger than DAEMON_RELOGIN_HOURS (and passes its probe);
+        fresh always logs in with the browser.
+        """
+        for scraper in run_accounts(self.config, yesterday(), step='relogin' if fresh else 'authenticate',
+                                    browser_pool=self.browser_pool, history=self.history, cube=self.cube,
+                                    accounts=accounts):
+            self.checked_at[scraper.email] = time.time()
+            if scraper.error is None and scraper.req is not None and scraper.name_ids:
+                self.accounts[scraper.email] = scraper
+            else:
+                self.accounts.pop(scraper.email, None)
+        aged = [account for account in accounts if self.session_age(account['email']) >= self.relogin_seconds()]
+        if aged and not fresh:
+            print(f"Saved session(s) for {', '.join(account['email'] for account in aged)} are due for renewal")
+            self.login(aged, fresh=True)
+
+    def relogin_seconds(self) -> float:
+        return self.config.daemon_relogin_hours * 3600
+
+    def session_age(self, email: str) -> float:
+        """Seconds since the account's session was created by a login; 0 without a session or a known login time"""
+        scraper = self.accounts.get(email)
+        if scraper is None or scraper.logged_in_at is None:
+            return 0
+        return time.time() - scraper.logged_in_at
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Log in again every session that reached DAEMON_RELOGIN_HOURS, before the server expires it
+
+        The rest are probed when not checked for DAEMON_REFRESH_MINUTES and logged in again if the probe fails;
+        an account without a session is retried on the same schedule.
+        """
+        renew = [account for account in self.config.accounts if account['email'] in self.accounts
+                 and self.session_age(account['email']) >= self.relogin_seconds()]
+        due = [account for account in self.config.accounts
+               if account not in renew and (force or time.time() - self.checked_at.get(account['email'], 0)
+                                            >= self.config.daemon_refresh_minutes * 60)]
+        for account in renew:
+            print(f"Session for {account['email']} is {self.session_age(account['email']) / 3600:.1f}h old, "
+                  f"logging in again")
+        stale = []
+        for account in due:
+            scraper = self.accounts.get(account['email'])
+            if scraper is not None:
+                scraper.start_date = scraper.end_date = yesterday()
+                with tracer.span('session probe', account=scraper.email) as span:
+                    span['ok'] = bool(scraper.name_ids) and scraper.probe_session()
+                self.checked_at[scraper.email] = time.time()
+                if span['ok']:
+                    continue
+                print(f"Session for {scraper.email} expired, logging in again")
+            stale.append(account)
+        if renew or stale:
+            self.login(renew + stale, fresh=True)
+
+    def warm(self) -> List[LoyverseScraper]:
+        """Authenticated scrapers in account order, after logging in any that went cold"""
+        self.refresh()
+        missing = [account['email'] for account in self.config.accounts if account['email'] not in self.accounts]
+        if missing:
+            print(f"No session for {', '.join(missing)}, skipped in this job")
+        return [self.accounts[account['email']] for account in self.config.accounts
+                if account['email'] in self.accounts]
+
+    def run_daily(self, report_date: Optional[str] = None) -> str:
+        """The daily report for one day: workbook, exports, history, cube and email"""
+        report_date = report_date or yesterday()
+        workbook_name = report_filename(report_date)
+        exporters = create_exporters(self.config.export_formats, os.path.splitext(workbook_name)[0])
+        produce_reports(self.config, self.warm(), [report_date], exporters=exporters)
+        close_exporters(exporters)
+        email_report(self.config, workbook_name)
+        return workbook_name
+
+    def run_backfill(self, start_date: str, end_date: str, single_workbook: bool = False) -> str:
+        """Reports for a range of days whose workbook does not exist yet, without emailing them"""
+        pending = pending_days(start_date, end_date, single_workbook)
+        if not pending:
+            return "nothing to backfill"
+        exporters = create_exporters(self.config.export_formats, f"barHarian_{start_date}_{end_date}")
+        produce_reports(self.config, self.warm(), pending,
+                        range_workbook_name(start_date, end_date) if single_workbook else None, exporters,
+                        require_complete=True)
+        close_exporters(exporters)
+        return f"{len(pending)} day(s)"
+
+    def run_outlet(self, outlet: str, report_date: Optional[str] = None, account: Optional[str] = None) -> str:
+        """Fetch one outlet (name or id) for one day and print its report row; it is also stored in the history"""
+        report_date = report_date or yesterday()
+        jobs = []
+        for warm in self.warm():
+            if account and warm.email != account:
+                continue
+            matches = [nameID for nameID in warm.name_ids if outlet in nameID]
+            if matches:
+                scraper = warm.for_date(report_date)
+                scraper.name_ids = matches
+                jobs.append((report_date, scraper))
+        if not jobs:
+            raise ValueError(f"No outlet {outlet} in any logged-in account")
+        run_day_jobs(self.config, jobs)
+        rows = [row for _, scraper in jobs for row in scraper.output_lists[1:]]
+        for row in rows:
+            print("Outlet row:", row)
+        failed = sum(len(scraper.fail_list) for _, scraper in jobs)
+        return f"{len(rows)} row(s), {failed} failed"
+
+    def run_job(self, job: Dict) -> None:
+        """Run one queued job; its trace is written on its own and the stores are flushed after it"""
+        handlers = {'daily': self.run_daily, 'backfill': self.run_backfill, 'outlet': self.run_outlet}
+        print(f"\nRunning {job['kind']} job {job['id']} {job['params']}")
+        tracer.reset()
+        started = time.time()
+        try:
+            with tracer.span('job', kind=job['kind']):
+                message = handlers[job['kind']](**job['params'])
+            ok = True
+        except Exception as e:
+            print(f"Job {job['id']} failed: {type(e).__name__}: {str(e)}")
+            message, ok = f"{type(e).__name__}: {str(e)}", False
+        for store in (self.history, self.cube):
+            if store:
+                store.flush()
+        if response_cache(self.config):
+            response_cache(self.config).evict()
+        self.queue.finish(job, ok, message)
+        print(f"Job {job['id']} {'done' if ok else 'failed'} in {time.time() - started:.1f}s: {message}")
+        report_trace(self.config)
+
+    def serve(self) -> None:
+        """Log every account in, then run queued jobs until SIGTERM or Ctrl-C; the current job always finishes"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self.stopping.set())
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"Requeued {requeued} job(s) left running by a previous daemon")
+        self.login(self.config.accounts)
+        print(f"Daemon ready: {len(self.accounts)}/{len(self.config.accounts)} account(s) logged in, "
+              f"watching {self.config.queue_dir}")
+        try:
+            while not self.stopping.is_set():
+                job = self.queue.claim()
+                if job is not None:
+                    self.run_job(job)
+                    continue
+                # Idle: keep the sessions fresh so the next job starts straight away
+                self.refresh()
+                self.stopping.wait(self.config.daemon_poll_seconds)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        print("Daemon stopping")
+        self.browser_pool.close_all()
+        for store in (self.history, self.cube):
+            if store:
+                store.close()
+
+def serve():
+    ReportDaemon(Config()).serve()
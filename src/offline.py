@@ -0,0 +1,207 @@
+"""
+Commands that never open a browser or call Loyverse: history and cube queries, merging shards,
+rebuilding and sending reports
+
+Heavy dependencies (numpy, xlsxwriter, smtplib) are imported inside the command that needs them.
+"""
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from src.config import Config
+from src.utils.layout import header_row, report_filename, sheet_name
+from src.utils.tracing import tracer
+
+def print_history(outlet: str, days: int = 90, until: Optional[str] = None):
+    """Print an outlet's stored days straight from the history store (no network)"""
+    from src.utils.exporters import HOUR_COLUMNS
+    from src.utils.history import HistoryStore
+    config = Config()
+    until = until or str(date.today() - timedelta(days=1))
+    history = HistoryStore(config.history_db)
+    rows = history.outlet_history(outlet, str(date.fromisoformat(until) - timedelta(days=days - 1)), until)
+    history.close()
+    if not rows:
+        print(f"No stored history for {outlet}")
+        return
+    print(f"{'date':<12}{'account':<24}{'start':>7}{'waffle':>8}{'end':>7}{'sales':>11}  alert")
+    for row in rows:
+        start, waffle, end = (row[column][11:16] if row[column] else '-'
+                              for column in ('sales_start', 'waffle_end', 'sales_end'))
+        total = sum(row[column] or 0 for column in HOUR_COLUMNS)
+        print(f"{row['report_date']:<12}{row['account'][:23]:<24}{start:>7}{waffle:>8}{end:>7}{total:>11.2f}  "
+              f"{'yes' if row['alert'] else ''}")
+
+def print_cube(start_date: str, end_date: str, outlet: Optional[str] = None, by: str = 'outlet'):
+    """Aggregate a date range of the sales cube by outlet, day or hour (memory-mapped, no network)"""
+    import numpy as np
+    from src.utils.cube import SalesCube
+    from src.utils.ownercab import FIRST_HOUR, LAST_HOUR
+    config = Config()
+    if not config.cube_dir:
+        print("CUBE_DIR is empty, no sales cube to read")
+        return
+    cube = SalesCube(config.cube_dir)
+    outlets = cube.outlet_numbers_matching(outlet) if outlet else None
+    if outlets == []:
+        print(f"No outlet {outlet} in the sales cube")
+        return
+    with tracer.span('cube query', by=by) as span:
+        entries, dates, values = cube.query(start_date, end_date, outlets)
+        span['cells'] = int(values.size)
+    if not entries:
+        print(f"No sales stored between {start_date} and {end_date}")
+        return
+    if by == 'day':
+        labels, totals = dates, np.nansum(values, axis=(0, 2))
+    elif by == 'hour':
+        labels, totals = [f"{hour}:00" for hour in range(FIRST_HOUR, LAST_HOUR)], np.nansum(values, axis=(0, 1))
+    else:
+        labels, totals = [entry['name'] for entry in entries], np.nansum(values, axis=(1, 2))
+    days_stored = int((~np.isnan(values[:, :, 0])).sum())
+    print(f"{len(entries)} outlet(s), {len(dates)} day(s), {days_stored} outlet-day(s) stored")
+    for label, total in zip(labels, totals):
+        print(f"{label:<32}{total:>14.2f}")
+
+def validate_config() -> bool:
+    """Load the configuration (it prints what it found); True when there is at least one account"""
+    return len(Config().accounts) > 0
+
+def rebuild_report(report_date: str) -> Optional[str]:
+    """
+    Write barHarian_<date>.xlsx again from the history store, one sheet per configured account
+
+    Returns:
+        The workbook name, or None when the history store has nothing for that day
+    """
+    from src.utils.excel import SheetWriter, create_workbook
+    from src.utils.history import HistoryStore
+    config = Config()
+    if not config.history_db:
+        print("HISTORY_DB is empty, nothing to rebuild from")
+        return None
+    history = HistoryStore(config.history_db)
+    rows = history.report_rows(report_date)
+    history.close()
+    if not rows:
+        print(f"No stored rows for {report_date}")
+        return None
+    # Configured accounts first, in their usual order, then any account only the history knows
+    emails = [account['email'] for account in config.accounts]
+    emails += [email for email in rows if email not in emails]
+    workbook_name = report_filename(report_date)
+    with tracer.span('excel write', workbook=workbook_name) as span:
+        workbook = create_workbook(workbook_name)
+        for email in emails:
+            sheet = SheetWriter(workbook, sheet_name(email), waffle_gap_minutes=config.alert_waffle_gap_minutes)
+            for row in [header_row()] + rows.get(email, []):
+                sheet.write_row(row)
+            sheet.close()
+            span['rows'] = span.get('rows', 0) + sheet.rows
+        workbook.close()
+    print(f"Rebuilt {workbook_name} from {sum(len(account_rows) for account_rows in rows.values())} stored row(s)")
+    return workbook_name
+
+def merge_shards(report_date: str, allow_partial: bool = False, send: bool = True) -> Optional[str]:
+    """
+    Combine the shard files of a day into barHarian_<date>.xlsx, then export, store and email it like a normal run
+
+    Sheets come out in account order and rows in outlet order whichever shard finished first.
+    Returns the workbook name, or None when shards are missing (unless allow_partial) or there are none.
+    """
+    from src.utils.shards import load_partials, merge_partials, partial_path
+    config = Config()
+    partials = load_partials(config.shard_dir, report_date)
+    if not partials:
+        print(f"No shard files for {report_date} in {config.shard_dir}")
+        return None
+    try:
+        accounts, missing = merge_partials(partials)
+    except ValueError as e:
+        # Usually shard files left over from an earlier run split into a different number of shards
+        print(f"Cannot merge {report_date}: {str(e)}")
+        for partial in partials:
+            print(f"  {partial_path(config.shard_dir, report_date, tuple(partial['shard']))}")
+        print(f"Remove the files of the stale run from {config.shard_dir} and merge again")
+        return None
+    if missing:
+        print(f"Missing shard(s) {', '.join(map(str, missing))} of {partials[0]['shard'][1]} for {report_date}")
+        if not allow_partial:
+            return None
+    for account in accounts:
+        if account['error']:
+            print(f"Account {account['email']} failed in its shard: {account['error']}")
+        if account['failed']:
+            print(f"Account {account['email']}: {len(account['failed'])} outlet(s) failed")
+
+    # Only loaded once the shard files are known to merge
+    from src.utils.excel import SheetWriter, create_workbook
+    from src.utils.exporters import close_exporters, create_exporters
+    workbook_name = report_filename(report_date)
+    exporters = create_exporters(config.export_formats, os.path.splitext(workbook_name)[0])
+    with tracer.span('excel write', workbook=workbook_name) as span:
+        workbook = create_workbook(workbook_name)
+        for account in accounts:
+            sheet = SheetWriter(workbook, sheet_name(account['email']),
+                                waffle_gap_minutes=config.alert_waffle_gap_minutes)
+            sheet.write_row(header_row())
+            for _, row in account['rows']:
+                sheet.write_row(row)
+                for exporter in exporters:
+                    exporter.add_row(report_date, account['email'], row)
+            sheet.close()
+            span['rows'] = span.get('rows', 0) + sheet.rows
+        workbook.close()
+    close_exporters(exporters)
+    store_rows(config, report_date, accounts)
+    print(f"Merged {len(partials)} shard(s) into {workbook_name}")
+
+    if send:
+        from src.email_sender import send_report
+        with tracer.span('email send') as span:
+            span['sent'] = send_report(workbook_name, config.email_config)
+    return workbook_name
+
+def store_rows(config: Config, report_date: str, accounts: List[Dict]):
+    """Upsert merged rows into the history store and append them to the sales cube"""
+    if config.history_db:
+        from src.utils.history import HistoryStore
+        history = HistoryStore(config.history_db)
+        for account in accounts:
+            for outlet_id, row in account['rows']:
+                if outlet_id:
+                    history.add(account['email'], outlet_id, report_date, row)
+        history.close()
+    if config.cube_dir:
+        from src.utils.cube import HOURS, SalesCube
+        cube = SalesCube(config.cube_dir)
+        for account in accounts:
+            for outlet_id, row in account['rows']:
+                if outlet_id:
+                    cube.add(account['email'], outlet_id, row[0], report_date, row[5:5 + HOURS])
+        cube.close()
+
+def enqueue_job(kind: str, **params) -> str:
+    """Add a job for the daemon; nothing runs until a daemon picks it up"""
+    from src.utils.job_queue import JobQueue
+    return JobQueue(Config().queue_dir).enqueue(kind, **params)
+
+def print_jobs(limit: int = 20):
+    """The daemon's queue: pending and running jobs, then the latest finished ones"""
+    from src.utils.job_queue import STATES, JobQueue
+    queue = JobQueue(Config().queue_dir)
+    for state in STATES:
+        jobs = queue.jobs(state)
+        if state in ('done', 'failed'):
+            jobs = jobs[-limit:]
+        for job in jobs:
+            print(f"{state:<9}{job['id']:<14}{job['kind']:<10}{job.get('message', '')[:40]:<42}{job['params']}")
+
+def send_existing_report(report_date: str) -> bool:
+    """Email an already produced barHarian_<date>.xlsx"""
+    from src.email_sender import send_report
+    workbook_name = report_filename(report_date)
+    if not os.path.isfile(workbook_name):
+        print(f"Report file not found: {workbook_name}")
+        return False
+    return send_report(workbook_name, Config().email_config)
@@ -1,83 +1,157 @@
 import os
-import time
 import json
+import time
+import threading
 import requests
-from datetime import datetime, date, timedelta
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Tuple, Optional
-from bs4 import BeautifulSoup
+from contextlib import contextmanager
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, List, Dict, Tuple, Optional
 
-from seleniumwire import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
 
 from src.config import Config
-from src.utils.captcha import solve_captcha
-from src.utils.excel import create_workbook, setup_worksheet_formatting
+from src.utils.captcha import CaptchaSolver, solve_captcha
+from src.utils.excel import SheetWriter, create_workbook
+from src.utils.layout import header_row, report_filename, sheet_name
+from src.utils.exporters import ColumnarExporter, close_exporters, create_exporters
+from src.utils.history import HistoryStore
+from src.utils.cube import SalesCube
+from src.utils.session_store import SessionStore
+from src.utils.shards import Shard, in_shard, partial_path, shard_accounts, write_partial
+from src.utils.browser_pool import BrowserPool, create_driver
+from src.utils.tracing import tracer
+from src.utils.waits import (
+    LOGIN_URL, wait_for, on_login_or_dashboard, left_login_or_challenged, document_ready
+)
+from src.utils.async_fetch import AsyncOutletFetcher
+from src.utils.receipts import iter_receipts, find_first_last
+from src.utils.batching import ReceiptBatcher
+from src.utils.receipt_metrics import ReceiptMetrics, metric_mismatches
+from src.utils.anomalies import AlertRules, score_outlets
+from src.utils.cache import ResponseCache, RunManifest
+from src.utils.cassette import Cassette, attach, cassette_path, new_recording
+from src.utils.retry import AuthError, TransientError, policy_for, raise_for_retry, with_retry
+from src.utils.ownercab import (
+    EARNINGS_REPORT_URL, RECEIPTS_URL, WARES_URL, OUTLETS_URL,
+    earnings_report_payload, receipts_payload, wares_payload,
+    parse_hourly_sales, parse_first_last_sale, parse_waffle_end_time
+)
 from src.email_sender import send_report
 
+def response_cache(config: Config) -> Optional[ResponseCache]:
+    """The on-disk ownercab response cache, or None when CACHE_TTL_HOURS is 0 or a cassette is in use"""
+    if config.cache_ttl_hours <= 0 or config.cassette_mode in ('record', 'replay'):
+        return None
+    return ResponseCache(os.path.join(config.cache_dir, 'responses'),
+                         config.cache_ttl_hours * 3600, config.cache_max_mb * 1024 * 1024)
+
+def alert_rules(config: Config) -> AlertRules:
+    return AlertRules(config.alert_rules, config.alert_zero_hours, config.alert_baseline_weeks,
+                      config.alert_baseline_drop, config.alert_open_by, config.alert_close_after,
+                      config.alert_waffle_gap_minutes)
+
+def new_captcha_solver(config: Config) -> CaptchaSolver:
+    return CaptchaSolver(config.twocaptcha_api_key, config.cache_dir,
+                         workers=config.max_browsers, cost_per_solve=config.captcha_cost_per_solve)
+
 class LoyverseScraper:
-    def __init__(self, account: Dict, config: Config, excel_sheet):
-        """Initialize scraper with account details and configuration"""
+    def __init__(self, account: Dict, config: Config, excel_sheet, browser_pool: Optional[BrowserPool] = None,
+                 captcha_solver: Optional[CaptchaSolver] = None):
+        """
+        Initialize scraper with account details and configuration
+
+        Args:
+            browser_pool: Optional pool shared between scrapers; caps concurrent browsers and keeps them warm
+            captcha_solver: Optional solver shared between scrapers so solves overlap and tokens get reused
+
+        excel_sheet is a SheetWriter; rows are streamed into it as they arrive, or buffered in
+        output_lists until one is attached.
+        """
+        self.account = account
         self.email = account['email']
         self.password = account['password']
         self.invalid_outlets = account['invalid_outlets']
         self.config = config
         self.outputxls = excel_sheet
+        self.browser_pool = browser_pool
+        self.captcha_solver = captcha_solver or new_captcha_solver(config)
         self.fail_list = []
+        self.auth_failures = set()
+        # Outlets whose receipt-derived metrics disagreed with the report endpoints in the cross-check
+        self.metric_mismatches = set()
         self.name_ids = []
-        self.output_lists = [["Outlet", "Internet Problem", "Sales Start", "Waffle End", "Sales End",
-                            "9am", "10am", "11am", "12pm", "1pm", "2pm", "3pm", "4pm", "5pm",
-                            "6pm", "7pm", "8pm", "9pm", "10pm"]]
-        self.setup_driver()
+        self.driver = None
+        self.req = None
+        self.cookie = None
+        # When the session in req was created by a browser login (a restored session keeps its saved time)
+        self.logged_in_at: Optional[float] = None
+        self.batched_receipts = {}
+        # Reserved row slots of the current report, filled as outlets finish (see outlet_finished)
+        self.slots: List[Optional[Tuple[Any, bool]]] = []
+        self.next_slot = 0
+        self.baselines: Optional[Dict[str, List[float]]] = None
+        self.error = None
+        self.response_cache = response_cache(config)
+        self._manifest = None
+        self.cassette = None
+        self.exporters: List[ColumnarExporter] = []
+        self.history: Optional[HistoryStore] = None
+        self.cube: Optional[SalesCube] = None
+        # Outlet sharding: only outlets hashed into this shard are fetched; outlet_order keeps the full list
+        self.outlet_shard: Optional[Shard] = None
+        self.outlet_order: List[Tuple[str, str]] = []
+        self.alert_rules = alert_rules(config)
+        self.session_store = SessionStore(config.session_store_dir, config.session_store_key) \
+            if config.session_store_key else None
+        self.output_lists = [header_row()]
+        # (outlet id, row) of every row recorded, kept whether the rows were streamed or buffered
+        self.recorded_rows: List[Tuple[str, List]] = []
 
     def setup_driver(self):
-        """Set up browser driver with appropriate options for both local and CI environments"""
+        """Start a private browser driver (used when no BrowserPool is shared)"""
         try:
-            # Determine if running in GitHub Actions
-            is_github_actions = os.environ.get("GITHUB_ACTIONS") == "true"
-            
-            # Set up browser options
-            options = self.config.chrome_options
-            
-            if is_github_actions:
-                # Configure for Chromium in GitHub Actions environment
-                options.binary_location = '/usr/bin/chromium-browser'
-                options.add_argument('--no-sandbox')
-                options.add_argument('--disable-dev-shm-usage')
-                
-                # Use system ChromeDriver
-                service = Service('/usr/bin/chromedriver')
-            else:
-                # Use webdriver_manager for local development
-                service = Service(ChromeDriverManager().install())
-            
-            print("Setting up browser driver...")
-            self.driver = webdriver.Chrome(
-                service=service,
-                options=options
-            )
-            print("Browser driver setup completed successfully")
-            
+            self.driver = create_driver(self.config, self.email)
         except Exception as e:
             print(f"Error setting up browser driver: {str(e)}")
             raise
 
+    @contextmanager
+    def browser(self):
+        """Hold a driver for the login phase: borrowed from the pool if there is one"""
+        if self.browser_pool is None:
+            self.setup_driver()
+            try:
+                yield self.driver
+            finally:
+                self.close_driver()
+            return
+        with self.browser_pool.borrow(self.email) as driver:
+            self.driver = driver
+            try:
+                yield driver
+            finally:
+                self.driver = None
+
     def login(self):
         """Handle login process including captcha if needed"""
         try:
             print(f"Logging in with account: {self.email}")
             # Start with the sales report URL as in original script
             self.driver.get('https://r.loyverse.com/dashboard/#/report/sales?page=0&limit=10&group=day&periodLength=7d&from=2021-06-04%2000:00:00&to=2021-06-10%2023:59:59&fromHour=0&toHour=0&outletsIds=all&merchantsIds=all')
-            time.sleep(10)  # Wait as in original script
+            wait_for(self.driver, on_login_or_dashboard, 20, "login or dashboard")
             
             self.driver.implicitly_wait(5)  # Add implicit wait from original
             
-            if self.driver.current_url == 'https://loyverse.com/en/login':
+            if self.driver.current_url == LOGIN_URL:
                 print("Login page detected, entering credentials...")
+                # Get a token on its way while the form is filled in, if the site key is known
+                site_key = self.captcha_solver.site_key(LOGIN_URL)
+                if self.config.captcha_prefetch and site_key:
+                    self.captcha_solver.ensure_solving(site_key, LOGIN_URL)
                 # Handle login form
                 try:
                     email_input = WebDriverWait(self.driver, 20).until(
@@ -94,17 +168,18 @@ class LoyverseScraper:
                         EC.element_to_be_clickable((By.XPATH, '//span[@id="sforg-submit"]'))
                     )
                     submit_button.click()
-                    time.sleep(2)
+                    wait_for(self.driver, left_login_or_challenged, 10, "redirect or captcha after submit")
                     
                     self.driver.implicitly_wait(5)
                     
                     # Check if still on login page - might need captcha
-                    if self.driver.current_url == "https://loyverse.com/en/login":
+                    if self.driver.current_url == LOGIN_URL:
                         print("Captcha detected, attempting to solve...")
-                        solve_captcha(self.driver, self.config.twocaptcha_api_key)
+                        solve_captcha(self.driver, self.captcha_solver)
                         
                     # After captcha, redirect back to dashboard
                     self.driver.get('https://r.loyverse.com/dashboard/#/report/sales?page=0&limit=10&group=day&periodLength=7d&from=2021-06-04%2000:00:00&to=2021-06-10%2023:59:59&fromHour=0&toHour=0&outletsIds=all&merchantsIds=all')
+                    wait_for(self.driver, on_login_or_dashboard, 20, "dashboard after login")
                     
                     # Verify we're actually logged in
                     if self.driver.current_url.startswith('https://r.loyverse.com/dashboard'):
@@ -169,21 +244,21 @@ class LoyverseScraper:
             attempt_count += 1
             print(f"Store collection attempt {attempt_count}/{max_attempts}")
             
-            time.sleep(10)
+            wait_for(self.driver, EC.presence_of_element_located((By.CSS_SELECTOR, 'div.listCheckbox')),
+                     20, "outlet checkboxes")
             name_ids = []
             try:
+                from bs4 import BeautifulSoup
                 soup = BeautifulSoup(self.driver.page_source, "html.parser")
                 allsoup = soup.find_all('div', {'class': 'listCheckbox'})
                 
                 for each_element in allsoup[2:]:
                     try:
-                        if each_element.text.strip() in self.invalid_outlets or each_element['id'] in self.invalid_outlets:
-                            continue
                         name_ids.append((each_element.text.strip(), each_element['id']))
                     except Exception:
                         pass
                         
-                self.name_ids = name_ids
+                self.name_ids = self._filter_outlets(name_ids)
                 
                 if self.name_ids:
                     print(f'Found {len(self.name_ids)} stores on attempt {attempt_count}.')
@@ -195,7 +270,7 @@ class LoyverseScraper:
             if attempt_count < max_attempts:
                 print(f'No stores found on attempt {attempt_count}, trying again...')
                 self.driver.refresh()
-                time.sleep(2)
+                wait_for(self.driver, document_ready, 10, "page refresh")
                 self.login()
             else:
                 print(f'Failed to find stores after {max_attempts} attempts. Moving to next account.')
@@ -203,9 +278,9 @@ class LoyverseScraper:
         
         return False  # Should never reach here, but just in case
 
-    def request_earnings_receipt(self, startdate: str, enddate: str, outletID: Tuple[str, str]):
-        """Get earnings receipt data"""
-        headers = {
+    def _api_headers(self) -> Dict:
+        """Headers the dashboard sends with its ownercab API calls"""
+        return {
             'Accept-Encoding': 'gzip, deflate, br',
             'Accept-Language': 'en-US,en;q=0.9',
             'Content-Type': 'application/json;charset=UTF-8',
@@ -216,174 +291,313 @@ class LoyverseScraper:
             'cookie': self.cookie,
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36'
         }
-        
-        payload = {
-            "limit": "200",
-            "offset": 0,
-            "receiptType": None,
-            "payType": None,
-            "startDate": f"{startdate} 00:00:00",
-            "endDate": f"{enddate} 23:59:59",
-            "search": None,
-            "tzOffset": 28800000,
-            "tzName": "Asia/Kuala_Lumpur",
-            "startTime": None,
-            "endTime": None,
-            "startWeek": 0,
-            "receiptId": None,
-            "predefinedPeriod": {"name": None, "period": None},
-            "customPeriod": True,
-            "merchantsIds": "all",
-            "outletsIds": [outletID[1]],
-            'payType': None
-        }
 
-        earnings_request = self.req.post('https://r.loyverse.com/data/ownercab/getreceiptsarchive', 
-                                       headers=headers, data=json.dumps(payload))
-        earnings_rows = json.loads(earnings_request.content).get('receipts', [])
-        
+    def restore_session(self) -> bool:
+        """Load a saved session and keep it only if an authenticated probe still succeeds"""
+        if not self.session_store:
+            return False
+
+        session = self.session_store.load(self.email)
+        if not session:
+            return False
+
+        req = requests.session()
+        for cookie in session['cookies']:
+            req.cookies.set(cookie['name'], cookie['value'])
+        self.req = req
+        self.cookie = session.get('cookie_header')
+        self.logged_in_at = session.get('saved_at')
+
+        # Outlet discovery doubles as the auth probe; saved outlets are the fallback
+        if self.fetch_outlets():
+            print(f"Saved session for {self.email} is still valid")
+            return True
+        self.name_ids = self._filter_outlets(tuple(name_id) for name_id in session.get('name_ids', []))
+        if self.name_ids and self.probe_session():
+            print(f"Saved session for {self.email} is still valid")
+            return True
+
+        print(f"Saved session for {self.email} expired, falling back to browser login")
+        self.session_store.delete(self.email)
+        self.req, self.cookie, self.name_ids = None, None, []
+        return False
+
+    def _filter_outlets(self, name_ids) -> List[Tuple[str, str]]:
+        """Drop outlets listed in the account's invalid_outlets by name or ID"""
+        return [(name, outlet_id) for name, outlet_id in name_ids
+                if name not in self.invalid_outlets and outlet_id not in self.invalid_outlets]
+
+    def fetch_outlets(self) -> bool:
+        """Discover outlets through the ownercab JSON endpoint the dashboard calls"""
         try:
-            if earnings_rows:
-                first_sale_timestamp = earnings_rows[-1]['dateTS']
-                last_sale_timestamp = earnings_rows[0]['dateTS']
-                first_sale = datetime.fromtimestamp(int(first_sale_timestamp) / 1000).strftime("%I:%M %p")
-                last_sale = datetime.fromtimestamp(int(last_sale_timestamp) / 1000).strftime("%I:%M %p")
-            else:
-                first_sale = None
-                last_sale = None
-        except Exception as e:
-            print(f"Error processing receipt timestamps: {e}")
-            first_sale, last_sale = None, None
+            response = self.req.post(OUTLETS_URL, headers=self._api_headers(), data=json.dumps({}), timeout=15)
+            if response.status_code != 200:
+                print(f"Outlet list request failed with status {response.status_code}")
+                return False
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Outlet list request failed: {str(e)}")
+            return False
+
+        outlets = body.get('outlets', []) if isinstance(body, dict) else body
+        name_ids = []
+        for outlet in outlets or []:
+            if isinstance(outlet, dict) and outlet.get('id') is not None and outlet.get('name'):
+                name_ids.append((str(outlet['name']).strip(), str(outlet['id'])))
+
+        self.name_ids = self._filter_outlets(name_ids)
+        print(f'Found {len(self.name_ids)} stores through the API.')
+        return bool(self.name_ids)
+
+    def probe_session(self) -> bool:
+        """Cheap authenticated ownercab call: one hour of one outlet"""
+        payload = earnings_report_payload(self.start_date, self.start_date, [self.name_ids[0][1]])
+        payload["endDate"] = f"{self.start_date} 00:59:59"
+        payload["limit"] = "1"
+        try:
+            response = self.req.post(EARNINGS_REPORT_URL,
+                                     headers=self._api_headers(), data=json.dumps(payload), timeout=15)
+            return response.status_code == 200 and 'earningsRows' in response.json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"Session probe failed: {str(e)}")
+            return False
+
+    def save_session(self):
+        """Persist the browser-captured session so the next run can skip login"""
+        if not self.session_store or not self.cookie or not self.name_ids:
+            return
+        self.session_store.save(self.email, self.driver.get_cookies(), self.cookie,
+                                name_ids=self.name_ids)
+
+    def _post_json(self, url: str, payload: Dict) -> Tuple[int, Optional[Dict]]:
+        """POST a report call through the response cache; the body is None unless the status is 200"""
+        endpoint = url.rsplit('/', 1)[-1]
+        if self.response_cache:
+            with tracer.span(f"cache hit {endpoint}"):
+                body = self.response_cache.get(url, payload)
+            if body is not None:
+                return 200, body
+        def send():
+            with tracer.span(f"ownercab {endpoint}") as span:
+                response = self.req.post(url, headers=self._api_headers(), data=json.dumps(payload), timeout=30)
+                span['status'], span['bytes'] = response.status_code, len(response.content)
+            raise_for_retry(response.status_code, response.headers.get('Retry-After'))
+            return response
+
+        try:
+            response = with_retry(send, policy_for(url), endpoint)
+        except TransientError as e:
+            return e.status, None
+        if response.status_code != 200:
+            return response.status_code, None
+        body = json.loads(response.content)
+        if self.response_cache:
+            self.response_cache.put(url, payload, body)
+        return response.status_code, body
+
+    def run_manifest(self) -> Optional[RunManifest]:
+        """Progress record for this account and report date (only kept alongside the response cache)"""
+        if not self.response_cache:
+            return None
+        if self._manifest is None:
+            # Outlet shards of one account each track their own outlets
+            key = f"{self.email} shard {self.outlet_shard[0]}/{self.outlet_shard[1]}" if self.outlet_shard else self.email
+            self._manifest = RunManifest(os.path.join(self.config.cache_dir, 'runs'), key, self.start_date,
+                                         self.config.cache_ttl_hours * 3600)
+        return self._manifest
 
-        earnings_rows.reverse()
-        self.headers = headers
-        return first_sale, last_sale
+    def request_receipts_page(self, startdate: str, enddate: str, outletID: Tuple[str, str],
+                              offset: int, limit: int) -> List[Dict]:
+        """One page of the receipt archive, newest first; raises when the page could not be fetched"""
+        return self.request_receipts_batch_page(startdate, enddate, [outletID[1]], offset, limit, strict=True)
+
+    def request_receipts_batch_page(self, startdate: str, enddate: str, outlet_ids: List[str],
+                                    offset: int, limit: int, strict: bool = False) -> List[Dict]:
+        """One page of the receipt archive covering several outlets; strict raises instead of returning [] on failure"""
+        payload = receipts_payload(startdate, enddate, outlet_ids, limit=limit, offset=offset)
+        status, body = self._post_json(RECEIPTS_URL, payload)
+        if body is None and strict:
+            raise TransientError(status)
+        return (body or {}).get('receipts', [])
+
+    def request_earnings_receipt(self, startdate: str, enddate: str, outletID: Tuple[str, str]):
+        """Get first and last sale times, paging only as far as needed to find both ends"""
+        if outletID[1] in self.batched_receipts:
+            return parse_first_last_sale(self.batched_receipts[outletID[1]])
+        newest, oldest = find_first_last(
+            lambda offset, limit: self.request_receipts_page(startdate, enddate, outletID, offset, limit))
+        return parse_first_last_sale([receipt for receipt in (newest, oldest) if receipt])
 
     def request_earnings_report(self, startdate: str, enddate: str, outletID: Tuple[str, str]):
         """Get earnings report data"""
-        headers = {
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Content-Type': 'application/json;charset=UTF-8',
-            'Origin': 'https://r.loyverse.com',
-            'Referer': 'https://r.loyverse.com/dashboard/',
-            'sec-ch-ua': '" Not;A Brand";v="99", "Google Chrome";v="97", "Chromium";v="97"',
-            'sec-ch-ua-platform': "Windows",
-            'cookie': self.cookie,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36'
-        }
+        payload = earnings_report_payload(startdate, enddate, [outletID[1]])
+        status, body = self._post_json(EARNINGS_REPORT_URL, payload)
+        print(f"Earnings request status for {outletID[0]}: {status}")
         
-        payload = {
-            "merchantsIds": "all",
-            "outletsIds": [outletID[1]],
-            "startDate": f"{startdate} 00:00:00",
-            "endDate": f"{enddate} 23:59:59",
-            "startWeek": 0,
-            "tzOffset": 28800000,
-            "tzName": "Asia/Kuala_Lumpur",
-            "startTime": None,
-            "endTime": None,
-            "customPeriod": True,
-            "predefinedPeriod": {"name": None, "period": None},
-            "divider": "hour",
-            "limit": "10",
-            "offset": 0
-        }
-
-        earnings_request = self.req.post('https://r.loyverse.com/data/ownercab/getearningsreport', 
-                                       headers=headers, data=json.dumps(payload))
-        print(f"Earnings request status for {outletID[0]}: {earnings_request.status_code}")
-        
-        if earnings_request.status_code != 200:
-            self.fail_list.append(outletID)
+        if body is None:
             return None
-            
-        earnings_rows = json.loads(earnings_request.content).get('earningsRows', [])
-        sales_list = [row['earningsSum'] / 100 for row in earnings_rows[9:23]]
-        self.headers = headers
-        return sales_list
+        return parse_hourly_sales(body)
 
     def collect_waffle_end_time(self, outletID):
         """Get waffle end time"""
-        req = self.req
-        headers = self.headers
-        payload = {
-            "startDate": f"{self.start_date} 00:00:00",
-            "endDate": f"{self.end_date} 23:59:59",
-            "startWeek": 0,
-            "tzOffset": 28800000,
-            "tzName": "Asia/Kuala_Lumpur",
-            "startTime": None,
-            "endTime": None,
-            "divider": "hour",
-            "offset": 0,
-            "limit": "10",
-            "merchantsIds": "all",
-            "outletsIds": [outletID[1]],
-            "predefinedPeriod": {"name": None, "period": None},
-            "customPeriod": True
-        }
-
-        top_items_request = req.post('https://r.loyverse.com/data/ownercab/getwaresreport', 
-                                   headers=headers, data=json.dumps(payload))
-        top5_dict = json.loads(top_items_request.content)
-        top5 = top5_dict.get('top5', [])
-        
-        waffle_end_time = None
-        for each in top5:
-            if each["name"] in ["C1 Original Waffle", "C001 Classic Waffle"]:
-                waffle_id = each["id"]
-                periodsByWare = top5_dict.get("periodsByWare", [])
-                waffleInfoList = []
-                for pbw in periodsByWare:
-                    if pbw['wareId'] == waffle_id:
-                        waffleInfoList = pbw.get("periodsByWare", [])
-                        waffleInfoList.reverse()
-                        break
-                for info in waffleInfoList:
-                    if info.get('netSales', 0) > 0:
-                        waffleEndTime_dict = info
-                        break
-                to_time = waffleEndTime_dict.get("to")
-                pre_add_time = datetime.fromtimestamp(int(to_time) / 1000)
-                waffle_end_time = (pre_add_time + timedelta(seconds=1)).strftime("%I:%M %p")
-                break
-        
-        return waffle_end_time
+        payload = wares_payload(self.start_date, self.end_date, [outletID[1]])
+        _, body = self._post_json(WARES_URL, payload)
+        return parse_waffle_end_time(body) if body is not None else None
 
-    def all_earnings_report(self, nameID):
-        """Process all earnings data for a store"""
+    def all_earnings_report(self, nameID) -> Dict:
+        """Fetch all earnings data for a store"""
         print(f'Scraping {nameID[0]}...')
         sales_list = self.request_earnings_report(self.start_date, self.end_date, nameID)
         first_sale, last_sale = self.request_earnings_receipt(self.start_date, self.end_date, nameID)
-        
-        if sales_list is not None:
-            waffle_end_time = self.collect_waffle_end_time(nameID)
-            print(nameID[0], nameID[1], first_sale, waffle_end_time, last_sale, sales_list)
-            self.file_writting_list_creation(nameID[0], first_sale, waffle_end_time, last_sale, sales_list)
-
-    def file_writting_list_creation(self, storename, first_sale, waffle_end_time, last_sale, sales_list):
-        """Create output list for Excel writing"""
-        if len(set(sales_list)) == 1:
-            output_list_single = [storename, "Alert", first_sale, waffle_end_time, last_sale]
-        else:
-            output_list_single = [storename, None, first_sale, waffle_end_time, last_sale]
+        waffle_end_time = self.collect_waffle_end_time(nameID) if sales_list is not None else None
+        return {
+            'name_id': nameID,
+            'sales_list': sales_list,
+            'first_sale': first_sale,
+            'last_sale': last_sale,
+            'waffle_end_time': waffle_end_time,
+        }
+
+    def receipt_metrics_report(self, nameID, metrics: Optional[ReceiptMetrics] = None,
+                               cross_check: bool = False) -> Dict:
+        """
+        all_earnings_report from the receipt archive alone: one paged stream instead of three endpoints
+
+        With cross_check the endpoint values are fetched too; on any disagreement they are used instead
+        and the outlet is added to metric_mismatches.
+        """
+        if metrics is None:
+            metrics = ReceiptMetrics().fold(iter_receipts(
+                lambda offset, limit: self.request_receipts_batch_page(
+                    self.start_date, self.end_date, [nameID[1]], offset, limit, strict=True)))
+        result = dict(metrics.result(), name_id=nameID)
+        if not cross_check:
+            return result
+        reported = self.all_earnings_report(nameID)
+        with tracer.span('metrics cross-check', outlet=nameID[1]) as span:
+            mismatches = metric_mismatches(result, reported) if reported['sales_list'] is not None else []
+            span['mismatches'] = len(mismatches)
+        if mismatches:
+            print(f"Receipt-derived metrics for {nameID[0]} disagree with the reports: {'; '.join(mismatches)}")
+            self.metric_mismatches.add(nameID[1])
+            return reported
+        return result
+
+    def receipt_metrics_results(self, on_result: Optional[Callable[[int, Any], None]] = None,
+                                indexes: Optional[List[int]] = None) -> List:
+        """
+        The result of every outlet at these indexes (all by default) from batched receipt streams,
+        after cross-checking the first METRICS_CROSS_CHECK of them
+
+        If any sampled outlet disagrees with the report endpoints, receipt-derived values can't be trusted
+        for this account, so every other outlet is fetched through the endpoints instead.
+        """
+        batcher = ReceiptBatcher(
+            lambda outlet_ids, offset, limit: self.request_receipts_batch_page(
+                self.start_date, self.end_date, outlet_ids, offset, limit, strict=True),
+            batch_size=self.config.outlet_batch_size, workers=self.config.api_workers)
+        if indexes is None:
+            indexes = list(range(len(self.name_ids)))
+        sampled, rest = indexes[:self.config.metrics_cross_check], indexes[self.config.metrics_cross_check:]
+        folded = batcher.fold([self.name_ids[index][1] for index in sampled], ReceiptMetrics)
+        results = self.run_outlets(
+            lambda nameID: self.receipt_metrics_report(nameID, folded.get(nameID[1]), cross_check=True),
+            sampled, on_result)
+        if self.metric_mismatches:
+            print(f"Receipt-derived metrics disagree for {len(self.metric_mismatches)} sampled outlet(s) of "
+                  f"{self.email}, using the report endpoints for the whole account")
+            return results + self.run_outlets(self.all_earnings_report, rest, on_result)
+        folded = batcher.fold([self.name_ids[index][1] for index in rest], ReceiptMetrics)
+        return results + self.run_outlets(
+            lambda nameID: self.receipt_metrics_report(nameID, folded.get(nameID[1])), rest, on_result)
+
+    def score_results(self, results: List) -> Dict[str, List[str]]:
+        """
+        Alert reasons per outlet id for every successful result, scored together in one pass
+
+        The baseline rule compares against the same weekday of previous weeks in the history store.
+        """
+        scored = [result for result in results
+                  if not isinstance(result, BaseException) and result['sales_list'] is not None]
+        if not scored:
+            return {}
+        outlet_ids = [result['name_id'][1] for result in scored]
+        report_day = date.fromisoformat(self.start_date)
+        # Read once per account by reserve_rows
+        baselines = [self.baselines[outlet_id] for outlet_id in outlet_ids] if self.baselines is not None else None
+        try:
+            with tracer.span('alert scoring', account=self.email, outlets=len(scored)) as span:
+                reasons = score_outlets(
+                    self.alert_rules, [result['sales_list'] for result in scored],
+                    [result['first_sale'] for result in scored], [result['last_sale'] for result in scored],
+                    [result['waffle_end_time'] for result in scored], baselines, report_day.strftime('%A'))
+                span['flagged'] = sum(1 for outlet_reasons in reasons if outlet_reasons)
+        except Exception as e:
+            # The rows still get written, with only the flatline check
+            print(f"Alert scoring failed for {self.email}: {type(e).__name__}: {str(e)}")
+            return {}
+        return dict(zip(outlet_ids, reasons))
+
+    def record_outlet_result(self, nameID, result, alerts: Optional[List[str]] = None):
+        """Turn one outlet's fetch result (or the exception it raised) into a report row"""
+        if isinstance(result, BaseException):
+            print(f"Error scraping {nameID[0]}: {type(result).__name__}: {result}")
+            self.fail_list.append(nameID)
+            if isinstance(result, AuthError):
+                self.auth_failures.add(nameID[1])
+            return
+        if result['sales_list'] is None:
+            self.fail_list.append(nameID)
+            return
+        if self.run_manifest() and self.run_manifest().result(nameID[1]) is None:
+            # Appended per outlet, so a run killed mid-sweep still knows what it finished
+            self.run_manifest().mark_done(nameID[1], result)
+        first_sale, waffle_end_time, last_sale = result['first_sale'], result['waffle_end_time'], result['last_sale']
+        print(nameID[0], nameID[1], first_sale, waffle_end_time, last_sale, result['sales_list'])
+        row = self.file_writting_list_creation(nameID[0], first_sale, waffle_end_time, last_sale, result['sales_list'],
+                                               alerts)
+        self.recorded_rows.append((nameID[1], row))
+        if self.history:
+            self.history.add(self.email, nameID[1], self.start_date, row)
+        if self.cube:
+            self.cube.add(self.email, nameID[1], nameID[0], self.start_date, result['sales_list'])
+
+    def file_writting_list_creation(self, storename, first_sale, waffle_end_time, last_sale, sales_list,
+                                    alerts: Optional[List[str]] = None):
+        """
+        Create output list for Excel writing; unscored rows (alerts None) only get the flatline check
+
+        Column B ("Internet Problem") keeps its meaning, every hour with the same sales; the scored
+        alert reasons only go in the last column.
+        """
+        flatline = len(set(sales_list)) == 1
+        if alerts is None:
+            alerts = ["flatline"] if flatline else []
+        output_list_single = [storename, "Alert" if flatline else None, first_sale, waffle_end_time, last_sale]
         output_list_single.extend(sales_list)
+        output_list_single.append("; ".join(alerts) or None)
         print("Output list for", storename, ":", output_list_single)
-        self.output_lists.append(output_list_single)
+        for exporter in self.exporters:
+            exporter.add_row(self.start_date, self.email, output_list_single)
+        if self.outputxls is not None:
+            self.outputxls.write_row(output_list_single)
+        else:
+            self.output_lists.append(output_list_single)
+        return output_list_single
 
     def file_writting(self):
-        """Write data to Excel"""
-        row, column = 0, 0
+        """Write the buffered rows to the attached SheetWriter and empty the buffer"""
         for each_line in self.output_lists:
-            for item in each_line:
-                self.outputxls.write(row, column, item)
-                column += 1
-            row += 1
-            column = 0
+            self.outputxls.write_row(each_line)
+        self.output_lists = []
 
-    def get_earnings_report(self):
-        """Main method to get all earnings reports"""
+    def attach_sheet(self, sheet: SheetWriter):
+        """Stream every row from now on, after the ones buffered so far"""
+        self.outputxls = sheet
+        self.file_writting()
+
+    def capture_browser_session(self):
+        """Copy the logged-in browser's cookies into a requests session"""
         self.driver.get('https://r.loyverse.com/dashboard/#/report/sales?page=0&limit=10&group=day&periodLength=7d&from=2022-01-24%2000:00:00&to=2022-01-30%2023:59:59&fromHour=0&toHour=0&outletsIds=all&merchantsIds=all')
         
         # Setup request session
@@ -393,28 +607,245 @@ class LoyverseScraper:
             req.cookies.set(cookie['name'], cookie['value'])
         self.req = req
         
-        time.sleep(5)
-        
         # Get cookie for API requests
-        for request in self.driver.requests:
-            if request.response and request.url == 'https://r.loyverse.com/data/ownercab/getearningsreport':
-                self.cookie = request.headers.get('cookie')
+        if hasattr(self.driver, 'requests'):
+            # selenium-wire: read the header off the dashboard's own API call
+            wait_for(self.driver, lambda driver: any(request.response and request.url == EARNINGS_REPORT_URL
+                                                     for request in driver.requests),
+                     15, "dashboard earnings request")
+            for request in reversed(self.driver.requests):
+                if request.response and request.url == EARNINGS_REPORT_URL:
+                    self.cookie = request.headers.get('cookie')
+                    break
+        else:
+            self.cookie = self.cdp_cookie_header(EARNINGS_REPORT_URL)
+        if not self.cookie:
+            self.cookie = '; '.join(f"{cookie['name']}={cookie['value']}" for cookie in cookies_chrome)
+
+    def cdp_cookie_header(self, url: str) -> Optional[str]:
+        """The cookie header Chrome would send to url (HttpOnly included), via DevTools"""
+        try:
+            cookies = self.driver.execute_cdp_cmd('Network.getCookies', {'urls': [url]}).get('cookies', [])
+        except WebDriverException as e:
+            print(f"Could not read cookies through CDP: {str(e)}")
+            return None
+        return '; '.join(f"{cookie['name']}={cookie['value']}" for cookie in cookies) or None
+
+    def get_earnings_report(self):
+        """Main method to get all earnings reports"""
+        if self.req is None:
+            self.capture_browser_session()
+        
+        # Rows stream out as outlets finish, each in the slot reserved for it, so the sheet is deterministic
+        self.reserve_rows()
+        pending = list(range(len(self.name_ids)))
+        manifest = self.run_manifest()
+        if manifest:
+            # Outlets a killed run already finished are rebuilt from the manifest, not fetched again
+            done = [index for index in pending if manifest.result(self.name_ids[index][1]) is not None]
+            if done:
+                print(f"{len(done)}/{len(self.name_ids)} outlets of {self.email} already done, "
+                      f"rebuilt from the run manifest")
+            for index in done:
+                self.outlet_finished(index, dict(manifest.result(self.name_ids[index][1]),
+                                                 name_id=self.name_ids[index]), final=True)
+            pending = sorted(set(pending) - set(done))
+        if self.config.metrics_source == 'receipts':
+            # Hourly sales, first/last sale and waffle end all derived from one receipt stream per outlet
+            self.receipt_metrics_results(self.outlet_finished, pending)
+        else:
+            self.endpoint_results(self.outlet_finished, pending)
+        if self.config.retry_pass:
+            self.retry_failed_outlets()
+        if self.cassette and self.config.cassette_mode == 'record':
+            self.cassette.save()
+
+    def endpoint_results(self, on_result: Optional[Callable[[int, Any], None]] = None,
+                         indexes: Optional[List[int]] = None) -> List:
+        """
+        The result of every outlet at these indexes (all by default) from the earnings, receipts and wares endpoints
+
+        on_result(index, result) is called as each outlet finishes, result being the exception if it failed.
+        """
+        if indexes is None:
+            indexes = list(range(len(self.name_ids)))
+        name_ids = [self.name_ids[index] for index in indexes]
+        # Receipts can be requested for many outlets at once and split back per outlet;
+        # the hourly and wares reports are aggregated server-side, so they stay per outlet
+        # strict: a failed page must abandon its chunk, never read as "no more receipts"
+        batcher = ReceiptBatcher(
+            lambda outlet_ids, offset, limit: self.request_receipts_batch_page(
+                self.start_date, self.end_date, outlet_ids, offset, limit, strict=True),
+            batch_size=self.config.outlet_batch_size, workers=self.config.api_workers)
+        self.batched_receipts = batcher.first_last([nameID[1] for nameID in name_ids])
+        
+        if self.config.fetch_engine == 'async' and self.cassette is None:
+            # All three calls for all outlets in flight together over one keep-alive pool
+            fetcher = AsyncOutletFetcher(self._api_headers(), self.config.api_workers, cache=self.response_cache)
+            # The fetcher numbers outlets by their position in name_ids; on_result wants the slot index
+            on_position = (lambda position, result: on_result(indexes[position], result)) if on_result else None
+            return fetcher.run(name_ids, self.start_date, self.end_date, self.batched_receipts, on_position)
+        return self.run_outlets(self.all_earnings_report, indexes, on_result)
+
+    def run_outlets(self, report: Callable, indexes: List[int],
+                    on_result: Optional[Callable[[int, Any], None]] = None, *args) -> List:
+        """report(nameID, *args) for the outlets at these indexes; on_result runs on this thread as each finishes"""
+        results = [None] * len(indexes)
+        with ThreadPoolExecutor(max_workers=self.config.api_workers) as executor:
+            futures = {executor.submit(report, self.name_ids[index], *args): position
+                       for position, index in enumerate(indexes)}
+            for future in as_completed(futures):
+                position = futures[future]
+                results[position] = future.exception() or future.result()
+                if on_result:
+                    on_result(indexes[position], results[position])
+        return results
+
+    def reserve_rows(self):
+        """One row slot per outlet in outlet order; baselines for the alert rules are read once for all of them"""
+        self.slots = [None] * len(self.name_ids)
+        self.next_slot = 0
+        self.baselines = None
+        if self.history and 'baseline' in self.alert_rules.rules and self.name_ids:
+            report_day = date.fromisoformat(self.start_date)
+            days = [str(report_day - timedelta(weeks=week)) for week in range(1, self.alert_rules.baseline_weeks + 1)]
+            totals = self.history.day_totals(self.email, [nameID[1] for nameID in self.name_ids], days)
+            self.baselines = {nameID[1]: [totals.get(nameID[1], {}).get(day, float('nan')) for day in days]
+                              for nameID in self.name_ids}
+
+    def _retryable(self, result) -> bool:
+        if isinstance(result, BaseException):
+            return not isinstance(result, AuthError)
+        return result['sales_list'] is None
+
+    def outlet_finished(self, index: int, result, final: Optional[bool] = None):
+        """
+        Take one outlet's result and write every row whose turn has come
+
+        A failure the retry pass will try again holds its slot (and the rows after it) until then,
+        so a retried outlet still lands in its own row.
+        """
+        if final is None:
+            final = not (self.config.retry_pass and self._retryable(result))
+        self.slots[index] = (result, final)
+        ready = []
+        while self.next_slot < len(self.slots) and self.slots[self.next_slot] and self.slots[self.next_slot][1]:
+            ready.append((self.name_ids[self.next_slot], self.slots[self.next_slot][0]))
+            self.next_slot += 1
+        if not ready:
+            return
+        # Rows that become ready together are scored in one pass
+        alerts = self.score_results([result for _, result in ready])
+        for nameID, result in ready:
+            self.record_outlet_result(nameID, result, alerts.get(nameID[1]))
+
+    def retry_failed_outlets(self):
+        """Second pass, with the same session, over the outlets holding their slot, so one run yields a complete sheet"""
+        if self.auth_failures and self.session_store:
+            # A rejected session won't come back; make sure the next run logs in afresh
+            self.session_store.delete(self.email)
+        retryable = [index for index, slot in enumerate(self.slots) if slot and not slot[1]]
+        if not retryable:
+            return
         
-        # Process all stores with threading
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            for nameID in self.name_ids:
-                executor.submit(self.all_earnings_report, nameID)
+        print(f"Retrying {len(retryable)} failed outlet(s) for {self.email}...")
+        use_receipts = self.config.metrics_source == 'receipts' and not self.metric_mismatches
+        report = self.receipt_metrics_report if use_receipts else self.all_earnings_report
+        self.run_outlets(report, retryable, lambda index, result: self.outlet_finished(index, result, final=True))
+
+    def close_driver(self):
+        """Shut the browser down if one was started"""
+        if self.driver:
+            self.driver.close()
+            self.driver.quit()
+            self.driver = None
+
+    def cassette_file(self) -> str:
+        return cassette_path(self.config.cassette_dir, self.email, self.start_date)
+
+    def replay_cassette(self):
+        """Stand in a recorded session for the login: outlets and every API response come from the cassette"""
+        cassette = Cassette(self.cassette_file(), self.config.cassette_timing).load()
+        print(f"Replaying {len(cassette.exchanges)} recorded request(s) for {self.email} on {self.start_date}")
+        self.cassette = cassette
+        self.name_ids = self._filter_outlets(tuple(name_id) for name_id in cassette.meta.get('name_ids', []))
+        self.req = attach(requests.session(), cassette, 'replay')
+        self.cookie = 'replay'
+
+    def start_recording(self):
+        """Record every API call from here on (the async engine bypasses requests, so the threads engine is used)"""
+        self.cassette = new_recording(self.cassette_file(), self.name_ids)
+        attach(self.req, self.cassette, 'record')
+
+    def authenticate(self, fresh: bool = False):
+        """Log in (or restore a session, unless fresh) and discover outlets"""
+        if self.config.cassette_mode == 'replay':
+            self.replay_cassette()
+            return
+        restored = False
+        if not fresh:
+            with tracer.span('session restore', account=self.email) as span:
+                restored = span['restored'] = self.restore_session()
+        if not restored:
+            # The browser is only needed until the API session is captured
+            with self.browser():
+                with tracer.span('login', account=self.email):
+                    self.login()
+                with tracer.span('cookie capture', account=self.email):
+                    self.capture_browser_session()
+                self.logged_in_at = time.time()
+                with tracer.span('outlet discovery', account=self.email) as span:
+                    span['source'] = 'api'
+                    if not self.fetch_outlets():
+                        print("Falling back to scraping outlets from the dashboard")
+                        span['source'] = 'dom'
+                        self.collect_store_name_id()
+                    span['outlets'] = len(self.name_ids)
+                self.save_session()
+        if self.config.cassette_mode == 'record':
+            self.start_recording()
+
+    def relogin(self):
+        """Browser login even when a saved session is still valid, replacing it"""
+        self.authenticate(fresh=True)
+
+    def select_outlet_shard(self):
+        """Keep only this shard's outlets; filtering twice is harmless since the split hashes outlet ids"""
+        self.outlet_order = list(self.name_ids)
+        self.name_ids = [nameID for nameID in self.name_ids if in_shard(nameID[1], self.outlet_shard)]
+        print(f"Shard {self.outlet_shard[0]}/{self.outlet_shard[1]}: {len(self.name_ids)} of "
+              f"{len(self.outlet_order)} outlets for {self.email}")
+
+    def collect(self):
+        """Authenticate and fetch every outlet, without touching the worksheet"""
+        self.authenticate()
+        if self.outlet_shard:
+            self.select_outlet_shard()
+        with tracer.span('outlet fetch', account=self.email, date=self.start_date) as span:
+            self.get_earnings_report()
+            span['outlets'], span['failed'] = len(self.name_ids), len(self.fail_list)
+        print("Fail List:", self.fail_list)
+
+    def for_date(self, report_date: str) -> 'LoyverseScraper':
+        """A scraper for another report day that reuses this one's authenticated session"""
+        scraper = LoyverseScraper(self.account, self.config, None, self.browser_pool, self.captcha_solver)
+        scraper.req, scraper.cookie, scraper.name_ids = self.req, self.cookie, self.name_ids
+        scraper.exporters, scraper.history, scraper.cube = self.exporters, self.history, self.cube
+        scraper.start_date = report_date
+        scraper.end_date = report_date
+        # Each day gets its own cassette, so each needs its own session to mount it on
+        if self.config.cassette_mode == 'replay':
+            scraper.replay_cassette()
+        elif self.config.cassette_mode == 'record':
+            scraper.req = requests.session()
+            scraper.req.cookies.update(self.req.cookies)
+            scraper.start_recording()
+        return scraper
 
     def main(self):
         """Main execution method"""
-        self.login()
-        self.collect_store_name_id()
-        self.get_earnings_report()
+        self.collect()
         self.file_writting()
-        self.driver.close()
-        self.driver.quit()
-        time.sleep(2)
-        print("Fail List:", self.fail_list)
 
 # def main():
 #     """Main function to run the scraper"""
@@ -466,58 +897,329 @@ class LoyverseScraper:
 #         print(f"Error in main execution: {str(e)}")
 #         raise
 
-def main():
+def run_accounts(config: Config, report_date: str, step: str = 'collect',
+                 browser_pool: Optional[BrowserPool] = None, workbook=None,
+                 exporters: Optional[List[ColumnarExporter]] = None,
+                 history: Optional[HistoryStore] = None,
+                 cube: Optional[SalesCube] = None,
+                 accounts: Optional[List[Dict]] = None,
+                 outlet_shard: Optional[Shard] = None) -> List[LoyverseScraper]:
+    """
+    Run a scraper step for every account concurrently; failures are logged and recorded on the scraper
+
+    With a workbook, each account gets its sheet up front (in account order) and streams its rows into it.
+    Every row also goes to the exporters, the history store and the sales cube, if any.
+    accounts narrows the run to some of config.accounts, and outlet_shard to some of each account's outlets.
+    """
+    owns_pool = browser_pool is None
+    if owns_pool:
+        browser_pool = BrowserPool(config, config.max_browsers)
+    captcha_solver = new_captcha_solver(config)
+    scrapers = []
+    for account in config.accounts if accounts is None else accounts:
+        scraper = LoyverseScraper(account, config, None, browser_pool, captcha_solver)
+        scraper.start_date = report_date
+        scraper.end_date = report_date
+        scraper.exporters = exporters or []
+        scraper.history = history
+        scraper.cube = cube
+        scraper.outlet_shard = outlet_shard
+        scrapers.append(scraper)
+    if workbook is not None:
+        write_lock = threading.Lock()
+        for scraper in scrapers:
+            scraper.attach_sheet(SheetWriter(workbook, sheet_name(scraper.email), write_lock,
+                                              config.alert_waffle_gap_minutes))
+    
+    with ThreadPoolExecutor(max_workers=config.max_accounts) as executor:
+        futures = []
+        for scraper in scrapers:
+            print(f"\nProcessing account: {scraper.email}")
+            futures.append(executor.submit(getattr(scraper, step)))
+    
+    for scraper, future in zip(scrapers, futures):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error processing account {scraper.email}: {str(e)}")
+            scraper.error = e
+    if owns_pool:
+        browser_pool.close_all()
+    captcha_solver.print_summary()
+    captcha_solver.shutdown()
+    return scrapers
+
+def write_workbook(workbook_name: str, sheets: List[Tuple[str, LoyverseScraper]]):
+    """
+    Write one sheet per scraper from its buffered rows, in order, from the calling thread
+
+    Scrapers that failed keep an empty sheet so the workbook layout stays stable.
+    """
+    with tracer.span('excel write', workbook=workbook_name) as span:
+        workbook = create_workbook(workbook_name)
+        for name, scraper in sheets:
+            sheet = SheetWriter(workbook, name, waffle_gap_minutes=scraper.config.alert_waffle_gap_minutes)
+            if scraper.error is None:
+                scraper.attach_sheet(sheet)
+            sheet.close()
+            span['rows'] = span.get('rows', 0) + sheet.rows
+        workbook.close()
+
+def close_workbook(workbook_name: str, workbook, scrapers: List[LoyverseScraper]):
+    """Finish a workbook whose sheets were streamed by run_accounts: size the alert formats and close it"""
+    with tracer.span('excel write', workbook=workbook_name) as span:
+        for scraper in scrapers:
+            scraper.outputxls.close()
+        workbook.close()
+        span['rows'] = sum(scraper.outputxls.rows for scraper in scrapers)
+
+def history_store(config: Config) -> Optional[HistoryStore]:
+    """The local sales history, or None when HISTORY_DB is empty"""
+    return HistoryStore(config.history_db) if config.history_db else None
+
+def sales_cube(config: Config) -> Optional[SalesCube]:
+    """The memory-mapped hourly sales cube, or None when CUBE_DIR is empty"""
+    return SalesCube(config.cube_dir) if config.cube_dir else None
+
+def close_stores(*stores):
+    for store in stores:
+        if store:
+            store.close()
+
+def run_day_jobs(config: Config, jobs: List[Tuple[str, LoyverseScraper]]):
+    """Fetch (day, scraper) jobs BACKFILL_WORKERS at a time; failures are logged and recorded on the scraper"""
+    with ThreadPoolExecutor(max_workers=config.backfill_workers) as executor:
+        futures = [executor.submit(scraper.get_earnings_report) for _, scraper in jobs]
+    for (day, scraper), future in zip(jobs, futures):
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error fetching {scraper.email} on {day}: {str(e)}")
+            scraper.error = e
+
+def date_range(start_date: str, end_date: str) -> List[str]:
+    """Every day from start_date to end_date inclusive, as YYYY-MM-DD"""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    if end < start:
+        raise ValueError(f"Backfill end {end_date} is before start {start_date}")
+    return [str(start + timedelta(days=offset)) for offset in range((end - start).days + 1)]
+
+def range_workbook_name(start_date: str, end_date: str) -> str:
+    return f"barHarian_{start_date}_{end_date}.xlsx"
+
+def incomplete_filename(workbook_name: str) -> str:
+    """Where a backfill writes a workbook that is missing an account or an outlet, so it is fetched again"""
+    return f"{os.path.splitext(workbook_name)[0]}.incomplete.xlsx"
+
+def fetch_complete(config: Config, scrapers: List[LoyverseScraper]) -> bool:
+    """Every configured account logged in and fetched every one of its outlets"""
+    emails = {scraper.email for scraper in scrapers if scraper.error is None and not scraper.fail_list}
+    return all(account['email'] in emails for account in config.accounts)
+
+def pending_days(start_date: str, end_date: str, single_workbook: bool = False) -> List[str]:
+    """
+    The days of a backfill range whose report does not exist yet
+
+    A day that failed is only written as <report>.incomplete.xlsx, so it stays pending.
+    """
+    days = date_range(start_date, end_date)
+    if single_workbook:
+        pending = [] if os.path.isfile(range_workbook_name(start_date, end_date)) else days
+    else:
+        pending = [day for day in days if not os.path.isfile(report_filename(day))]
+    for day in days:
+        if day not in pending:
+            print(f"Skipping {day}, report already produced")
+    if not pending:
+        print("Nothing to backfill")
+    return pending
+
+def produce_reports(config: Config, accounts: List[LoyverseScraper], days: List[str],
+                    workbook_name: Optional[str] = None,
+                    exporters: Optional[List[ColumnarExporter]] = None,
+                    require_complete: bool = False) -> List[Tuple[str, LoyverseScraper]]:
+    """
+    Fetch every day for every authenticated account and write the workbooks
+
+    Args:
+        accounts: Authenticated scrapers; each day gets a copy through for_date
+        workbook_name: One workbook with a sheet per account and day, instead of barHarian_<day>.xlsx per day
+        exporters: Replace the accounts' exporters for these days
+        require_complete: Write a workbook under its real name only when every configured account fetched
+            every outlet; otherwise it goes to incomplete_filename, which pending_days does not count
+    """
+    # Schedule every (day, account) fetch together; each one fans out over its outlets
+    jobs = [(day, account.for_date(day)) for day in days for account in accounts]
+    if exporters is not None:
+        for _, scraper in jobs:
+            scraper.exporters = exporters
+    run_day_jobs(config, jobs)
+    
+    def write(name: str, sheets: List[Tuple[str, LoyverseScraper]], days_written: List[str]):
+        if require_complete and not all(fetch_complete(config, [scraper for job_day, scraper in jobs
+                                                               if job_day == day]) for day in days_written):
+            print(f"{name} is missing an account or outlets, written as {incomplete_filename(name)} "
+                  f"and left for the next backfill")
+            name = incomplete_filename(name)
+        elif require_complete and os.path.isfile(incomplete_filename(name)):
+            os.remove(incomplete_filename(name))
+        write_workbook(name, sheets)
+
+    if workbook_name:
+        write(workbook_name, [(f"{sheet_name(scraper.email)[:20]} {day}"[:31], scraper) for day, scraper in jobs],
+              days)
+    else:
+        for day in days:
+            write(report_filename(day), [(sheet_name(scraper.email), scraper)
+                                         for job_day, scraper in jobs if job_day == day], [day])
+    return jobs
+
+def backfill(start_date: str, end_date: str, single_workbook: bool = False):
+    """
+    Produce reports for a range of days with one login per account
+
+    Args:
+        start_date: First day, YYYY-MM-DD
+        end_date: Last day, YYYY-MM-DD
+        single_workbook: Write one workbook with a sheet per account and day instead of one workbook per day
+    """
+    config = Config()
+    pending = pending_days(start_date, end_date, single_workbook)
+    if not pending:
+        return
+    
+    # One authenticated session per account, shared by every day
+    exporters = create_exporters(config.export_formats, f"barHarian_{start_date}_{end_date}")
+    history, cube = history_store(config), sales_cube(config)
+    accounts = [scraper for scraper in run_accounts(config, pending[0], step='authenticate', exporters=exporters,
+                                                    history=history, cube=cube)
+                if scraper.error is None]
+    produce_reports(config, accounts, pending, range_workbook_name(start_date, end_date) if single_workbook else None,
+                    require_complete=True)
+    close_exporters(exporters)
+    close_stores(history, cube)
+    if response_cache(config):
+        response_cache(config).evict()
+    report_trace(config)
+
+def sync_history(until: str, days: int = 90):
+    """
+    Bring the history store up to date without producing reports
+
+    Each outlet is fetched for every day it has no stored row, within the last `days` days up to `until`.
+    """
+    config = Config()
+    history = history_store(config)
+    if history is None:
+        print("HISTORY_DB is empty, nothing to sync into")
+        return
+    first_day = str(date.fromisoformat(until) - timedelta(days=days - 1))
+    cube = sales_cube(config)
+    accounts = [scraper for scraper in run_accounts(config, until, step='authenticate', history=history, cube=cube)
+                if scraper.error is None]
+    
+    jobs = []
+    days = date_range(first_day, until)
+    for account in accounts:
+        missing = history.missing_days(account.email, [nameID[1] for nameID in account.name_ids], days)
+        for day in days:
+            outlets = [nameID for nameID in account.name_ids if nameID[1] in set(missing[day])]
+            if outlets:
+                scraper = account.for_date(day)
+                scraper.name_ids = outlets
+                jobs.append((day, scraper))
+    print(f"Syncing {sum(len(scraper.name_ids) for _, scraper in jobs)} outlet-day(s) "
+          f"across {len(jobs)} account-day(s)")
+    run_day_jobs(config, jobs)
+    close_stores(history, cube)
+    if response_cache(config):
+        response_cache(config).evict()
+    report_trace(config)
+
+def shard_result(position: int, scraper: LoyverseScraper) -> Dict:
+    """One account's part of a shard file: its rows keyed by outlet id, plus what failed"""
+    outlets = scraper.outlet_order or scraper.name_ids
+    return {
+        'index': position,
+        'email': scraper.email,
+        'error': f"{type(scraper.error).__name__}: {scraper.error}" if scraper.error else None,
+        'failed': [outlet_id for _, outlet_id in scraper.fail_list],
+        'outlets': outlets,
+        'rows': [{'outlet_id': outlet_id, 'row': row} for outlet_id, row in scraper.recorded_rows],
+    }
+
+def run_shard(shard: Shard, by: str = 'account', report_date: Optional[str] = None) -> str:
+    """
+    Fetch one shard of the daily report and write it to SHARD_DIR; `merge` turns the shards into the workbook
+
+    Args:
+        shard: (i, n), this is shard i of n
+        by: 'account' gives each shard every n-th account, 'outlet' gives it every account's share of outlets
+        report_date: YYYY-MM-DD, default yesterday; every shard of a run must use the same day
+    """
+    config = Config()
+    report_date = report_date or str(date.today() - timedelta(days=1))
+    selected = shard_accounts(config.accounts, shard) if by == 'account' else list(enumerate(config.accounts))
+    print(f"Shard {shard[0]}/{shard[1]} by {by}: {len(selected)} of {len(config.accounts)} account(s)")
+    
+    # Rows stay buffered on each scraper; the workbook, exports and the cube are written once, by merge.
+    # The history is still read for alert baselines, and re-upserting the same rows at merge is harmless.
+    history = history_store(config)
+    scrapers = run_accounts(config, report_date, history=history, accounts=[account for _, account in selected],
+                            outlet_shard=shard if by == 'outlet' else None)
+    close_stores(history)
+    path = write_partial(partial_path(config.shard_dir, report_date, shard), {
+        'report_date': report_date,
+        'shard': list(shard),
+        'by': by,
+        'accounts': [shard_result(position, scraper) for (position, _), scraper in zip(selected, scrapers)],
+    })
+    report_trace(config, os.path.join(config.trace_dir, f"shard-{shard[0]}-of-{shard[1]}"))
+    return path
+
+def main(report_date: Optional[str] = None):
     """Main function to run the scraper"""
     try:
         config = Config()
         
         # Set up dates
-        today = date.today()
-        yesterday = today - timedelta(days=1)
-        report_date = str(yesterday)
+        report_date = report_date or str(date.today() - timedelta(days=1))
         
-        # Create Excel workbook
-        workbook_name = f"barHarian_{report_date}.xlsx"
+        # Process accounts concurrently, each streaming rows into its own sheet as outlets finish
+        workbook_name = report_filename(report_date)
         workbook = create_workbook(workbook_name)
+        exporters = create_exporters(config.export_formats, os.path.splitext(workbook_name)[0])
+        history, cube = history_store(config), sales_cube(config)
+        scrapers = run_accounts(config, report_date, workbook=workbook, exporters=exporters,
+                                history=history, cube=cube)
+        close_workbook(workbook_name, workbook, scrapers)
+        close_exporters(exporters)
+        close_stores(history, cube)
+        if response_cache(config):
+            response_cache(config).evict()
         
-        # Process each account
-        for account in config.accounts:
-            try:
-                print(f"\nProcessing account: {account['email']}")
-                
-                # Create worksheet
-                worksheet = workbook.add_worksheet(account['email'].split('@')[0])
-                
-                # Setup worksheet formatting
-                setup_worksheet_formatting(workbook, worksheet)
-                
-                # Initialize scraper
-                scraper = LoyverseScraper(account, config, worksheet)
-                scraper.start_date = report_date
-                scraper.end_date = report_date
-                
-                # Run scraper
-                scraper.main()
-                
-            except Exception as e:
-                print(f"Error processing account {account['email']}: {str(e)}")
-                continue
-        
-        # Close workbook
-        workbook.close()
-        
-        # Send report
-        if os.path.isfile(workbook_name):
-            send_report(workbook_name, config.email_config)
-        else:
-            print(f"Report file not found: {workbook_name}")
+        email_report(config, workbook_name)
+        report_trace(config)
             
     except Exception as e:
         print(f"Error in main execution: {str(e)}")
         raise
-    
+
+def email_report(config: Config, workbook_name: str):
+    """Send the day's workbook, unless this run replayed a cassette"""
+    if config.cassette_mode == 'replay':
+        print(f"Replayed run, report not emailed: {workbook_name}")
+    elif os.path.isfile(workbook_name):
+        with tracer.span('email send') as span:
+            span['sent'] = send_report(workbook_name, config.email_config)
+    else:
+        print(f"Report file not found: {workbook_name}")
+
+def report_trace(config: Config, directory: Optional[str] = None):
+    """Print the per-phase summary and save the JSON trace for this run"""
+    tracer.print_summary()
+    print(f"Trace written to {tracer.export_json(directory or config.trace_dir)}")
+
 if __name__ == "__main__":
-    start_time = time.time()
-    print(f"Start time {datetime.now()} ...")
-    main()
-    print("--- %s minutes ---" % ((time.time() - start_time) // 60))
\ No newline at end of file
+    from src.cli import cli
+    cli()
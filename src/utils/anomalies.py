@@ -0,0 +1,125 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+from src.utils.ownercab import FIRST_HOUR, LAST_HOUR
+
+RULES = ('flatline', 'zero_hours', 'baseline', 'late_open', 'early_close', 'waffle_gap')
+
+@lru_cache(maxsize=2048)
+def clock_minutes(value: Optional[str]) -> float:
+    """'09:15 AM' as minutes after midnight, NaN when missing (a day has only 1,440 distinct values)"""
+    if not value:
+        return np.nan
+    try:
+        parsed = datetime.strptime(value, "%I:%M %p")
+    except ValueError:
+        return np.nan
+    return parsed.hour * 60 + parsed.minute
+
+def _clock(minutes: float) -> str:
+    return datetime(2000, 1, 1, int(minutes) // 60, int(minutes) % 60).strftime("%I:%M %p")
+
+class AlertRules:
+    """Which anomaly rules run, and their thresholds"""
+
+    def __init__(self, rules: Sequence[str] = RULES, zero_hours: int = 2, baseline_weeks: int = 4,
+                 baseline_drop: float = 0.5, open_by: str = "10:00 AM", close_after: str = "09:30 PM",
+                 waffle_gap_minutes: float = 30):
+        """
+        Args:
+            rules: Names from RULES to apply
+            zero_hours: Flag an outlet with at least this many 9am-10pm hours without sales
+            baseline_weeks: Same weekday in this many previous weeks makes the baseline
+            baseline_drop: Flag a day total this fraction below the baseline mean
+            open_by: Flag a first sale later than this
+            close_after: Flag a last sale earlier than this
+            waffle_gap_minutes: Flag waffles ending this long before the last sale
+        """
+        unknown = set(rules) - set(RULES)
+        if unknown:
+            raise ValueError(f"Unknown alert rule(s): {', '.join(sorted(unknown))} (use {', '.join(RULES)})")
+        self.rules = set(rules)
+        self.zero_hours = zero_hours
+        self.baseline_weeks = baseline_weeks
+        self.baseline_drop = baseline_drop
+        self.open_by = clock_minutes(open_by)
+        self.close_after = clock_minutes(close_after)
+        self.waffle_gap_minutes = waffle_gap_minutes
+
+def sales_matrix(sales: Sequence[Optional[Sequence[float]]]) -> np.ndarray:
+    """outlets x 14 hourly sales; a short, missing or empty list is padded with NaN instead of shifting the rows"""
+    hours = LAST_HOUR - FIRST_HOUR
+    matrix = np.full((len(sales), hours), np.nan)
+    for index, row in enumerate(sales):
+        row = list(row or [])[:hours]
+        matrix[index, :len(row)] = row
+    return matrix
+
+def score_outlets(rules: AlertRules, sales: Sequence[Sequence[float]], first_sales: Sequence[Optional[str]],
+                  last_sales: Sequence[Optional[str]], waffle_ends: Sequence[Optional[str]],
+                  baselines: Optional[Sequence[Sequence[float]]] = None, weekday: str = '') -> List[List[str]]:
+    """
+    Score every outlet of a run at once; returns each outlet's alert reasons (empty when clean)
+
+    Args:
+        sales: outlets x 14 hourly sales, 9am-10pm; outlets with no sales data get no alerts
+        first_sales, last_sales, waffle_ends: Report times per outlet ('09:15 AM' or None)
+        baselines: outlets x weeks day totals from previous same weekdays, NaN where unknown
+        weekday: Name of the weekday, for the baseline message
+    """
+    sales = sales_matrix(sales)
+    reasons: List[List[str]] = [[] for _ in range(len(sales))]
+    if not len(sales):
+        return reasons
+    has_data = ~np.isnan(sales).all(axis=1)
+    flags: Dict[str, np.ndarray] = {}
+
+    if 'flatline' in rules.rules:
+        # fmax/fmin skip the NaN padding (and give NaN, never equal, for an outlet with no data)
+        flags['flatline'] = np.fmax.reduce(sales, axis=1) - np.fmin.reduce(sales, axis=1) == 0
+    if 'zero_hours' in rules.rules:
+        flags['zero_hours'] = (sales == 0).sum(axis=1) >= rules.zero_hours
+    if 'baseline' in rules.rules and baselines is not None:
+        baselines = np.asarray(baselines, dtype=float).reshape(len(sales), -1)
+        totals = np.nansum(sales, axis=1)
+        known = (~np.isnan(baselines)).sum(axis=1)
+        with np.errstate(invalid='ignore'):
+            baseline_mean = np.where(known > 0, np.nansum(baselines, axis=1) / np.maximum(known, 1), np.nan)
+            flags['baseline'] = (known >= 2) & (totals < baseline_mean * (1 - rules.baseline_drop))
+
+    first = np.array([clock_minutes(value) for value in first_sales])
+    last = np.array([clock_minutes(value) for value in last_sales])
+    # NaN compares False, so a missing time never raises an alert
+    with np.errstate(invalid='ignore'):
+        if 'late_open' in rules.rules:
+            flags['late_open'] = first > rules.open_by
+        if 'early_close' in rules.rules:
+            flags['early_close'] = last < rules.close_after
+        if 'waffle_gap' in rules.rules:
+            waffle = np.array([clock_minutes(value) for value in waffle_ends])
+            gap = last - waffle
+            flags['waffle_gap'] = gap > rules.waffle_gap_minutes
+
+    # Only flagged outlets pay for building a message
+    for rule in RULES:
+        if rule not in flags:
+            continue
+        for index in np.flatnonzero(flags[rule] & has_data):
+            if rule == 'flatline':
+                reasons[index].append("flatline")
+            elif rule == 'zero_hours':
+                hours = [f"{(FIRST_HOUR + hour - 1) % 12 + 1}{'am' if FIRST_HOUR + hour < 12 else 'pm'}"
+                         for hour in np.flatnonzero(sales[index] == 0)]
+                reasons[index].append(f"no sales {', '.join(hours)}")
+            elif rule == 'baseline':
+                drop = 1 - totals[index] / baseline_mean[index]
+                reasons[index].append(f"sales {drop:.0%} below {weekday + ' ' if weekday else ''}baseline")
+            elif rule == 'late_open':
+                reasons[index].append(f"opened {_clock(first[index])}")
+            elif rule == 'early_close':
+                reasons[index].append(f"closed {_clock(last[index])}")
+            elif rule == 'waffle_gap':
+                reasons[index].append(f"waffles ended {gap[index]:.0f} min before close")
+    return reasons
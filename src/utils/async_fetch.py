@@ -0,0 +1,132 @@
+import json
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import aiohttp
+
+from src.utils.receipts import first_last_search
+from src.utils.tracing import tracer
+from src.utils.retry import TransientError, async_with_retry, policy_for, raise_for_retry
+from src.utils.ownercab import (
+    EARNINGS_REPORT_URL, RECEIPTS_URL, WARES_URL,
+    earnings_report_payload, receipts_payload, wares_payload,
+    parse_hourly_sales, parse_first_last_sale, parse_waffle_end_time
+)
+
+class AsyncOutletFetcher:
+    """Fetch the three ownercab reports for every outlet concurrently over one keep-alive connection pool"""
+
+    def __init__(self, headers: Dict, concurrency: int = 10, timeout: float = 30, cache=None):
+        """
+        Args:
+            headers: API headers including the captured `cookie` header
+            concurrency: Maximum number of requests in flight at once
+            timeout: Total timeout per request in seconds
+            cache: Optional ResponseCache consulted before and filled after each call
+        """
+        self.cache = cache
+        self.headers = dict(headers)
+        # aiohttp only decodes brotli when the optional brotli package is installed
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def _post(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                    url: str, payload: Dict) -> Tuple[int, Optional[Dict]]:
+        endpoint = url.rsplit('/', 1)[-1]
+        if self.cache:
+            with tracer.span(f"cache hit {endpoint}"):
+                body = self.cache.get(url, payload)
+            if body is not None:
+                return 200, body
+
+        async def send():
+            async with semaphore:
+                with tracer.span(f"ownercab {endpoint}") as span:
+                    async with session.post(url, json=payload) as response:
+                        raw = await response.read()
+                        span['status'], span['bytes'] = response.status, len(raw)
+                raise_for_retry(response.status, response.headers.get('Retry-After'))
+                if response.status != 200:
+                    return response.status, None
+                return response.status, json.loads(raw)
+
+        try:
+            status, body = await async_with_retry(send, policy_for(url), endpoint)
+        except TransientError as e:
+            return e.status, None
+        if self.cache and body is not None:
+            self.cache.put(url, payload, body)
+        return status, body
+
+    async def _first_last_receipts(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                                   outlet_ids: List[str], startdate: str, enddate: str) -> List[Dict]:
+        """Drive the paged first/last receipt search with async requests"""
+        search = first_last_search()
+        request = next(search)
+        try:
+            while True:
+                offset, limit = request
+                _, body = await self._post(session, semaphore, RECEIPTS_URL,
+                                           receipts_payload(startdate, enddate, outlet_ids, limit, offset))
+                # A failed page goes in as None so the search raises instead of reading it as the end
+                request = search.send(body.get('receipts', []) if body is not None else None)
+        except StopIteration as stop:
+            newest, oldest = stop.value
+        return [receipt for receipt in (newest, oldest) if receipt]
+
+    async def _known(self, value):
+        return value
+
+    async def fetch_outlet(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                           name_id: Tuple[str, str], startdate: str, enddate: str,
+                           batched_receipts: Dict[str, List[Dict]]) -> Dict:
+        """Run all three report calls for one outlet at the same time"""
+        outlet_ids = [name_id[1]]
+        if name_id[1] in batched_receipts:
+            receipts_call = self._known(batched_receipts[name_id[1]])
+        else:
+            receipts_call = self._first_last_receipts(session, semaphore, outlet_ids, startdate, enddate)
+        (status, earnings), receipts, (_, wares) = await asyncio.gather(
+            self._post(session, semaphore, EARNINGS_REPORT_URL, earnings_report_payload(startdate, enddate, outlet_ids)),
+            receipts_call,
+            self._post(session, semaphore, WARES_URL, wares_payload(startdate, enddate, outlet_ids)),
+        )
+        print(f"Earnings request status for {name_id[0]}: {status}")
+        first_sale, last_sale = parse_first_last_sale(receipts)
+        return {
+            'name_id': name_id,
+            'status': status,
+            'sales_list': parse_hourly_sales(earnings) if earnings is not None else None,
+            'first_sale': first_sale,
+            'last_sale': last_sale,
+            'waffle_end_time': parse_waffle_end_time(wares) if wares is not None else None,
+        }
+
+    async def fetch_all(self, name_ids: List[Tuple[str, str]], startdate: str, enddate: str,
+                        batched_receipts: Optional[Dict[str, List[Dict]]] = None,
+                        on_result: Optional[Callable[[int, Any], None]] = None) -> List:
+        """
+        Results in the same order as name_ids; a failed outlet yields its exception
+
+        on_result(index, result) is called on the event loop as each outlet finishes.
+        """
+        batched_receipts = batched_receipts or {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        async with aiohttp.ClientSession(headers=self.headers, connector=connector,
+                                         timeout=self.timeout) as session:
+            async def tracked(index: int, name_id: Tuple[str, str]):
+                try:
+                    result = await self.fetch_outlet(session, semaphore, name_id, startdate, enddate, batched_receipts)
+                except Exception as e:
+                    result = e
+                if on_result:
+                    on_result(index, result)
+                return result
+            return await asyncio.gather(*(tracked(index, name_id) for index, name_id in enumerate(name_ids)))
+
+    def run(self, name_ids: List[Tuple[str, str]], startdate: str, enddate: str,
+            batched_receipts: Optional[Dict[str, List[Dict]]] = None,
+            on_result: Optional[Callable[[int, Any], None]] = None) -> List:
+        """Blocking wrapper; safe to call from worker threads since each gets its own event loop"""
+        return asyncio.run(self.fetch_all(name_ids, startdate, enddate, batched_receipts, on_result))
@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from src.utils.receipts import ReceiptPageError, iter_receipts
+
+# Fields a receipt may carry its outlet under; without one a mixed page can't be split
+OUTLET_KEYS = ('outletId', 'outlet_id', 'storeId')
+
+BatchPageFetcher = Callable[[List[str], int, int], List[Dict]]
+
+def chunked(items: List, size: int) -> Iterator[List]:
+    """Consecutive slices of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def receipt_outlet_id(receipt: Dict) -> Optional[str]:
+    for key in OUTLET_KEYS:
+        if receipt.get(key) is not None:
+            return str(receipt[key])
+    return None
+
+def split_first_last(receipts: Iterable[Dict], outlet_ids: List[str]) -> Optional[Dict[str, List[Dict]]]:
+    """
+    Reduce a newest-first receipt stream covering several outlets to [newest, oldest] per outlet
+
+    Returns None as soon as a receipt can't be attributed to one of the requested
+    outlets, so the caller can fall back to single-outlet requests.
+    """
+    wanted = set(outlet_ids)
+    ends = {}
+    for receipt in receipts:
+        outlet_id = receipt_outlet_id(receipt)
+        if outlet_id not in wanted:
+            return None
+        if outlet_id in ends:
+            ends[outlet_id][1] = receipt
+        else:
+            ends[outlet_id] = [receipt, receipt]
+    return {outlet_id: ends.get(outlet_id, []) for outlet_id in outlet_ids}
+
+def split_fold(receipts: Iterable[Dict], outlet_ids: List[str], new_state: Callable[[], Any]) -> Optional[Dict[str, Any]]:
+    """
+    Fold a receipt stream covering several outlets into one state per outlet (anything with add(receipt))
+
+    Returns None as soon as a receipt can't be attributed to one of the requested outlets.
+    """
+    states = {outlet_id: new_state() for outlet_id in outlet_ids}
+    for receipt in receipts:
+        state = states.get(receipt_outlet_id(receipt))
+        if state is None:
+            return None
+        state.add(receipt)
+    return states
+
+class ReceiptBatcher:
+    """Resolve first/last receipts for many outlets with one paged request stream per chunk of outlets"""
+
+    def __init__(self, fetch_page: BatchPageFetcher, batch_size: int = 20, workers: int = 4,
+                 page_size: int = 200, max_receipts: int = 2000):
+        """
+        Args:
+            fetch_page: Callable taking (outlet_ids, offset, limit) and returning receipts
+            batch_size: Outlets per request
+            workers: Chunks fetched in parallel
+            page_size: Receipts per page
+            max_receipts: first_last leaves a chunk whose combined archive is longer than this to single-outlet requests
+        """
+        self.fetch_page = fetch_page
+        self.batch_size = batch_size
+        self.workers = workers
+        self.page_size = page_size
+        self.max_receipts = max_receipts
+
+    def _page(self, outlet_ids: List[str], offset: int, limit: int) -> List[Dict]:
+        page = self.fetch_page(outlet_ids, offset, limit)
+        if page is None:
+            raise ReceiptPageError(offset)
+        return page
+
+    def _tail_offset(self, outlet_ids: List[str]) -> Optional[int]:
+        """
+        Offset of a page that reaches the end of a combined archive whose first page came back full,
+        or None past max_receipts
+
+        Gallops then bisects with single-receipt probes like first_last_search, but only to page precision.
+        """
+        low, high = self.page_size - 1, self.page_size
+        while self._page(outlet_ids, high, 1):
+            if high > self.max_receipts:
+                return None
+            low, high = high, min(high * 2, self.max_receipts + 1)
+        while high - low > self.page_size:
+            middle = (low + high) // 2
+            if self._page(outlet_ids, middle, 1):
+                low = middle
+            else:
+                high = middle
+        return max(self.page_size, high - self.page_size)
+
+    def _settle_chunk(self, outlet_ids: List[str]) -> Optional[Dict[str, List[Dict]]]:
+        """
+        [newest, oldest] for the outlets of one chunk settled by its first and last pages
+
+        An outlet is settled when it shows up in both pages, or when the two pages hold the whole
+        archive. Returns None when a receipt can't be attributed to an outlet.
+        """
+        head = self._page(outlet_ids, 0, self.page_size)
+        if len(head) < self.page_size:
+            return split_first_last(head, outlet_ids)
+        tail_offset = self._tail_offset(outlet_ids)
+        if tail_offset is None:
+            print(f"Receipts for {len(outlet_ids)} outlets run past {self.max_receipts}, "
+                  f"using single-outlet requests")
+            return {}
+        tail = self._page(outlet_ids, tail_offset, self.page_size)
+        if tail_offset == self.page_size:
+            return split_first_last(head + tail, outlet_ids)
+        newest, oldest = split_first_last(head, outlet_ids), split_first_last(tail, outlet_ids)
+        if newest is None or oldest is None:
+            return None
+        # An outlet seen only in the middle of the archive, or in just one of the pages, is not settled
+        return {outlet_id: [newest[outlet_id][0], oldest[outlet_id][1]]
+                for outlet_id in outlet_ids if newest[outlet_id] and oldest[outlet_id]}
+
+    def _fetch_chunk(self, outlet_ids: List[str]) -> Dict[str, List[Dict]]:
+        split = self._settle_chunk(outlet_ids)
+        if split is None:
+            print(f"Receipts for {len(outlet_ids)} outlets could not be split, using single-outlet requests")
+            return {}
+        return split
+
+    def first_last(self, outlet_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Map outlet ID to its [newest, oldest] receipts ([] when it had no sales)
+
+        Only the first and last page of each chunk's combined archive are fetched. Outlets missing
+        from the result were not settled by those pages, could not be demultiplexed, or their chunk
+        had a failed page (fetch_page must raise then), and should be searched one at a time.
+        """
+        if self.batch_size <= 1 or len(outlet_ids) <= 1:
+            return {}
+        resolved = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._fetch_chunk, chunk) for chunk in chunked(outlet_ids, self.batch_size)]
+        for future in futures:
+            try:
+                resolved.update(future.result())
+            except Exception as e:
+                print(f"Batched receipt request failed, using single-outlet requests: {str(e)}")
+        print(f"Resolved receipts for {len(resolved)}/{len(outlet_ids)} outlets through batched requests")
+        return resolved
+
+    def _fold_chunk(self, outlet_ids: List[str], new_state: Callable[[], Any]) -> Dict[str, Any]:
+        receipts = iter_receipts(lambda offset, limit: self.fetch_page(outlet_ids, offset, limit))
+        states = split_fold(receipts, outlet_ids, new_state)
+        if states is None:
+            print(f"Receipts for {len(outlet_ids)} outlets could not be split, using single-outlet requests")
+            return {}
+        return states
+
+    def fold(self, outlet_ids: List[str], new_state: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        Stream every receipt of every outlet once, in batched requests, into one state per outlet
+
+        Like first_last, outlets missing from the result should be fetched one at a time.
+        """
+        if self.batch_size <= 1 or len(outlet_ids) <= 1:
+            return {}
+        folded = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._fold_chunk, chunk, new_state)
+                       for chunk in chunked(outlet_ids, self.batch_size)]
+        for future in futures:
+            try:
+                folded.update(future.result())
+            except Exception as e:
+                print(f"Batched receipt request failed, using single-outlet requests: {str(e)}")
+        print(f"Streamed receipts for {len(folded)}/{len(outlet_ids)} outlets through batched requests")
+        return folded
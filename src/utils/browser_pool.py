@@ -0,0 +1,151 @@
+import os
+import copy
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
+
+from src.config import Config
+from src.utils.tracing import tracer
+
+_driver_path_lock = threading.Lock()
+
+def resolve_driver_path(config: Config) -> str:
+    """chromedriver path, resolved through webdriver_manager only once and then cached on disk"""
+    if os.environ.get("GITHUB_ACTIONS") == "true":
+        # Use system ChromeDriver
+        return '/usr/bin/chromedriver'
+
+    cache_file = os.path.join(config.cache_dir, 'chromedriver_path')
+    with _driver_path_lock:
+        try:
+            with open(cache_file) as f:
+                path = f.read().strip()
+            if os.access(path, os.X_OK):
+                return path
+        except OSError:
+            pass
+
+        # Use webdriver_manager for local development (needs network access)
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+        os.makedirs(config.cache_dir, exist_ok=True)
+        with open(cache_file, 'w') as f:
+            f.write(path)
+        return path
+
+def profile_dir(config: Config, email: str) -> str:
+    """Persistent Chrome --user-data-dir for an account"""
+    digest = hashlib.sha256(email.lower().encode()).hexdigest()[:16]
+    return os.path.abspath(os.path.join(config.browser_profile_dir, digest))
+
+def create_driver(config: Config, email: str):
+    """Set up browser driver with appropriate options for both local and CI environments"""
+    # Copied so concurrent scrapers don't share one instance
+    options = copy.deepcopy(config.chrome_options)
+    options.add_argument(f'--user-data-dir={profile_dir(config, email)}')
+
+    if os.environ.get("GITHUB_ACTIONS") == "true":
+        # Configure for Chromium in GitHub Actions environment
+        options.binary_location = '/usr/bin/chromium-browser'
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+    service = Service(resolve_driver_path(config))
+
+    driver_module = webdriver
+    if config.capture_mode == 'wire':
+        try:
+            # Optional and slow to import, so only loaded for CAPTURE_MODE=wire
+            from seleniumwire import webdriver as driver_module
+        except ImportError:
+            print("selenium-wire is not installed, capturing cookies through CDP instead")
+
+    print("Setting up browser driver...")
+    with tracer.span('driver setup', account=email):
+        driver = driver_module.Chrome(service=service, options=options)
+    print("Browser driver setup completed successfully")
+    return driver
+
+def quit_driver(driver) -> None:
+    try:
+        driver.quit()
+    except WebDriverException as e:
+        print(f"Error closing browser: {str(e)}")
+
+class BrowserPool:
+    """Warm Chrome drivers, at most `size` alive at once, each tied to its account's persistent profile"""
+
+    def __init__(self, config: Config, size: int):
+        self.config = config
+        self.size = size
+        self.condition = threading.Condition()
+        self.idle: Dict[str, object] = {}
+        self.idle_order: List[str] = []
+        self.live = 0
+
+    def _take(self, email: str):
+        """Reserve a driver slot; returns an idle driver for the account or None to start one"""
+        with self.condition:
+            while True:
+                if email in self.idle:
+                    self.idle_order.remove(email)
+                    return self.idle.pop(email)
+                if self.live < self.size:
+                    self.live += 1
+                    return None
+                if self.idle_order:
+                    # At capacity: make room by closing the longest-idle driver of another account
+                    oldest = self.idle_order.pop(0)
+                    quit_driver(self.idle.pop(oldest))
+                    self.live -= 1
+                    continue
+                self.condition.wait()
+
+    def _discard(self, driver) -> None:
+        if driver is not None:
+            quit_driver(driver)
+        with self.condition:
+            self.live -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def borrow(self, email: str):
+        """Lend a driver for the account and take it back afterwards; a driver that errored is closed"""
+        driver = self._take(email)
+        try:
+            if driver is not None:
+                try:
+                    driver.current_url  # still responsive?
+                except WebDriverException:
+                    quit_driver(driver)
+                    driver = None
+            if driver is None:
+                driver = create_driver(self.config, email)
+        except Exception:
+            self._discard(None)
+            raise
+
+        try:
+            yield driver
+        except Exception:
+            self._discard(driver)
+            raise
+        with self.condition:
+            self.idle[email] = driver
+            self.idle_order.append(email)
+            self.condition.notify()
+
+    def close_all(self) -> None:
+        """Quit every idle driver"""
+        with self.condition:
+            drivers = list(self.idle.values())
+            self.idle.clear()
+            self.idle_order.clear()
+            self.live -= len(drivers)
+            self.condition.notify_all()
+        for driver in drivers:
+            quit_driver(driver)
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Optional
+
+def _atomic_write(path: str, data: str) -> None:
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class ResponseCache:
+    """On-disk ownercab response cache keyed by endpoint plus a hash of the normalized payload"""
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int):
+        """
+        Args:
+            directory: Folder holding one JSON file per cached response
+            ttl_seconds: Entries older than this are treated as missing
+            max_bytes: evict() removes the oldest entries until the folder fits
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, payload: Dict) -> str:
+        normalized = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(f"{url}\n{normalized}".encode()).hexdigest()
+
+    def _path(self, url: str, payload: Dict) -> str:
+        return os.path.join(self.directory, f"{self.key(url, payload)}.json")
+
+    def get(self, url: str, payload: Dict) -> Optional[Dict]:
+        """Cached response body, or None if missing or past its TTL"""
+        path = self._path(url, payload)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, payload: Dict, body: Dict) -> None:
+        """Store a successful response body"""
+        try:
+            _atomic_write(self._path(url, payload), json.dumps(body))
+        except OSError as e:
+            print(f"Could not cache response from {url}: {str(e)}")
+
+    def evict(self) -> None:
+        """Drop expired entries, then the oldest ones until the cache fits in max_bytes"""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                os.remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+class RunManifest:
+    """
+    Append-only log of the outlets of one account and report date that are already done
+
+    Each line holds one outlet's result, so a resumed run rebuilds those rows without the network
+    and each finished outlet costs one appended line rather than a rewrite of the whole file.
+    """
+
+    RESULT_FIELDS = ('sales_list', 'first_sale', 'last_sale', 'waffle_end_time')
+
+    def __init__(self, directory: str, email: str, report_date: str, ttl_seconds: float):
+        """
+        Args:
+            directory: Folder holding one subfolder of logs per report date
+            email: Account (or account shard) the log belongs to, matched case-insensitively
+            report_date: Report day, YYYY-MM-DD
+            ttl_seconds: A log last written longer ago than this is discarded, like an expired response
+        """
+        digest = hashlib.sha256(email.lower().encode()).hexdigest()[:16]
+        self.path = os.path.join(directory, report_date, f"{digest}.jsonl")
+        self.lock = threading.Lock()
+        self.done: Dict[str, Dict] = {}
+        try:
+            if time.time() - os.path.getmtime(self.path) > ttl_seconds:
+                os.remove(self.path)
+                return
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done[entry['outlet_id']] = entry['result']
+                    except (ValueError, KeyError, TypeError):
+                        # The last line of a run killed mid-write
+                        continue
+        except OSError:
+            pass
+
+    def result(self, outlet_id: str) -> Optional[Dict]:
+        """The recorded result of a done outlet, without name_id"""
+        return self.done.get(outlet_id)
+
+    def mark_done(self, outlet_id: str, result: Dict) -> None:
+        """Append one finished outlet's result"""
+        entry = {'outlet_id': outlet_id, 'result': {field: result[field] for field in self.RESULT_FIELDS}}
+        with self.lock:
+            self.done[outlet_id] = entry['result']
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError as e:
+                print(f"Could not record {outlet_id} in the run manifest: {str(e)}")
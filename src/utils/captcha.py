@@ -1,53 +1,171 @@
-import time
+import os
 import re
-from bs4 import BeautifulSoup
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from twocaptcha import TwoCaptcha
+from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support import expected_conditions as EC
+
+from src.utils.tracing import tracer
+from src.utils.waits import LOGIN_URL, CHALLENGE_IFRAME, wait_for, recaptcha_ready, url_is_not
 
-def solve_captcha(driver: WebDriver, api_key: str) -> bool:
+# reCAPTCHA tokens expire two minutes after they are issued; keep a safety margin
+TOKEN_TTL_SECONDS = 110
+
+class CaptchaSolver:
+    """
+    Shared 2captcha pipeline: solves run on background threads so they overlap with other
+    accounts' work, site keys are remembered between runs, and a token that was solved but
+    never used is handed to the next login that needs one while it is still valid
+    """
+
+    def __init__(self, api_key: str, cache_dir: str, workers: int = 4, cost_per_solve: float = 0.0):
+        self.api_key = api_key
+        self.cost_per_solve = cost_per_solve
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='captcha')
+        self.lock = threading.Lock()
+        self.pending: Dict[str, List[Future]] = {}
+        self.solves: List[Dict] = []
+        self.site_key_file = os.path.join(cache_dir, 'captcha_site_keys.json')
+        try:
+            with open(self.site_key_file) as f:
+                self.site_keys = json.load(f)
+        except (OSError, ValueError):
+            self.site_keys = {}
+
+    def site_key(self, page_url: str) -> Optional[str]:
+        """Site key seen on this page in an earlier login, if any"""
+        return self.site_keys.get(page_url)
+
+    def remember_site_key(self, page_url: str, site_key: str) -> None:
+        with self.lock:
+            if self.site_keys.get(page_url) == site_key:
+                return
+            self.site_keys[page_url] = site_key
+            os.makedirs(os.path.dirname(self.site_key_file) or '.', exist_ok=True)
+            with open(self.site_key_file, 'w') as f:
+                json.dump(self.site_keys, f)
+
+    def _solve(self, site_key: str, page_url: str) -> Tuple[Optional[str], float]:
+        """Blocking 2captcha call; returns (token, time it was issued)"""
+        start = time.perf_counter()
+        token = None
+        with tracer.span('2captcha solve') as span:
+            try:
+                result = TwoCaptcha(self.api_key).recaptcha(sitekey=site_key, url=page_url, invisible=1, enterprise=0)
+                token = result.get('code')
+            except Exception as e:
+                print(f"Error solving captcha: {str(e)}")
+            span['ok'] = token is not None
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.solves.append({'seconds': latency, 'ok': token is not None})
+        print(f"Captcha solve took {latency:.1f}s" + ("" if token else " and failed"))
+        return token, time.time()
+
+    def prefetch(self, site_key: str, page_url: str) -> None:
+        """Start a solve in the background; the token goes to whichever login asks first"""
+        future = self.executor.submit(self._solve, site_key, page_url)
+        with self.lock:
+            self.pending.setdefault(site_key, []).append(future)
+
+    def ensure_solving(self, site_key: str, page_url: str) -> None:
+        """Prefetch unless a solve for this site key is already queued or waiting to be used"""
+        with self.lock:
+            if self.pending.get(site_key):
+                return
+        self.prefetch(site_key, page_url)
+
+    def _take_pending(self, site_key: str) -> Optional[Future]:
+        """Oldest in-flight or solved token that has not expired yet"""
+        with self.lock:
+            futures = self.pending.get(site_key, [])
+            while futures:
+                future = futures.pop(0)
+                if not future.done():
+                    return future
+                token, issued_at = future.result()
+                if token and time.time() - issued_at < TOKEN_TTL_SECONDS:
+                    print("Reusing captcha token solved earlier")
+                    return future
+        return None
+
+    def token(self, site_key: str, page_url: str) -> Optional[str]:
+        """A fresh token for the site key, reusing an unexpired or in-flight solve when there is one"""
+        while True:
+            future = self._take_pending(site_key)
+            if future is None:
+                return self._solve(site_key, page_url)[0]
+            token, issued_at = future.result()
+            if token and time.time() - issued_at < TOKEN_TTL_SECONDS:
+                return token
+
+    def print_summary(self) -> None:
+        """Per-run solve count, latency and estimated spend"""
+        with self.lock:
+            solves = list(self.solves)
+        if not solves:
+            return
+        seconds = sorted(solve['seconds'] for solve in solves)
+        failed = sum(1 for solve in solves if not solve['ok'])
+        print(f"\nCaptcha: {len(solves)} solve(s), {failed} failed, "
+              f"mean {sum(seconds) / len(seconds):.1f}s, max {seconds[-1]:.1f}s, "
+              f"est. cost ${len(solves) * self.cost_per_solve:.4f}")
+
+    def shutdown(self) -> None:
+        """Stop taking work; unused background solves are abandoned"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def solve_captcha(driver: WebDriver, solver: CaptchaSolver) -> bool:
+    """Solve the challenge on the current page, timed as the `captcha` span"""
+    with tracer.span('captcha') as span:
+        span['ok'] = _solve_captcha(driver, solver)
+        return span['ok']
+
+def _solve_captcha(driver: WebDriver, solver: CaptchaSolver) -> bool:
     """
     Solve reCAPTCHA using 2captcha service
     
     Args:
         driver: Selenium WebDriver instance
-        api_key: 2captcha API key
+        solver: Shared CaptchaSolver
     
     Returns:
         bool: True if captcha solved successfully
     """
     try:
         print("Solving Captcha...")
-        time.sleep(10)  # Wait for captcha to load
+        page_url = driver.current_url
         
-        solver = TwoCaptcha(api_key)
-        soup = BeautifulSoup(driver.page_source, "html.parser")
+        # With a known site key the solve starts while the challenge is still loading
+        cached_site_key = solver.site_key(page_url)
+        if cached_site_key:
+            solver.ensure_solving(cached_site_key, page_url)
         
-        # Find captcha iframe
-        iframe = soup.find('iframe', {'title': 'recaptcha challenge expires in two minutes'})
+        iframe = wait_for(driver, EC.presence_of_element_located((By.CSS_SELECTOR, CHALLENGE_IFRAME)),
+                          20, "captcha iframe")
         if not iframe:
             print("Captcha iframe not found!")
             return False
             
-        recaptcha_url = iframe.get('src')
+        recaptcha_url = iframe.get_attribute('src')
         print("Recaptcha iframe src:", recaptcha_url)
         
         # Extract site key
-        key_match = re.search("&k=([^&]+)", recaptcha_url)
+        key_match = re.search("&k=([^&]+)", recaptcha_url or '')
         if not key_match:
             print("Site key not found in captcha iframe!")
             return False
             
         site_key = key_match.group(1)
+        solver.remember_site_key(page_url, site_key)
         
-        # Solve captcha
-        result = solver.recaptcha(
-            sitekey=site_key,
-            url=driver.current_url,
-            invisible=1,
-            enterprise=0
-        )
-        
-        captcha_response = result.get('code')
+        # Solve captcha (or pick up the token that is already on its way)
+        captcha_response = solver.token(site_key, page_url)
         if not captcha_response:
             print("No captcha solution received!")
             return False
@@ -65,7 +183,7 @@ def solve_captcha(driver: WebDriver, api_key: str) -> bool:
         }
         """
         driver.execute_script(set_token_js, captcha_response)
-        time.sleep(5)
+        wait_for(driver, recaptcha_ready, 10, "grecaptcha clients")
         
         # Find and execute callback
         find_clients_js = """
@@ -113,7 +231,7 @@ def solve_captcha(driver: WebDriver, api_key: str) -> bool:
                 
         if callback:
             driver.execute_script(f"{callback}('{captcha_response}');")
-            time.sleep(4)
+            wait_for(driver, url_is_not(LOGIN_URL), 15, "redirect after captcha")
             return True
         else:
             print("No matching callback found")
@@ -0,0 +1,138 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.cache import ResponseCache
+
+# Only these response headers are kept; Set-Cookie and friends never reach the file
+KEPT_HEADERS = ('Content-Type', 'Retry-After')
+
+class CassetteMiss(Exception):
+    """Replay was asked for a request the cassette never recorded"""
+
+def cassette_path(directory: str, email: str, report_date: str) -> str:
+    digest = hashlib.sha256(email.lower().encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{digest}_{report_date}.jsonl.gz")
+
+def _request_key(request: requests.PreparedRequest) -> str:
+    body = request.body or b''
+    if isinstance(body, str):
+        body = body.encode()
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        payload = {'raw': hashlib.sha256(body).hexdigest()}
+    return f"{request.method} {ResponseCache.key(request.url, payload)}"
+
+class Cassette:
+    """
+    Every request/response made through one requests session, stored as gzipped JSON lines
+
+    The first line holds metadata (the outlet list); each further line is one exchange keyed by
+    method, URL and a hash of the normalized JSON body. Request headers are not stored at all,
+    so cookies never end up in the file.
+    """
+
+    def __init__(self, path: str, timing: float = 0.0):
+        """
+        Args:
+            path: Cassette file (.jsonl.gz)
+            timing: On replay, sleep this fraction of each recorded response time (0 = instant, 1 = real)
+        """
+        self.path = path
+        self.timing = timing
+        self.lock = threading.Lock()
+        self.meta: Dict = {}
+        self.exchanges: List[Dict] = []
+        self.by_key: Dict[str, List[Dict]] = {}
+        self.played: Dict[str, int] = {}
+
+    def load(self) -> 'Cassette':
+        with gzip.open(self.path, 'rt') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        self.meta = lines[0].get('meta', {}) if lines else {}
+        self.exchanges = lines[1:]
+        for exchange in self.exchanges:
+            self.by_key.setdefault(exchange['key'], []).append(exchange)
+        return self
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self.lock:
+            lines = [{'meta': self.meta}] + list(self.exchanges)
+        with gzip.open(tmp_path, 'wt') as f:
+            for line in lines:
+                f.write(json.dumps(line, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+        print(f"Recorded {len(lines) - 1} request(s) to {self.path}")
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response) -> None:
+        exchange = {
+            'key': _request_key(request),
+            'url': request.url,
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            'body': response.content.decode('utf-8', errors='replace'),
+            'seconds': round(response.elapsed.total_seconds(), 4),
+        }
+        with self.lock:
+            self.exchanges.append(exchange)
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        """The recorded response; repeated requests get the recorded repeats in order, then the last one"""
+        key = _request_key(request)
+        with self.lock:
+            recorded = self.by_key.get(key)
+            if not recorded:
+                raise CassetteMiss(f"No recorded response for {request.method} {request.url}")
+            index = self.played.get(key, 0)
+            self.played[key] = index + 1
+            exchange = recorded[min(index, len(recorded) - 1)]
+        if self.timing:
+            time.sleep(exchange['seconds'] * self.timing)
+
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.headers.update(exchange['headers'])
+        response._content = exchange['body'].encode()
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+class CassetteAdapter(HTTPAdapter):
+    """Transport adapter that records through to the network or replays from a cassette"""
+
+    def __init__(self, cassette: Cassette, mode: str):
+        super().__init__()
+        self.cassette = cassette
+        self.mode = mode
+
+    def send(self, request, **kwargs):
+        if self.mode == 'replay':
+            return self.cassette.replay(request)
+        response = super().send(request, **kwargs)
+        self.cassette.record(request, response)
+        return response
+
+def attach(session: requests.Session, cassette: Cassette, mode: str) -> requests.Session:
+    """Route every http(s) request of the session through the cassette"""
+    adapter = CassetteAdapter(cassette, mode)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def new_recording(path: str, name_ids: List[Tuple[str, str]]) -> Cassette:
+    cassette = Cassette(path)
+    cassette.meta = {'recorded_at': datetime.now().isoformat(timespec='seconds'),
+                     'name_ids': [list(name_id) for name_id in name_ids]}
+    return cassette
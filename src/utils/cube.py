@@ -0,0 +1,152 @@
+import os
+import json
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from src.utils.ownercab import FIRST_HOUR, LAST_HOUR
+
+HOURS = LAST_HOUR - FIRST_HOUR
+
+class SalesCube:
+    """
+    Outlet x day x hour sales, memory-mapped so queries only read the rows they touch
+
+    Three files live in the directory:
+        hourly.f4   float32 rows of 14 hourly values (9am-10pm)
+        index.i4    int32 (outlet number, day ordinal) per row; its length is the committed row count
+        outlets.json  outlet numbers -> account/outlet id key and name
+
+    New outlet-days are appended. A re-fetched outlet-day overwrites its row in place, found through the
+    in-memory (outlet, day) -> row map that is read from the index once when the cube is opened.
+    """
+
+    def __init__(self, directory: str, batch_size: int = 1000):
+        self.directory = directory
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+        self.data_path = os.path.join(directory, 'hourly.f4')
+        self.index_path = os.path.join(directory, 'index.i4')
+        self.outlets_path = os.path.join(directory, 'outlets.json')
+        self.lock = threading.Lock()
+        self.pending: Dict[Tuple[int, int], np.ndarray] = {}
+        try:
+            with open(self.outlets_path) as f:
+                self.outlets: List[Dict] = json.load(f)
+        except (OSError, ValueError):
+            self.outlets = []
+        self.outlet_numbers = {outlet['key']: number for number, outlet in enumerate(self.outlets)}
+        self._repair()
+        self.rows = self._rows()
+        self.offsets: Dict[Tuple[int, int], int] = {}
+        if self.rows:
+            index = np.fromfile(self.index_path, dtype=np.int32, count=self.rows * 2).reshape(-1, 2)
+            # A cube written before rows were updated in place may hold duplicates; the newest row wins
+            self.offsets = {(number, day): row for row, (number, day) in enumerate(index.tolist())}
+
+    def _rows(self) -> int:
+        try:
+            return os.path.getsize(self.index_path) // 8
+        except OSError:
+            return 0
+
+    def _repair(self) -> None:
+        """Drop a half-written index entry, and data rows a crash left behind without their index entry"""
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        rows = min(self._rows(), data_size // (HOURS * 4))
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) != rows * 8:
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(rows * 8)
+        if data_size > rows * HOURS * 4:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(rows * HOURS * 4)
+
+    def add(self, account: str, outlet_id: str, outlet_name: str, report_date: str, sales_list: List[float]) -> None:
+        """Queue one outlet-day; a short sales list is padded with NaN, a longer one than HOURS is refused"""
+        if len(sales_list) > HOURS:
+            raise ValueError(f"{len(sales_list)} hourly values for {outlet_id} on {report_date}, expected {HOURS}")
+        values = np.full(HOURS, np.nan, dtype=np.float32)
+        values[:len(sales_list)] = sales_list
+        key = f"{account}/{outlet_id}"
+        with self.lock:
+            number = self.outlet_numbers.get(key)
+            if number is None:
+                number = self.outlet_numbers[key] = len(self.outlets)
+                self.outlets.append({'key': key, 'name': outlet_name})
+            self.pending[(number, date.fromisoformat(report_date).toordinal())] = values
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        updates = [(self.offsets[key], values) for key, values in self.pending.items() if key in self.offsets]
+        appends = [(key, values) for key, values in self.pending.items() if key not in self.offsets]
+        tmp_path = f"{self.outlets_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.outlets, f)
+        os.replace(tmp_path, self.outlets_path)
+        if updates:
+            with open(self.data_path, 'r+b') as f:
+                for row, values in updates:
+                    f.seek(row * HOURS * 4)
+                    f.write(values.tobytes())
+        if appends:
+            values = np.stack([values for _, values in appends])
+            index = np.array([key for key, _ in appends], dtype=np.int32)
+            # Data first, index last: the index length is what commits the rows
+            with open(self.data_path, 'ab') as f:
+                f.write(values.tobytes())
+            with open(self.index_path, 'ab') as f:
+                f.write(index.tobytes())
+            for row, (key, _) in enumerate(appends, self.rows):
+                self.offsets[key] = row
+            self.rows += len(appends)
+        self.pending = {}
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def close(self) -> None:
+        self.flush()
+
+    def outlet_numbers_matching(self, outlet: str) -> List[int]:
+        """Outlets whose name, id or account/id key is `outlet`"""
+        return [number for number, entry in enumerate(self.outlets)
+                if outlet in (entry['name'], entry['key'], entry['key'].split('/', 1)[1])]
+
+    def query(self, start_date: str, end_date: str, outlets: Optional[List[int]] = None
+              ) -> Tuple[List[Dict], List[str], np.ndarray]:
+        """
+        Dense slice of the cube between two dates inclusive
+
+        Returns:
+            (outlets, dates, values) with values shaped outlets x days x 14; NaN where nothing was stored
+        """
+        first, last = date.fromisoformat(start_date).toordinal(), date.fromisoformat(end_date).toordinal()
+        numbers = sorted(outlets) if outlets is not None else list(range(len(self.outlets)))
+        # Rows are looked up in the offset map, never by scanning the index
+        cells = []
+        with self.lock:
+            self._flush()
+            for position, number in enumerate(numbers):
+                for day in range(first, last + 1):
+                    row = self.offsets.get((number, day))
+                    if row is not None:
+                        cells.append((position, day - first, row))
+            rows = self.rows
+        if outlets is None:
+            # Without an outlet filter, only outlets with something stored in the range
+            kept = sorted({position for position, _, _ in cells})
+            renumber = {position: new for new, position in enumerate(kept)}
+            numbers = [numbers[position] for position in kept]
+            cells = [(renumber[position], day, row) for position, day, row in cells]
+        cube = np.full((len(numbers), last - first + 1, HOURS), np.nan, dtype=np.float32)
+        if cells:
+            positions, days, wanted = (np.array(column) for column in zip(*cells))
+            data = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(rows, HOURS))
+            cube[positions, days] = data[wanted]
+        dates = [str(date.fromordinal(day)) for day in range(first, last + 1)]
+        return [self.outlets[number] for number in numbers], dates, cube
@@ -1,26 +1,34 @@
+import threading
 import xlsxwriter
-from typing import List, Any
+from typing import List, Any, Optional
 
 def create_workbook(filename: str) -> xlsxwriter.Workbook:
-    """Create and configure Excel workbook with formats"""
+    """
+    Create the workbook in constant_memory mode
+
+    Each worksheet keeps only its current row in memory and flushes it to a temp file, so rows
+    must be written top to bottom; formats that cover whole ranges are added once the size is known.
+    """
     print(f"Generating {filename} ...")
-    workbook = xlsxwriter.Workbook(filename)
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
     return workbook
 
 def setup_worksheet_formatting(workbook: xlsxwriter.Workbook, worksheet: xlsxwriter.Workbook.worksheet_class):
-    """Setup worksheet with conditional formatting"""
-    # Create formats
+    """Bold outlet column and header row; must run before row 0 is written"""
     cell_format = workbook.add_format()
     cell_format.set_bold()
-    format1 = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
-    format2 = workbook.add_format({'bg_color': ''})
-
-    # Set basic formatting
     worksheet.set_column("A:A", None, cell_format)
     worksheet.set_row(0, None, cell_format)
 
+def add_alert_formats(workbook: xlsxwriter.Workbook, worksheet: xlsxwriter.Workbook.worksheet_class,
+                      last_row: int, waffle_gap_minutes: float = 30):
+    """Conditional formatting over data rows 2..last_row (Excel numbering)"""
+    last_row = max(last_row, 2)
+    format1 = workbook.add_format({'bg_color': '#FFC7CE', 'font_color': '#9C0006'})
+    format2 = workbook.add_format({'bg_color': ''})
+
     # Alert for "Alert" text in column B
-    worksheet.conditional_format('B2:B200', {
+    worksheet.conditional_format(f'B2:B{last_row}', {
         'type': 'cell',
         'criteria': '==',
         'value': '"Alert"',
@@ -28,24 +36,53 @@ def setup_worksheet_formatting(workbook: xlsxwriter.Workbook, worksheet: xlsxwri
     })
 
     # Blank waffle end time
-    worksheet.conditional_format('D2:D200', {
+    worksheet.conditional_format(f'D2:D{last_row}', {
         'type': 'formula',
         'criteria': '=(ISBLANK(D2)=TRUE)',
         'stop_if_true': True,
         'format': format2
     })
 
-    # Time difference alert
-    worksheet.conditional_format('D2:D200', {
+    # Waffles ended more than ALERT_WAFFLE_GAP_MINUTES before the last sale
+    worksheet.conditional_format(f'D2:D{last_row}', {
         'type': 'formula',
-        'criteria': '=(($E2-$D2)>30/(24*60))',
+        'criteria': f'=(($E2-$D2)>{waffle_gap_minutes:g}/(24*60))',
         'format': format1
     })
 
     # Zero sales alert
-    worksheet.conditional_format('F2:S200', {
+    worksheet.conditional_format(f'F2:S{last_row}', {
         'type': 'cell',
         'criteria': '=',
         'value': 0,
         'format': format1
-    })
\ No newline at end of file
+    })
+
+class SheetWriter:
+    """Streams rows into one worksheet as they arrive, one bulk write_row call per row"""
+
+    def __init__(self, workbook: xlsxwriter.Workbook, name: str, lock: Optional[threading.Lock] = None,
+                 waffle_gap_minutes: float = 30):
+        """
+        Args:
+            workbook: Workbook the sheet is added to
+            name: Sheet name
+            lock: Shared by every SheetWriter of a workbook when several threads write into it
+            waffle_gap_minutes: Highlight a waffle end this long before the last sale (ALERT_WAFFLE_GAP_MINUTES)
+        """
+        self.workbook = workbook
+        self.worksheet = workbook.add_worksheet(name)
+        self.lock = lock or threading.Lock()
+        self.rows = 0
+        self.waffle_gap_minutes = waffle_gap_minutes
+        setup_worksheet_formatting(workbook, self.worksheet)
+
+    def write_row(self, values: List[Any]) -> None:
+        with self.lock:
+            self.worksheet.write_row(self.rows, 0, values)
+            self.rows += 1
+
+    def close(self) -> None:
+        """Add the alert formats sized to the rows written; call before the workbook is closed"""
+        with self.lock:
+            add_alert_formats(self.workbook, self.worksheet, self.rows, self.waffle_gap_minutes)
@@ -0,0 +1,141 @@
+import csv
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Tuple, Any
+
+# Optional: only needed for EXPORT_FORMATS=parquet or arrow, and only imported when one is written
+HAS_PYARROW = find_spec('pyarrow') is not None
+
+from src.utils.ownercab import FIRST_HOUR, LAST_HOUR, REPORT_TZ
+from src.utils.tracing import tracer
+
+HOUR_COLUMNS = [f"sales_{hour:02d}" for hour in range(FIRST_HOUR, LAST_HOUR)]
+TIME_COLUMNS = ['sales_start', 'waffle_end', 'sales_end']
+# Report times are Kuala Lumpur wall-clock times; typed exports carry the zone so they are not read as UTC
+EXPORT_TZ = 'Asia/Kuala_Lumpur'
+COLUMNS = ['report_date', 'account', 'outlet', 'alert'] + TIME_COLUMNS + HOUR_COLUMNS + ['alerts']
+
+def _report_time(report_date: str, value: Optional[str]) -> Optional[datetime]:
+    """'09:15 AM' on the report day as a datetime"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(f"{report_date} {value}", "%Y-%m-%d %I:%M %p")
+    except ValueError:
+        return None
+
+def report_record(report_date: str, account: str, row: List[Any]) -> Tuple:
+    """Typed record, in COLUMNS order, from a report row [outlet, alert, start, waffle end, end, hourly sales..., alerts]"""
+    storename, alert, first_sale, waffle_end_time, last_sale = row[:5]
+    alerts = row[5 + len(HOUR_COLUMNS)] if len(row) > 5 + len(HOUR_COLUMNS) else None
+    return (
+        datetime.strptime(report_date, "%Y-%m-%d").date(), account, storename, alert == "Alert",
+        _report_time(report_date, first_sale), _report_time(report_date, waffle_end_time),
+        _report_time(report_date, last_sale),
+        *(float(sales) if sales is not None else None for sales in row[5:5 + len(HOUR_COLUMNS)]),
+        alerts,
+    )
+
+class ColumnarExporter(ABC):
+    """Collects report rows from any thread and writes them as one typed file on close"""
+
+    extension = ''
+
+    def __init__(self, base_path: str):
+        self.path = f"{base_path}.{self.extension}"
+        self.lock = threading.Lock()
+        self.records: List[Tuple] = []
+
+    def add_row(self, report_date: str, account: str, row: List[Any]) -> None:
+        record = report_record(report_date, account, row)
+        with self.lock:
+            self.records.append(record)
+
+    def close(self) -> str:
+        with self.lock:
+            records = list(self.records)
+        self._write(records)
+        print(f"Exported {len(records)} row(s) to {self.path}")
+        return self.path
+
+    @abstractmethod
+    def _write(self, records: List[Tuple]) -> None:
+        """Write every collected record to self.path"""
+
+class CsvExporter(ColumnarExporter):
+    extension = 'csv'
+
+    def _write(self, records: List[Tuple]) -> None:
+        with open(self.path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for record in records:
+                writer.writerow(value.isoformat() if hasattr(value, 'isoformat') else value for value in record)
+
+def _arrow_table(records: List[Tuple]):
+    import pyarrow as pa
+    schema = pa.schema(
+        [('report_date', pa.date32()), ('account', pa.string()), ('outlet', pa.string()), ('alert', pa.bool_())]
+        + [(name, pa.timestamp('s', tz=EXPORT_TZ)) for name in TIME_COLUMNS]
+        + [(name, pa.float64()) for name in HOUR_COLUMNS]
+        + [('alerts', pa.string())]
+    )
+    columns = list(zip(*records)) if records else [[] for _ in COLUMNS]
+    # Naive report times would be taken as UTC by a zoned column
+    times = slice(COLUMNS.index(TIME_COLUMNS[0]), COLUMNS.index(TIME_COLUMNS[-1]) + 1)
+    columns[times] = [[value.replace(tzinfo=REPORT_TZ) if value else None for value in column]
+                      for column in columns[times]]
+    return pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                schema=schema)
+
+class ParquetExporter(ColumnarExporter):
+    extension = 'parquet'
+
+    def _write(self, records: List[Tuple]) -> None:
+        import pyarrow.parquet as pq
+        pq.write_table(_arrow_table(records), self.path, compression='zstd')
+
+class ArrowExporter(ColumnarExporter):
+    extension = 'arrow'
+
+    def _write(self, records: List[Tuple]) -> None:
+        import pyarrow as pa
+        table = _arrow_table(records)
+        with pa.OSFile(self.path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+EXPORTERS: Dict[str, type] = {
+    'csv': CsvExporter,
+    'parquet': ParquetExporter,
+    'arrow': ArrowExporter,
+}
+
+def create_exporters(formats: List[str], base_path: str) -> List[ColumnarExporter]:
+    """
+    One exporter per requested format, written next to the workbook as base_path.<ext>
+
+    Parquet and Arrow need pyarrow; without it they fall back to CSV.
+    """
+    exporters, created = [], set()
+    for name in formats:
+        if name not in EXPORTERS:
+            print(f"Unknown export format '{name}', skipping (use {', '.join(EXPORTERS)})")
+            continue
+        if name != 'csv' and not HAS_PYARROW:
+            print(f"pyarrow is not installed, exporting CSV instead of {name}")
+            name = 'csv'
+        if name not in created:
+            created.add(name)
+            exporters.append(EXPORTERS[name](base_path))
+    return exporters
+
+def close_exporters(exporters: List[ColumnarExporter]):
+    """Write the columnar exports; a failed export is logged and never costs the xlsx report"""
+    for exporter in exporters:
+        with tracer.span('export', path=exporter.path):
+            try:
+                exporter.close()
+            except Exception as e:
+                print(f"Error exporting {exporter.path}: {str(e)}")
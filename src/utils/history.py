@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from src.utils.exporters import HOUR_COLUMNS, report_record
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS outlet_days (
+    account TEXT NOT NULL,
+    outlet_id TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    outlet TEXT NOT NULL,
+    alert INTEGER NOT NULL,
+    sales_start TEXT,
+    waffle_end TEXT,
+    sales_end TEXT,
+    {', '.join(f'{column} REAL' for column in HOUR_COLUMNS)},
+    alerts TEXT,
+    PRIMARY KEY (account, outlet_id, report_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS outlet_days_by_outlet_id ON outlet_days (outlet_id, report_date);
+CREATE INDEX IF NOT EXISTS outlet_days_by_outlet ON outlet_days (outlet, report_date);
+"""
+
+COLUMNS = ['account', 'outlet_id', 'report_date', 'outlet', 'alert', 'sales_start', 'waffle_end', 'sales_end'] \
+    + HOUR_COLUMNS + ['alerts']
+
+class HistoryStore:
+    """Every outlet's daily report row in SQLite, keyed by account, outlet and date"""
+
+    def __init__(self, path: str, batch_size: int = 500):
+        """
+        Args:
+            path: SQLite database file, created with its folder if missing
+            batch_size: Rows buffered before they are written in one transaction
+        """
+        self.path = path
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        # Rows arrive from every account's thread; the lock serializes the shared connection
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        # Databases from before the alert engine lack the alerts column
+        if 'alerts' not in {row[1] for row in self.conn.execute("PRAGMA table_info(outlet_days)")}:
+            self.conn.execute("ALTER TABLE outlet_days ADD COLUMN alerts TEXT")
+        self.pending: List[tuple] = []
+
+    def add(self, account: str, outlet_id: str, report_date: str, row: List[Any]) -> None:
+        """Store one report row [outlet, alert, start, waffle end, end, hourly sales..., alerts]"""
+        _, _, storename, alert, *times_and_sales = report_record(report_date, account, row)
+        times = [value.isoformat(sep=' ') if value else None for value in times_and_sales[:3]]
+        record = (account, outlet_id, report_date, storename, int(alert), *times, *times_and_sales[3:])
+        with self.lock:
+            self.pending.append(record)
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO outlet_days ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})", self.pending)
+        self.pending = []
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def missing_days(self, account: str, outlet_ids: List[str], report_dates: List[str]) -> Dict[str, List[str]]:
+        """
+        Outlet ids with no stored row, per date, for the given dates only
+
+        Gaps anywhere in the range count, not just days after an outlet's latest stored date.
+        """
+        self.flush()
+        with self.lock:
+            stored = set(self.conn.execute(
+                "SELECT outlet_id, report_date FROM outlet_days WHERE account = ? AND report_date BETWEEN ? AND ?",
+                (account, min(report_dates), max(report_dates))).fetchall()) if report_dates else set()
+        return {report_date: [outlet_id for outlet_id in outlet_ids if (outlet_id, report_date) not in stored]
+                for report_date in report_dates}
+
+    def day_totals(self, account: str, outlet_ids: List[str], report_dates: List[str]) -> Dict[str, Dict[str, float]]:
+        """9am-10pm sales total per outlet id and date, for the given dates only"""
+        self.flush()
+        wanted = set(outlet_ids)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT outlet_id, report_date, {' + '.join(f'IFNULL({column}, 0)' for column in HOUR_COLUMNS)} "
+                f"FROM outlet_days WHERE account = ? AND report_date IN ({', '.join('?' for _ in report_dates)})",
+                [account, *report_dates]).fetchall()
+        totals: Dict[str, Dict[str, float]] = {}
+        for outlet_id, report_date, total in rows:
+            if outlet_id in wanted:
+                totals.setdefault(outlet_id, {})[report_date] = total
+        return totals
+
+    def outlet_history(self, outlet: str, start_date: str, end_date: str,
+                       account: Optional[str] = None) -> List[Dict]:
+        """Stored rows for an outlet (name or id) between two dates inclusive, oldest first"""
+        self.flush()
+        query = (f"SELECT {', '.join(COLUMNS)} FROM outlet_days "
+                 "WHERE (outlet_id = ? OR outlet = ?) AND report_date BETWEEN ? AND ?")
+        params = [outlet, outlet, start_date, end_date]
+        if account:
+            query += " AND account = ?"
+            params.append(account)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY report_date, account", params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def report_rows(self, report_date: str) -> Dict[str, List[List[Any]]]:
+        """A day's stored rows per account, in report row layout, for rebuilding its workbook offline"""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM outlet_days WHERE report_date = ? "
+                                     "ORDER BY account, outlet", (report_date,)).fetchall()
+        accounts: Dict[str, List[List[Any]]] = {}
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            times = [datetime.fromisoformat(record[column]).strftime("%I:%M %p") if record[column] else None
+                     for column in ('sales_start', 'waffle_end', 'sales_end')]
+            accounts.setdefault(record['account'], []).append(
+                [record['outlet'], "Alert" if record['alert'] else None, *times,
+                 *(record[column] for column in HOUR_COLUMNS), record['alerts']])
+        return accounts
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            self.conn.close()
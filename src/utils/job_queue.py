@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import uuid
+from typing import Dict, List, Optional
+
+JOB_KINDS = ('daily', 'backfill', 'outlet')
+STATES = ('pending', 'running', 'done', 'failed')
+
+class JobQueue:
+    """
+    Local job queue for the daemon: one JSON file per job, moved between state folders
+
+    Every move is an os.replace, so a job is claimed by exactly one daemon and a crash never leaves half a file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        for state in STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state: str, name: str) -> str:
+        return os.path.join(self.directory, state, name)
+
+    def enqueue(self, kind: str, **params) -> str:
+        """Add a job and return its id; jobs run oldest first"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}' (use {', '.join(JOB_KINDS)})")
+        job = {'id': uuid.uuid4().hex[:12], 'kind': kind, 'params': params, 'queued_at': time.time()}
+        # Nanosecond prefix keeps the folder listing in submission order
+        name = f"{time.time_ns()}-{job['id']}.json"
+        tmp_path = self._path('pending', f".{name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._path('pending', name))
+        print(f"Queued {kind} job {job['id']} {params}")
+        return job['id']
+
+    def claim(self) -> Optional[Dict]:
+        """Move the oldest pending job to running and return it, or None when the queue is empty"""
+        for name in sorted(name for name in os.listdir(os.path.join(self.directory, 'pending'))
+                           if name.endswith('.json')):
+            try:
+                os.replace(self._path('pending', name), self._path('running', name))
+            except FileNotFoundError:
+                # Another daemon claimed it first
+                continue
+            with open(self._path('running', name)) as f:
+                job = json.load(f)
+            job['file'] = name
+            return job
+        return None
+
+    def finish(self, job: Dict, ok: bool, message: str = '') -> None:
+        """Record the outcome and move the job to done or failed"""
+        name = job.pop('file')
+        job.update({'finished_at': time.time(), 'ok': ok, 'message': message})
+        state = 'done' if ok else 'failed'
+        with open(self._path('running', name), 'w') as f:
+            json.dump(job, f)
+        os.replace(self._path('running', name), self._path(state, name))
+
+    def requeue_running(self) -> int:
+        """Put jobs a stopped daemon left running back in the queue; returns how many"""
+        names = os.listdir(os.path.join(self.directory, 'running'))
+        for name in names:
+            os.replace(self._path('running', name), self._path('pending', name))
+        return len(names)
+
+    def jobs(self, state: str) -> List[Dict]:
+        """Jobs in one state, oldest first"""
+        jobs = []
+        for name in sorted(os.listdir(os.path.join(self.directory, state))):
+            if name.endswith('.json'):
+                with open(self._path(state, name)) as f:
+                    jobs.append(json.load(f))
+        return jobs
@@ -0,0 +1,15 @@
+from typing import List
+
+# Report columns: outlet, flatline flag ("Internet Problem"), three times, 9am-10pm sales, alert reasons
+REPORT_HEADER = ["Outlet", "Internet Problem", "Sales Start", "Waffle End", "Sales End",
+                 "9am", "10am", "11am", "12pm", "1pm", "2pm", "3pm", "4pm", "5pm",
+                 "6pm", "7pm", "8pm", "9pm", "10pm", "Alerts"]
+
+def report_filename(report_date: str) -> str:
+    return f"barHarian_{report_date}.xlsx"
+
+def sheet_name(email: str) -> str:
+    return email.split('@')[0]
+
+def header_row() -> List[str]:
+    return list(REPORT_HEADER)
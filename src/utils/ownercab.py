@@ -0,0 +1,114 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+# Overridable so benchmarks can point the scraper at a local mock server
+API_BASE = os.getenv('LOYVERSE_API_BASE', 'https://r.loyverse.com/data/ownercab').rstrip('/')
+EARNINGS_REPORT_URL = f'{API_BASE}/getearningsreport'
+RECEIPTS_URL = f'{API_BASE}/getreceiptsarchive'
+WARES_URL = f'{API_BASE}/getwaresreport'
+OUTLETS_URL = f'{API_BASE}/getoutletslist'
+
+WAFFLE_ITEMS = ["C1 Original Waffle", "C001 Classic Waffle"]
+
+# Report columns 9am-10pm are earningsRows[9:23]
+FIRST_HOUR, LAST_HOUR = 9, 23
+
+# Reports are requested for Asia/Kuala_Lumpur, which has no DST; times are shown there whatever the machine's zone
+TZ_OFFSET_MS = 28800000
+REPORT_TZ = timezone(timedelta(milliseconds=TZ_OFFSET_MS))
+
+def earnings_report_payload(startdate: str, enddate: str, outlet_ids: List[str]) -> Dict:
+    """Payload for getearningsreport, hourly buckets"""
+    return {
+        "merchantsIds": "all",
+        "outletsIds": outlet_ids,
+        "startDate": f"{startdate} 00:00:00",
+        "endDate": f"{enddate} 23:59:59",
+        "startWeek": 0,
+        "tzOffset": TZ_OFFSET_MS,
+        "tzName": "Asia/Kuala_Lumpur",
+        "startTime": None,
+        "endTime": None,
+        "customPeriod": True,
+        "predefinedPeriod": {"name": None, "period": None},
+        "divider": "hour",
+        "limit": "10",
+        "offset": 0
+    }
+
+def receipts_payload(startdate: str, enddate: str, outlet_ids: List[str], limit: int = 200, offset: int = 0) -> Dict:
+    """Payload for getreceiptsarchive"""
+    return {
+        "limit": str(limit),
+        "offset": offset,
+        "receiptType": None,
+        "payType": None,
+        "startDate": f"{startdate} 00:00:00",
+        "endDate": f"{enddate} 23:59:59",
+        "search": None,
+        "tzOffset": TZ_OFFSET_MS,
+        "tzName": "Asia/Kuala_Lumpur",
+        "startTime": None,
+        "endTime": None,
+        "startWeek": 0,
+        "receiptId": None,
+        "predefinedPeriod": {"name": None, "period": None},
+        "customPeriod": True,
+        "merchantsIds": "all",
+        "outletsIds": outlet_ids
+    }
+
+def wares_payload(startdate: str, enddate: str, outlet_ids: List[str]) -> Dict:
+    """Payload for getwaresreport"""
+    return {
+        "startDate": f"{startdate} 00:00:00",
+        "endDate": f"{enddate} 23:59:59",
+        "startWeek": 0,
+        "tzOffset": TZ_OFFSET_MS,
+        "tzName": "Asia/Kuala_Lumpur",
+        "startTime": None,
+        "endTime": None,
+        "divider": "hour",
+        "offset": 0,
+        "limit": "10",
+        "merchantsIds": "all",
+        "outletsIds": outlet_ids,
+        "predefinedPeriod": {"name": None, "period": None},
+        "customPeriod": True
+    }
+
+def format_time(timestamp_ms) -> str:
+    """Format a millisecond timestamp the way the report shows it, e.g. 09:15 AM"""
+    return datetime.fromtimestamp(int(timestamp_ms) / 1000, REPORT_TZ).strftime("%I:%M %p")
+
+def parse_hourly_sales(body: Dict) -> List[float]:
+    """9am-10pm hourly sales from a getearningsreport response"""
+    earnings_rows = body.get('earningsRows', [])
+    return [row['earningsSum'] / 100 for row in earnings_rows[FIRST_HOUR:LAST_HOUR]]
+
+def parse_first_last_sale(receipts: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
+    """First and last sale times from a newest-first list of receipts"""
+    try:
+        if receipts:
+            return format_time(receipts[-1]['dateTS']), format_time(receipts[0]['dateTS'])
+    except Exception as e:
+        print(f"Error processing receipt timestamps: {e}")
+    return None, None
+
+def parse_waffle_end_time(body: Dict) -> Optional[str]:
+    """End of the last hour with waffle sales, from a getwaresreport response"""
+    for each in body.get('top5', []):
+        if each["name"] not in WAFFLE_ITEMS:
+            continue
+        waffle_periods = []
+        for pbw in body.get("periodsByWare", []):
+            if pbw['wareId'] == each["id"]:
+                waffle_periods = pbw.get("periodsByWare", [])
+                break
+        for info in reversed(waffle_periods):
+            if info.get('netSales', 0) > 0:
+                pre_add_time = datetime.fromtimestamp(int(info.get("to")) / 1000, REPORT_TZ)
+                return (pre_add_time + timedelta(seconds=1)).strftime("%I:%M %p")
+        return None
+    return None
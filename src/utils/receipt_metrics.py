@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.utils.ownercab import FIRST_HOUR, LAST_HOUR, TZ_OFFSET_MS, WAFFLE_ITEMS, format_time
+
+HOUR_MS = 3600000
+
+# Fields a receipt may carry its total, line items and line amount under
+TOTAL_KEYS = ('totalSum', 'total', 'sum')
+LINE_KEYS = ('lineItems', 'items', 'lines')
+LINE_AMOUNT_KEYS = ('netSales', 'sum', 'total')
+
+def _first(mapping: Dict, keys, default=None):
+    for key in keys:
+        if mapping.get(key) is not None:
+            return mapping[key]
+    return default
+
+def _sells_waffles(receipt: Dict) -> bool:
+    return any(line.get('name') in WAFFLE_ITEMS and _first(line, LINE_AMOUNT_KEYS, 0) > 0
+               for line in _first(receipt, LINE_KEYS, []))
+
+class ReceiptMetrics:
+    """
+    Everything the report needs for one outlet, computed from its receipts
+
+    Receipts can arrive in any order. add() only keeps each receipt's timestamp and total; the hourly
+    bins and the first and last sale come from one NumPy pass over those arrays when the result is read.
+    """
+
+    def __init__(self):
+        self.timestamps: List[int] = []
+        self.totals: List[float] = []
+        self.waffle_ts: Optional[int] = None
+
+    @property
+    def count(self) -> int:
+        return len(self.timestamps)
+
+    def add(self, receipt: Dict) -> None:
+        ts = int(receipt['dateTS'])
+        self.timestamps.append(ts)
+        self.totals.append(_first(receipt, TOTAL_KEYS, 0))
+        # Line items are only read for receipts that could move the waffle end later
+        if (self.waffle_ts is None or ts > self.waffle_ts) and _sells_waffles(receipt):
+            self.waffle_ts = ts
+
+    def fold(self, receipts: Iterable[Dict]) -> 'ReceiptMetrics':
+        for receipt in receipts:
+            self.add(receipt)
+        return self
+
+    def waffle_end_time(self) -> Optional[str]:
+        """End of the local hour of the last waffle sale, formatted like the wares report's value"""
+        if self.waffle_ts is None:
+            return None
+        local_hour_start = (self.waffle_ts + TZ_OFFSET_MS) // HOUR_MS * HOUR_MS - TZ_OFFSET_MS
+        return format_time(local_hour_start + HOUR_MS)
+
+    def result(self) -> Dict:
+        """The same fields all_earnings_report returns, minus name_id"""
+        timestamps = np.asarray(self.timestamps, dtype=np.int64)
+        hours = (timestamps + TZ_OFFSET_MS) // HOUR_MS % 24
+        hourly = np.bincount(hours, weights=np.asarray(self.totals, dtype=np.float64), minlength=24)
+        return {
+            'sales_list': (hourly[FIRST_HOUR:LAST_HOUR] / 100).tolist(),
+            'first_sale': format_time(timestamps.min()) if timestamps.size else None,
+            'last_sale': format_time(timestamps.max()) if timestamps.size else None,
+            'waffle_end_time': self.waffle_end_time(),
+        }
+
+def metric_mismatches(derived: Dict, reported: Dict, tolerance: float = 0.01) -> List[str]:
+    """Fields where receipt-derived values disagree with the endpoint values"""
+    mismatches = []
+    for field in ('first_sale', 'last_sale', 'waffle_end_time'):
+        if derived[field] != reported[field]:
+            mismatches.append(f"{field} {derived[field]} != {reported[field]}")
+    if reported['sales_list'] is not None:
+        for hour, (mine, theirs) in enumerate(zip(derived['sales_list'], reported['sales_list']), FIRST_HOUR):
+            if abs(mine - theirs) > tolerance:
+                mismatches.append(f"{hour}:00 sales {mine:.2f} != {theirs:.2f}")
+    return mismatches
@@ -0,0 +1,78 @@
+from typing import Callable, Dict, Generator, Iterator, List, Optional, Tuple
+
+# getreceiptsarchive pages are newest-first: offset 0 is the last sale of the day
+# A fetcher returns None (or raises) when a page could not be fetched; [] means the archive ends there
+PageFetcher = Callable[[int, int], Optional[List[Dict]]]
+
+class ReceiptPageError(Exception):
+    """A receipts page failed in transport; unlike an empty page it says nothing about where the archive ends"""
+    def __init__(self, offset: int):
+        super().__init__(f"receipts page at offset {offset} could not be fetched")
+        self.offset = offset
+
+def _checked(page: Optional[List[Dict]], offset: int) -> List[Dict]:
+    if page is None:
+        raise ReceiptPageError(offset)
+    return page
+
+def iter_receipts(fetch_page: PageFetcher, page_size: int = 200) -> Iterator[Dict]:
+    """
+    Lazily stream every receipt in the archive, newest first, one page in memory at a time
+
+    Args:
+        fetch_page: Callable taking (offset, limit) and returning that page's receipts
+        page_size: Receipts requested per call
+    """
+    offset = 0
+    while True:
+        page = _checked(fetch_page(offset, page_size), offset)
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += len(page)
+
+def first_last_search(page_size: int = 50) -> Generator[Tuple[int, int], List[Dict], Tuple[Optional[Dict], Optional[Dict]]]:
+    """
+    Sans-IO search for the oldest and newest receipt without downloading the archive
+
+    Yields (offset, limit) requests and expects each page to be sent back. The first
+    page usually covers the whole day; for busy outlets the end of the archive is
+    found by galloping then bisecting with single-receipt probes.
+    Returns (newest, oldest) receipts, or (None, None) when there are none.
+    Send None for a page that failed: the search raises ReceiptPageError rather than guess.
+    """
+    page = _checked((yield (0, page_size)), 0)
+    if not page:
+        return None, None
+    newest, oldest = page[0], page[-1]
+    if len(page) < page_size:
+        return newest, oldest
+
+    # Gallop: known non-empty offset `low`, candidate `high` doubles until it runs off the end
+    low, high = page_size - 1, page_size
+    while True:
+        page = _checked((yield (high, 1)), high)
+        if not page:
+            break
+        low, oldest = high, page[0]
+        high *= 2
+
+    # Bisect between the last non-empty and first empty offset
+    while high - low > 1:
+        middle = (low + high) // 2
+        page = _checked((yield (middle, 1)), middle)
+        if page:
+            low, oldest = middle, page[0]
+        else:
+            high = middle
+    return newest, oldest
+
+def find_first_last(fetch_page: PageFetcher, page_size: int = 50) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Run first_last_search against a blocking page fetcher"""
+    search = first_last_search(page_size)
+    try:
+        request = next(search)
+        while True:
+            request = search.send(fetch_page(*request))
+    except StopIteration as stop:
+        return stop.value
@@ -0,0 +1,105 @@
+import sys
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from src.utils.ownercab import EARNINGS_REPORT_URL, RECEIPTS_URL, WARES_URL
+
+T = TypeVar('T')
+
+TRANSIENT_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+AUTH_STATUSES = {401, 403}
+
+class TransientError(Exception):
+    """A failure worth retrying: throttling, a 5xx or a dropped connection"""
+    def __init__(self, status: Optional[int], retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}" if status else "connection error")
+        self.status = status
+        self.retry_after = retry_after
+
+class AuthError(Exception):
+    """The session was rejected; retrying with the same cookies can't help"""
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}: session rejected")
+        self.status = status
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped, honouring Retry-After"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before the given retry (1 = first retry)"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+# The hourly report decides whether an outlet makes the sheet, so it gets the most patience
+POLICIES = {
+    EARNINGS_REPORT_URL: RetryPolicy(attempts=5, base_delay=1.0),
+    RECEIPTS_URL: RetryPolicy(attempts=4, base_delay=1.0),
+    WARES_URL: RetryPolicy(attempts=3, base_delay=0.5),
+}
+DEFAULT_POLICY = RetryPolicy()
+
+def policy_for(url: str) -> RetryPolicy:
+    return POLICIES.get(url, DEFAULT_POLICY)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds, from either delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def raise_for_retry(status: int, retry_after: Optional[str] = None) -> None:
+    """Turn a response status into AuthError / TransientError where it applies"""
+    if status in AUTH_STATUSES:
+        raise AuthError(status)
+    if status in TRANSIENT_STATUSES:
+        raise TransientError(status, parse_retry_after(retry_after))
+
+def _retryable(error: Exception) -> bool:
+    # requests connection errors are OSError subclasses, and so are some of aiohttp's
+    if isinstance(error, (TransientError, OSError, asyncio.TimeoutError)):
+        return True
+    # ServerDisconnectedError (a stale keep-alive connection) and ClientPayloadError are not;
+    # aiohttp is only looked up once the async engine has loaded it
+    aiohttp = sys.modules.get('aiohttp')
+    return aiohttp is not None and isinstance(error, aiohttp.ClientError)
+
+def with_retry(send: Callable[[], T], policy: RetryPolicy, label: str = '') -> T:
+    """Call send() until it succeeds, an AuthError is raised, or the policy runs out"""
+    for attempt in range(1, policy.attempts + 1):
+        try:
+            return send()
+        except Exception as e:
+            if not _retryable(e) or attempt == policy.attempts:
+                raise
+            delay = policy.delay(attempt, getattr(e, 'retry_after', None))
+            print(f"Retrying {label} in {delay:.1f}s after {str(e)} (attempt {attempt}/{policy.attempts})")
+            time.sleep(delay)
+
+async def async_with_retry(send: Callable[[], Awaitable[T]], policy: RetryPolicy, label: str = '') -> T:
+    """Async counterpart of with_retry; sleeps without holding the caller's semaphore"""
+    for attempt in range(1, policy.attempts + 1):
+        try:
+            return await send()
+        except Exception as e:
+            if not _retryable(e) or attempt == policy.attempts:
+                raise
+            delay = policy.delay(attempt, getattr(e, 'retry_after', None))
+            print(f"Retrying {label} in {delay:.1f}s after {str(e)} (attempt {attempt}/{policy.attempts})")
+            await asyncio.sleep(delay)
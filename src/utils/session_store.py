@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import base64
+import hashlib
+from typing import Dict, List, Optional
+from cryptography.fernet import Fernet, InvalidToken
+
+class SessionStore:
+    """Encrypted on-disk store of authenticated Loyverse sessions, keyed by account email"""
+
+    def __init__(self, directory: str, key: str):
+        """
+        Args:
+            directory: Folder holding one encrypted file per account
+            key: Fernet key, or any passphrase (it is stretched into a Fernet key)
+        """
+        self.directory = directory
+        self.fernet = Fernet(self._derive_key(key))
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def _derive_key(key: str) -> bytes:
+        """Accept a ready Fernet key, otherwise derive one from the passphrase"""
+        try:
+            if len(base64.urlsafe_b64decode(key.encode())) == 32:
+                return key.encode()
+        except ValueError:
+            pass
+        return base64.urlsafe_b64encode(hashlib.sha256(key.encode()).digest())
+
+    def _path(self, email: str) -> str:
+        digest = hashlib.sha256(email.lower().encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.session")
+
+    def load(self, email: str) -> Optional[Dict]:
+        """Return the saved session for an account, or None if missing or unreadable"""
+        path = self._path(email)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                session = json.loads(self.fernet.decrypt(f.read()))
+        except (InvalidToken, ValueError) as e:
+            print(f"Discarding unreadable session for {email}: {type(e).__name__}")
+            self.delete(email)
+            return None
+        if session.get('email') != email:
+            return None
+        return session
+
+    def save(self, email: str, cookies: List[Dict], cookie_header: Optional[str], **extra) -> None:
+        """Encrypt and persist cookies plus the captured `cookie` header for an account"""
+        session = {
+            'email': email,
+            'saved_at': time.time(),
+            'cookies': [{'name': c['name'], 'value': c['value'],
+                         'domain': c.get('domain'), 'path': c.get('path', '/')} for c in cookies],
+            'cookie_header': cookie_header,
+        }
+        session.update(extra)
+        path = self._path(email)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.fernet.encrypt(json.dumps(session).encode()))
+        os.replace(tmp_path, path)
+        print(f"Session saved for {email}")
+
+    def delete(self, email: str) -> None:
+        """Forget the saved session for an account"""
+        try:
+            os.remove(self._path(email))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import zlib
+import subprocess
+from typing import Dict, List, Optional, Tuple, Any
+
+Shard = Tuple[int, int]
+
+def parse_shard(value: str) -> Shard:
+    """'2/4' as (2, 4); shards are numbered from 1"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/n, got {value!r}")
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {value} is out of range, i must be between 1 and n")
+    return index, count
+
+def shard_accounts(accounts: List[Dict], shard: Shard) -> List[Tuple[int, Dict]]:
+    """(position, account) pairs this shard runs: every n-th account, so shards stay balanced"""
+    index, count = shard
+    return [(position, account) for position, account in enumerate(accounts) if position % count == index - 1]
+
+def in_shard(outlet_id: str, shard: Shard) -> bool:
+    """Outlets are split by a hash of their id, so the split does not depend on list order"""
+    index, count = shard
+    return zlib.crc32(outlet_id.encode()) % count == index - 1
+
+def partial_path(directory: str, report_date: str, shard: Shard) -> str:
+    return os.path.join(directory, f"barHarian_{report_date}.shard-{shard[0]}-of-{shard[1]}.json")
+
+def write_partial(path: str, partial: Dict) -> str:
+    """Write a shard's result atomically, so a merge never reads half a file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(partial, f)
+    os.replace(tmp_path, path)
+    print(f"Shard {partial['shard'][0]}/{partial['shard'][1]} written to {path}")
+    return path
+
+def load_partials(directory: str, report_date: str) -> List[Dict]:
+    """Every shard file of a report day in the directory, in shard order"""
+    prefix, suffix = f"barHarian_{report_date}.shard-", '.json'
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(suffix))
+    except OSError:
+        return []
+    partials = []
+    for name in names:
+        with open(os.path.join(directory, name)) as f:
+            partials.append(json.load(f))
+    return sorted(partials, key=lambda partial: partial['shard'])
+
+def merge_partials(partials: List[Dict]) -> Tuple[List[Dict], List[int]]:
+    """
+    Combine shard results into one entry per account, independent of which shard finished first
+
+    Returns:
+        (accounts, missing) with accounts in configuration order, each holding its rows in outlet order
+        as {'email', 'error', 'failed', 'rows': [(outlet_id, row)]}, and the shard numbers with no file
+    """
+    counts = {partial['shard'][1] for partial in partials}
+    if len(counts) > 1:
+        raise ValueError(f"Shard files disagree on the shard count: {', '.join(map(str, sorted(counts)))}")
+    count = counts.pop()
+    found = {partial['shard'][0] for partial in partials}
+    missing = [index for index in range(1, count + 1) if index not in found]
+
+    accounts: Dict[int, Dict[str, Any]] = {}
+    for partial in partials:
+        for entry in partial['accounts']:
+            account = accounts.setdefault(entry['index'], {
+                'email': entry['email'], 'errors': [], 'failed': [], 'outlets': [], 'rows': []})
+            if entry['error']:
+                account['errors'].append(entry['error'])
+            account['failed'] += entry['failed']
+            # Outlet shards of one account each saw the full outlet list; keep the longest
+            if len(entry['outlets']) > len(account['outlets']):
+                account['outlets'] = entry['outlets']
+            account['rows'] += [(row['outlet_id'], row['row']) for row in entry['rows']]
+
+    merged = []
+    for index in sorted(accounts):
+        account = accounts[index]
+        position = {outlet_id: number for number, (_, outlet_id) in enumerate(account['outlets'])}
+        # sorted is stable, so rows of unlisted outlets keep their shard order at the end
+        rows = sorted(account['rows'], key=lambda row: position.get(row[0], len(position)))
+        merged.append({'email': account['email'], 'error': '; '.join(account['errors']) or None,
+                       'failed': account['failed'], 'rows': rows})
+    return merged, missing
+
+def run_local(count: int, by: str = 'account', report_date: Optional[str] = None) -> List[int]:
+    """
+    Run every shard as its own local process at once; returns the shard numbers that failed
+
+    Each process is `python -m src.cli --shard i/n`, exactly what one CI matrix job runs. Outlet shards all
+    log in to every account at once, and Chrome refuses a profile another live instance is using, so each of
+    them gets its own BROWSER_PROFILE_DIR.
+    """
+    processes = []
+    for index in range(1, count + 1):
+        command = [sys.executable, '-m', 'src.cli', '--shard', f"{index}/{count}", '--shard-by', by]
+        if report_date:
+            command += ['--date', report_date]
+        env = dict(os.environ)
+        if by == 'outlet':
+            env['BROWSER_PROFILE_DIR'] = os.path.join(os.getenv('BROWSER_PROFILE_DIR', '.profiles'), f"shard-{index}")
+        processes.append((index, subprocess.Popen(command, env=env)))
+    failed = [index for index, process in processes if process.wait() != 0]
+    for index in failed:
+        print(f"Shard {index}/{count} failed")
+    return failed
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+class Tracer:
+    """Collects timed spans from every thread of a run and exports them as JSON plus a summary table"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans: List[Dict] = []
+        self.started_at = time.time()
+
+    def record(self, name: str, start: float, seconds: float, **attrs) -> None:
+        """Add a finished span; start is a time.time() timestamp"""
+        span = {
+            'name': name,
+            'start': round(start - self.started_at, 4),
+            'seconds': round(seconds, 4),
+            'thread': threading.current_thread().name,
+        }
+        span.update(attrs)
+        with self.lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Time a block; the yielded dict can be filled with attributes (status, bytes, ...) inside it
+
+        Exceptions are recorded on the span and re-raised.
+        """
+        start_wall, start = time.time(), time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(name, start_wall, time.perf_counter() - start, **attrs)
+
+    def reset(self) -> None:
+        """Start a new run: drop the recorded spans (a long-running process traces each job on its own)"""
+        with self.lock:
+            self.spans = []
+            self.started_at = time.time()
+
+    def export_json(self, directory: str) -> str:
+        """Write the run's spans to directory/trace_<timestamp>.json and return the path"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"trace_{datetime.fromtimestamp(self.started_at):%Y%m%d_%H%M%S}.json")
+        with self.lock:
+            trace = {'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+                     'seconds': round(time.time() - self.started_at, 3),
+                     'spans': list(self.spans)}
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=1)
+        return path
+
+    def summary(self) -> List[Dict]:
+        """Per span name: count, total, mean, p95, max seconds, errors and bytes"""
+        with self.lock:
+            spans = list(self.spans)
+        by_name: Dict[str, List[Dict]] = {}
+        for span in spans:
+            by_name.setdefault(span['name'], []).append(span)
+        rows = []
+        for name, group in by_name.items():
+            seconds = sorted(span['seconds'] for span in group)
+            rows.append({
+                'name': name,
+                'count': len(group),
+                'total': sum(seconds),
+                'mean': sum(seconds) / len(seconds),
+                'p95': seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+                'max': seconds[-1],
+                'errors': sum(1 for span in group if span.get('error')),
+                'bytes': sum(span.get('bytes', 0) for span in group),
+            })
+        return sorted(rows, key=lambda row: -row['total'])
+
+    def print_summary(self) -> None:
+        rows = self.summary()
+        if not rows:
+            return
+        print("\nRun trace summary:")
+        print(f"{'span':<34}{'count':>7}{'total s':>10}{'mean s':>9}{'p95 s':>9}{'max s':>9}{'errors':>8}{'KB':>10}")
+        for row in rows:
+            print(f"{row['name']:<34}{row['count']:>7}{row['total']:>10.2f}{row['mean']:>9.3f}{row['p95']:>9.3f}"
+                  f"{row['max']:>9.3f}{row['errors']:>8}{row['bytes'] / 1024:>10.1f}")
+
+# One tracer per process; every module records into it
+tracer = Tracer()
@@ -0,0 +1,92 @@
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.ui import WebDriverWait
+
+from src.utils.tracing import tracer
+
+LOGIN_URL = 'https://loyverse.com/en/login'
+DASHBOARD_PREFIX = 'https://r.loyverse.com/dashboard'
+CHALLENGE_IFRAME = 'iframe[title="recaptcha challenge expires in two minutes"]'
+
+_timings: List[Dict] = []
+_timings_lock = threading.Lock()
+
+def wait_for(driver: WebDriver, condition: Callable[[WebDriver], Any], timeout: float, label: str,
+             poll: float = 0.2) -> Any:
+    """
+    Poll a condition until it is truthy or the timeout passes, recording how long it took
+
+    Returns:
+        The condition's value, or None on timeout (callers decide whether that is fatal)
+    """
+    start = time.perf_counter()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=poll,
+                               ignored_exceptions=(WebDriverException,)).until(condition)
+    except TimeoutException:
+        result = None
+    elapsed = time.perf_counter() - start
+    tracer.record(f"wait {label}", time.time() - elapsed, elapsed, timeout=timeout, ok=result is not None)
+    with _timings_lock:
+        _timings.append({'label': label, 'seconds': elapsed, 'timeout': timeout, 'ok': result is not None})
+    print(f"Waited {elapsed:.1f}s for {label}" + ("" if result is not None else f" (timed out after {timeout}s)"))
+    return result
+
+def wait_timings() -> List[Dict]:
+    """Every wait recorded in this process so far"""
+    with _timings_lock:
+        return list(_timings)
+
+def print_wait_summary() -> None:
+    """Per-label count, mean, max and timeouts, to tune the timeouts from real runs"""
+    by_label: Dict[str, List[Dict]] = {}
+    for timing in wait_timings():
+        by_label.setdefault(timing['label'], []).append(timing)
+    if not by_label:
+        return
+    print("\nWait timings:")
+    print(f"{'wait':<32}{'count':>6}{'mean s':>9}{'max s':>9}{'timeouts':>10}")
+    for label, timings in by_label.items():
+        seconds = [timing['seconds'] for timing in timings]
+        timeouts = sum(1 for timing in timings if not timing['ok'])
+        print(f"{label:<32}{len(seconds):>6}{sum(seconds) / len(seconds):>9.1f}{max(seconds):>9.1f}{timeouts:>10}")
+
+# Conditions
+
+def document_ready(driver: WebDriver) -> bool:
+    return driver.execute_script("return document.readyState") == "complete"
+
+def on_login_or_dashboard(driver: WebDriver) -> Optional[str]:
+    """Settled on the login page, or on the dashboard once it has called the ownercab API"""
+    url = driver.current_url
+    if url == LOGIN_URL:
+        return url
+    if url.startswith(DASHBOARD_PREFIX) and resource_requested('/data/ownercab/')(driver):
+        return url
+    return None
+
+def url_is_not(url: str) -> Callable[[WebDriver], bool]:
+    return lambda driver: driver.current_url != url
+
+def left_login_or_challenged(driver: WebDriver) -> bool:
+    """After submitting credentials: redirected away, or a captcha challenge appeared"""
+    if driver.current_url != LOGIN_URL:
+        return True
+    # querySelector instead of find_elements so the implicit wait doesn't stall each poll
+    return bool(driver.execute_script("return document.querySelector(arguments[0]) !== null;", CHALLENGE_IFRAME))
+
+def resource_requested(fragment: str) -> Callable[[WebDriver], bool]:
+    """The page has issued a request whose URL contains fragment (Resource Timing API, no proxy needed)"""
+    script = ("var fragment = arguments[0];"
+              "return performance.getEntriesByType('resource')"
+              ".some(function (entry) { return entry.name.indexOf(fragment) !== -1; });")
+    return lambda driver: bool(driver.execute_script(script, fragment))
+
+def recaptcha_ready(driver: WebDriver) -> bool:
+    """grecaptcha has registered at least one client"""
+    return bool(driver.execute_script(
+        "return typeof ___grecaptcha_cfg !== 'undefined' && "
+        "Object.keys(___grecaptcha_cfg.clients || {}).length > 0;"))
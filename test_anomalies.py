@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.utils.anomalies import RULES, AlertRules, score_outlets
+
+BUSY = [100.0 + hour for hour in range(14)]
+
+def score(sales, first=None, last=None, waffle=None, baselines=None, rules=RULES):
+    count = len(sales)
+    return score_outlets(AlertRules(rules), sales, first or ["09:05 AM"] * count, last or ["10:45 PM"] * count,
+                         waffle or ["10:30 PM"] * count, baselines)
+
+def test_clean_outlet_has_no_alerts():
+    assert score([BUSY]) == [[]]
+
+def test_each_rule_flags_its_outlet():
+    reasons = score([BUSY, [5.0] * 14, [0.0, 0.0] + BUSY[2:], BUSY, BUSY, BUSY],
+                    first=["09:05 AM", "09:05 AM", "09:05 AM", "11:20 AM", "09:05 AM", "09:05 AM"],
+                    last=["10:45 PM", "10:45 PM", "10:45 PM", "10:45 PM", "08:10 PM", "10:45 PM"],
+                    waffle=["10:30 PM", "10:30 PM", "10:30 PM", "10:30 PM", "08:00 PM", "09:00 PM"])
+    assert reasons[0] == []
+    assert reasons[1] == ["flatline"]
+    assert reasons[2] == ["no sales 9am, 10am"]
+    assert reasons[3] == ["opened 11:20 AM"]
+    assert reasons[4] == ["closed 08:10 PM"]
+    assert reasons[5] == ["waffles ended 105 min before close"]
+
+def test_baseline_needs_two_known_weeks():
+    nan = float('nan')
+    reasons = score([BUSY, BUSY], baselines=[[5000.0, 5000.0, nan, nan], [5000.0, nan, nan, nan]],
+                    rules=['baseline'])
+    assert reasons == [["sales 70% below baseline"], []]
+
+def test_ragged_and_empty_sales_do_not_abort_the_account():
+    reasons = score([BUSY, [], BUSY[:10], None, [7.0] * 12], rules=['flatline', 'zero_hours', 'late_open'],
+                    first=["09:05 AM", "11:00 AM", "09:05 AM", "11:00 AM", "09:05 AM"])
+    assert reasons[0] == []
+    # No sales data at all: nothing to judge, so no alerts
+    assert reasons[1] == [] and reasons[3] == []
+    # A short list is padded, not shifted into the next outlet's row
+    assert reasons[2] == []
+    assert reasons[4] == ["flatline"]
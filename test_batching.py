@@ -0,0 +1,60 @@
+from src.utils.batching import ReceiptBatcher, split_first_last
+
+def batch_archive(receipts_by_outlet, fail_offsets=(), requests=None):
+    """A newest-first archive over several outlets; pages at fail_offsets raise like a strict fetcher"""
+    receipts = sorted((receipt for receipts in receipts_by_outlet.values() for receipt in receipts),
+                      key=lambda receipt: -receipt['dateTS'])
+
+    def fetch_page(outlet_ids, offset, limit):
+        if requests is not None:
+            requests.append((offset, limit))
+        if offset in fail_offsets:
+            raise ConnectionError("page failed")
+        wanted = [receipt for receipt in receipts if receipt['outletId'] in outlet_ids]
+        return wanted[offset:offset + limit]
+    return fetch_page
+
+def outlet_receipts(outlet_id, count, start):
+    return [{'outletId': outlet_id, 'dateTS': start + minute * 60000} for minute in range(count)]
+
+def test_split_first_last_demultiplexes_newest_and_oldest():
+    receipts = outlet_receipts('a', 3, 0)[::-1] + outlet_receipts('b', 2, 10)[::-1]
+    receipts.sort(key=lambda receipt: -receipt['dateTS'])
+    split = split_first_last(receipts, ['a', 'b', 'c'])
+    assert split['a'] == [{'outletId': 'a', 'dateTS': 120000}, {'outletId': 'a', 'dateTS': 0}]
+    assert split['b'] == [{'outletId': 'b', 'dateTS': 60010}, {'outletId': 'b', 'dateTS': 10}]
+    assert split['c'] == []
+
+def test_split_first_last_gives_up_on_unattributable_receipts():
+    assert split_first_last([{'dateTS': 1}], ['a']) is None
+
+def test_batcher_resolves_every_outlet():
+    fetch_page = batch_archive({'a': outlet_receipts('a', 150, 0), 'b': outlet_receipts('b', 150, 30000)})
+    resolved = ReceiptBatcher(fetch_page, batch_size=20).first_last(['a', 'b', 'c'])
+    assert resolved['a'][1]['dateTS'] == 0 and resolved['b'][1]['dateTS'] == 30000
+    assert resolved['c'] == []
+
+def test_failed_page_leaves_the_chunk_to_single_outlet_requests():
+    # The second page fails: no outlet of that chunk may be reported as having no sales
+    fetch_page = batch_archive({'a': outlet_receipts('a', 150, 0), 'b': outlet_receipts('b', 150, 30000),
+                                'c': outlet_receipts('c', 5, 0)}, fail_offsets={200})
+    resolved = ReceiptBatcher(fetch_page, batch_size=2).first_last(['a', 'b', 'c'])
+    assert 'a' not in resolved and 'b' not in resolved
+    assert resolved['c'][0]['dateTS'] == 240000
+
+def test_batcher_only_reads_the_first_and_last_pages():
+    # 'a' spans the whole day, 'b' sells only at midday, 'c' only in the evening
+    requests = []
+    fetch_page = batch_archive({'a': outlet_receipts('a', 700, 0), 'b': outlet_receipts('b', 100, 300 * 60000 + 1),
+                                'c': outlet_receipts('c', 10, 690 * 60000 + 2)}, requests=requests)
+    resolved = ReceiptBatcher(fetch_page, batch_size=20).first_last(['a', 'b', 'c'])
+    assert resolved == {'a': [{'outletId': 'a', 'dateTS': 699 * 60000}, {'outletId': 'a', 'dateTS': 0}]}
+    assert [limit for _, limit in requests].count(200) == 2
+    assert len(requests) <= 8
+
+def test_large_combined_archive_is_left_to_single_outlet_requests():
+    requests = []
+    fetch_page = batch_archive({'a': outlet_receipts('a', 3000, 0), 'b': outlet_receipts('b', 3000, 1)},
+                               requests=requests)
+    assert ReceiptBatcher(fetch_page, batch_size=20, max_receipts=2000).first_last(['a', 'b']) == {}
+    assert [limit for _, limit in requests].count(200) == 1
@@ -0,0 +1,59 @@
+import os
+import time
+
+from src.utils.cache import ResponseCache, RunManifest
+
+URL = 'https://example.test/getearningsreport'
+
+def test_cache_hit_ignores_payload_key_order(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=60, max_bytes=10 ** 6)
+    cache.put(URL, {'a': 1, 'b': 2}, {'earningsRows': [1]})
+    assert cache.get(URL, {'b': 2, 'a': 1}) == {'earningsRows': [1]}
+    assert cache.get(URL, {'a': 1, 'b': 3}) is None
+
+def test_expired_entries_are_misses_and_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=60, max_bytes=10 ** 6)
+    cache.put(URL, {'day': 1}, {'rows': 1})
+    path = os.path.join(str(tmp_path), f"{ResponseCache.key(URL, {'day': 1})}.json")
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert cache.get(URL, {'day': 1}) is None
+    cache.evict()
+    assert os.listdir(str(tmp_path)) == []
+
+def test_evict_drops_the_oldest_until_it_fits(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_seconds=3600, max_bytes=60)
+    for day in range(3):
+        cache.put(URL, {'day': day}, {'rows': 'x' * 20})
+        path = os.path.join(str(tmp_path), f"{ResponseCache.key(URL, {'day': day})}.json")
+        os.utime(path, (time.time() - 100 + day, time.time() - 100 + day))
+    cache.evict()
+    assert cache.get(URL, {'day': 0}) is None
+    assert cache.get(URL, {'day': 2}) is not None
+
+def result(sales: float):
+    return {'name_id': ('Mall', 'o1'), 'sales_list': [sales] * 14, 'first_sale': '09:05', 'last_sale': '22:40',
+            'waffle_end_time': '21:30'}
+
+def test_manifest_resumes_a_run_killed_mid_sweep(tmp_path):
+    manifest = RunManifest(str(tmp_path), 'A@x', '2024-03-01', ttl_seconds=60)
+    manifest.mark_done('o1', result(5.0))
+    with open(manifest.path, 'a') as f:
+        f.write('{"outlet_id": "o2", "res')
+    # A new process for the same account and day (emails match case-insensitively)
+    resumed = RunManifest(str(tmp_path), 'a@x', '2024-03-01', ttl_seconds=60)
+    assert list(resumed.done) == ['o1']
+    assert resumed.result('o1') == {'sales_list': [5.0] * 14, 'first_sale': '09:05', 'last_sale': '22:40',
+                                    'waffle_end_time': '21:30'}
+    assert RunManifest(str(tmp_path), 'a@x', '2024-03-02', ttl_seconds=60).result('o1') is None
+
+def test_manifest_appends_one_line_per_outlet_and_expires(tmp_path):
+    manifest = RunManifest(str(tmp_path), 'a@x', '2024-03-01', ttl_seconds=60)
+    for sales in range(3):
+        manifest.mark_done(f"o{sales}", result(float(sales)))
+    with open(manifest.path) as f:
+        assert len(f.readlines()) == 3
+    old = time.time() - 120
+    os.utime(manifest.path, (old, old))
+    assert RunManifest(str(tmp_path), 'a@x', '2024-03-01', ttl_seconds=60).done == {}
+    assert not os.path.exists(manifest.path)
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.utils.cube import HOURS, SalesCube
+
+def sales(value: float):
+    return [value] * HOURS
+
+def test_query_returns_a_dense_slice(tmp_path):
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', sales(1))
+    cube.add('a@x', 'o2', 'Two', '2024-03-02', sales(2))
+    cube.add('a@x', 'o1', 'One', '2024-03-05', sales(3))
+    cube.close()
+    entries, dates, values = SalesCube(str(tmp_path)).query('2024-03-01', '2024-03-02')
+    assert [entry['name'] for entry in entries] == ['One', 'Two']
+    assert dates == ['2024-03-01', '2024-03-02']
+    assert values.shape == (2, 2, HOURS)
+    assert values[0, 0, 0] == 1 and values[1, 1, 0] == 2
+    assert np.isnan(values[0, 1]).all() and np.isnan(values[1, 0]).all()
+
+def test_refetched_day_is_updated_in_place(tmp_path):
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', sales(1))
+    cube.close()
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', sales(9))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', sales(10))
+    cube.close()
+    assert os.path.getsize(tmp_path / 'index.i4') == 8
+    _, _, values = SalesCube(str(tmp_path)).query('2024-03-01', '2024-03-01')
+    assert values[0, 0, 0] == 10
+
+def test_short_sales_list_is_padded_and_long_one_refused(tmp_path):
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', [5.0, 6.0])
+    cube.add('a@x', 'o2', 'Two', '2024-03-01', sales(7))
+    with pytest.raises(ValueError):
+        cube.add('a@x', 'o3', 'Three', '2024-03-01', sales(1) + [1.0])
+    _, _, values = cube.query('2024-03-01', '2024-03-01')
+    assert list(values[0, 0, :2]) == [5, 6] and np.isnan(values[0, 0, 2:]).all()
+    assert (values[1, 0] == 7).all()
+
+def test_torn_writes_are_dropped_on_open(tmp_path):
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', sales(1))
+    cube.add('a@x', 'o1', 'One', '2024-03-02', sales(2))
+    cube.close()
+    # A crash mid-flush: a data row without its index entry, and half an index entry
+    with open(tmp_path / 'hourly.f4', 'ab') as f:
+        f.write(np.full(HOURS, 3, dtype=np.float32).tobytes())
+    with open(tmp_path / 'index.i4', 'ab') as f:
+        f.write(b'\x00\x00\x00\x00')
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-03', sales(4))
+    _, _, values = cube.query('2024-03-01', '2024-03-03')
+    assert list(values[0, :, 0]) == [1, 2, 4]
+
+def test_outlet_filter(tmp_path):
+    cube = SalesCube(str(tmp_path))
+    cube.add('a@x', 'o1', 'One', '2024-03-01', sales(1))
+    cube.add('b@x', 'o2', 'Two', '2024-03-01', sales(2))
+    numbers = cube.outlet_numbers_matching('o2')
+    entries, _, values = cube.query('2024-03-01', '2024-03-01', numbers)
+    assert [entry['key'] for entry in entries] == ['b@x/o2']
+    assert values[0, 0, 0] == 2
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils.history import HistoryStore
+
+def row(outlet: str, hourly: float, alerts=None):
+    return [outlet, None, "09:05 AM", "09:00 PM", "10:40 PM", *([hourly] * 14), alerts]
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / 'sales.db'))
+    yield store
+    store.close()
+
+def test_rerun_upserts_the_outlet_day(history):
+    history.add('a@x', 'o1', '2024-03-01', row('Mall', 1.0))
+    history.flush()
+    history.add('a@x', 'o1', '2024-03-01', row('Mall', 2.0, 'flatline'))
+    rows = history.outlet_history('o1', '2024-03-01', '2024-03-01')
+    assert len(rows) == 1
+    assert rows[0]['sales_09'] == 2.0 and rows[0]['alerts'] == 'flatline'
+
+def test_day_totals_and_report_rows(history):
+    history.add('a@x', 'o1', '2024-03-01', row('Mall', 1.0))
+    history.add('a@x', 'o2', '2024-03-08', row('Airport', 2.0))
+    assert history.day_totals('a@x', ['o1', 'o2'], ['2024-03-01', '2024-03-08']) == \
+        {'o1': {'2024-03-01': 14.0}, 'o2': {'2024-03-08': 28.0}}
+    assert history.report_rows('2024-03-01') == {'a@x': [row('Mall', 1.0)]}
+
+def test_missing_days_finds_gaps_before_the_latest_stored_day(history):
+    days = ['2024-03-01', '2024-03-02', '2024-03-03']
+    history.add('a@x', 'o1', '2024-03-01', row('Mall', 1.0))
+    history.add('a@x', 'o1', '2024-03-03', row('Mall', 1.0))
+    history.add('a@x', 'o2', '2024-03-02', row('Airport', 1.0))
+    history.add('b@x', 'o1', '2024-03-02', row('Mall', 1.0))
+    assert history.missing_days('a@x', ['o1', 'o2'], days) == \
+        {'2024-03-01': ['o2'], '2024-03-02': ['o1'], '2024-03-03': ['o2']}
+
+def test_sync_refetches_a_gap_older_than_the_watermark(tmp_path, monkeypatch):
+    pytest.importorskip('selenium')
+    pytest.importorskip('requests')
+    from src import scraper as scraper_module
+    monkeypatch.setenv('HISTORY_DB', str(tmp_path / 'sales.db'))
+    monkeypatch.setenv('CUBE_DIR', '')
+    monkeypatch.setenv('CACHE_DIR', '')
+    monkeypatch.setenv('TRACE_DIR', str(tmp_path / 'traces'))
+    history = HistoryStore(str(tmp_path / 'sales.db'))
+    # o1 is stored on the 1st and the 3rd, so its watermark is past the failed 2nd
+    for day in ('2024-03-01', '2024-03-03'):
+        history.add('a@x', 'o1', day, row('Mall', 1.0))
+    history.close()
+
+    account = SimpleNamespace(email='a@x', error=None, name_ids=[('Mall', 'o1')])
+    account.for_date = lambda day: SimpleNamespace(email='a@x', name_ids=[], day=day)
+    fetched = []
+    monkeypatch.setattr(scraper_module, 'run_accounts', lambda *args, **kwargs: [account])
+    monkeypatch.setattr(scraper_module, 'run_day_jobs', lambda config, jobs: fetched.extend(
+        (day, scraper.name_ids) for day, scraper in jobs))
+    scraper_module.sync_history('2024-03-03', days=3)
+    assert fetched == [('2024-03-02', [('Mall', 'o1')])]
@@ -0,0 +1,36 @@
+import pytest
+
+from src.utils.job_queue import JobQueue
+
+def test_jobs_run_oldest_first_and_finish(tmp_path):
+    queue = JobQueue(str(tmp_path))
+    first = queue.enqueue('daily', report_date='2024-03-01')
+    second = queue.enqueue('outlet', outlet='Mall')
+    job = queue.claim()
+    assert job['id'] == first and job['params'] == {'report_date': '2024-03-01'}
+    queue.finish(job, True, 'barHarian_2024-03-01.xlsx')
+    job = queue.claim()
+    assert job['id'] == second
+    queue.finish(job, False, 'ValueError: no outlet')
+    assert queue.claim() is None
+    assert [job['id'] for job in queue.jobs('done')] == [first]
+    failed = queue.jobs('failed')
+    assert [job['id'] for job in failed] == [second] and failed[0]['ok'] is False
+
+def test_running_jobs_are_requeued_after_a_crash(tmp_path):
+    queue = JobQueue(str(tmp_path))
+    job_id = queue.enqueue('backfill', start_date='2024-03-01', end_date='2024-03-02')
+    assert queue.claim()['id'] == job_id
+    restarted = JobQueue(str(tmp_path))
+    assert restarted.requeue_running() == 1
+    assert restarted.claim()['id'] == job_id
+
+def test_a_job_is_claimed_once(tmp_path):
+    queue, other = JobQueue(str(tmp_path)), JobQueue(str(tmp_path))
+    queue.enqueue('daily')
+    assert queue.claim() is not None
+    assert other.claim() is None
+
+def test_unknown_kind_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        JobQueue(str(tmp_path)).enqueue('weekly')
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from benchmarks.mock_server import MockLoyverse, base_url, start_server
+from src.utils.batching import ReceiptBatcher
+from src.utils.cassette import Cassette, CassetteMiss, attach
+from src.utils.ownercab import receipts_payload
+from src.utils.receipts import find_first_last
+from src.utils.retry import TransientError
+
+DAY = '2024-03-01'
+
+@pytest.fixture
+def mock_api():
+    def serve(**options):
+        mock = MockLoyverse(**options)
+        server = start_server(mock)
+        servers.append(server)
+        return mock, f"{base_url(server)}/getreceiptsarchive"
+    servers = []
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+def page_fetcher(session, url: str):
+    """(outlet_ids, offset, limit) -> receipts, raising on a failed page like the scraper's strict fetch"""
+    def fetch_page(outlet_ids, offset, limit):
+        response = session.post(url, data=json.dumps(receipts_payload(DAY, DAY, outlet_ids, limit, offset)))
+        if response.status_code != 200:
+            raise TransientError(f"receipts page failed with status {response.status_code}")
+        return response.json()['receipts']
+    return fetch_page
+
+def expected_first_last(mock: MockLoyverse, outlet_id: str):
+    receipts = mock.outlet_receipts(outlet_id, DAY)
+    return (receipts[-1]['dateTS'], receipts[0]['dateTS']) if receipts else None
+
+def test_first_last_search_against_the_api(mock_api):
+    mock, url = mock_api(outlets=3, receipts=600)
+    fetch_page = page_fetcher(requests.session(), url)
+    for _, outlet_id in mock.outlets:
+        newest, oldest = find_first_last(lambda offset, limit: fetch_page([outlet_id], offset, limit))
+        assert (newest['dateTS'], oldest['dateTS']) == expected_first_last(mock, outlet_id)
+
+def test_failed_batched_pages_never_look_like_closed_outlets(mock_api):
+    mock, url = mock_api(outlets=40, receipts=30, error_rate=0.5)
+    outlet_ids = [outlet_id for _, outlet_id in mock.outlets]
+    resolved = ReceiptBatcher(page_fetcher(requests.session(), url), batch_size=5, workers=4).first_last(outlet_ids)
+    assert len(resolved) < len(outlet_ids)
+    for outlet_id, ends in resolved.items():
+        assert (ends[0]['dateTS'], ends[1]['dateTS']) == expected_first_last(mock, outlet_id)
+
+def test_cassette_replays_a_recorded_session_offline(mock_api, tmp_path):
+    mock, url = mock_api(outlets=2, receipts=50)
+    cassette = Cassette(str(tmp_path / 'day.jsonl.gz'))
+    cassette.meta = {'name_ids': [list(name_id) for name_id in mock.outlets]}
+    recorded = find_first_last(lambda offset, limit: page_fetcher(
+        attach(requests.session(), cassette, 'record'), url)(['outlet-00000'], offset, limit))
+    cassette.save()
+
+    replay = Cassette(str(tmp_path / 'day.jsonl.gz')).load()
+    assert replay.meta['name_ids'] == [list(name_id) for name_id in mock.outlets]
+    session = attach(requests.session(), replay, 'replay')
+    assert find_first_last(lambda offset, limit: page_fetcher(session, url)(['outlet-00000'], offset, limit)) \
+        == recorded
+    with pytest.raises(CassetteMiss):
+        page_fetcher(session, url)(['outlet-00001'], 0, 50)
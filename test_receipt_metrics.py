@@ -0,0 +1,54 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.utils.ownercab import format_time
+from src.utils.receipt_metrics import ReceiptMetrics, metric_mismatches
+
+# 2024-05-01 00:00 in Kuala Lumpur (UTC+8)
+MIDNIGHT_KL = 1714492800000
+HOUR = 3600000
+
+def receipt(hour: float, total: int, waffle: bool = False):
+    lines = [{'name': 'C1 Original Waffle', 'netSales': total}] if waffle else [{'name': 'Latte', 'netSales': total}]
+    return {'dateTS': MIDNIGHT_KL + int(hour * HOUR), 'totalSum': total, 'lineItems': lines}
+
+@pytest.fixture
+def utc_machine():
+    """Run as a UTC CI runner would"""
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = 'UTC'
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = previous
+    time.tzset()
+
+def test_metrics_bin_kuala_lumpur_hours_and_format_times_there(utc_machine):
+    receipts = [receipt(21.5, 1500), receipt(9.25, 1000), receipt(9.75, 250, waffle=True), receipt(14.9, 2000)]
+    result = ReceiptMetrics().fold(receipts).result()
+    assert result['sales_list'][0] == 12.5
+    assert result['sales_list'][14 - 9] == 20.0
+    assert result['sales_list'][21 - 9] == 15.0
+    assert sum(result['sales_list']) == 47.5
+    assert (result['first_sale'], result['last_sale']) == ('09:15 AM', '09:30 PM')
+    assert result['waffle_end_time'] == '10:00 AM'
+
+def test_format_time_ignores_the_machine_timezone(utc_machine):
+    assert format_time(MIDNIGHT_KL + 22 * HOUR + 52 * 60000) == '10:52 PM'
+
+def test_no_receipts_is_a_closed_day():
+    result = ReceiptMetrics().result()
+    assert result['sales_list'] == [0.0] * 14
+    assert result['first_sale'] is result['last_sale'] is result['waffle_end_time'] is None
+
+def test_metric_mismatches_lists_every_disagreement():
+    derived = ReceiptMetrics().fold([receipt(10, 500)]).result()
+    reported = dict(derived, last_sale='11:00 AM', sales_list=[0.0, 4.0] + [0.0] * 12)
+    assert metric_mismatches(derived, derived) == []
+    assert metric_mismatches(derived, reported) == ['last_sale 10:00 AM != 11:00 AM', '10:00 sales 5.00 != 4.00']
@@ -0,0 +1,50 @@
+import pytest
+
+from src.utils.receipts import ReceiptPageError, find_first_last, iter_receipts
+
+def archive(count: int):
+    """A newest-first receipt archive and a page fetcher over it that counts its calls"""
+    receipts = [{'receiptNumber': number, 'dateTS': 1000 * (count - number)} for number in range(count)]
+    calls = []
+
+    def fetch_page(offset, limit):
+        calls.append((offset, limit))
+        return receipts[offset:offset + limit]
+    return receipts, fetch_page, calls
+
+def test_first_last_small_archive_is_one_request():
+    receipts, fetch_page, calls = archive(7)
+    assert find_first_last(fetch_page) == (receipts[0], receipts[-1])
+    assert len(calls) == 1
+
+def test_first_last_search_finds_the_end_of_a_busy_archive():
+    for count in (50, 51, 99, 100, 101, 777, 4096):
+        receipts, fetch_page, calls = archive(count)
+        assert find_first_last(fetch_page) == (receipts[0], receipts[-1]), count
+        # Galloping plus bisecting stays logarithmic instead of downloading the archive
+        assert len(calls) < 30
+
+def test_first_last_empty_archive():
+    _, fetch_page, _ = archive(0)
+    assert find_first_last(fetch_page) == (None, None)
+
+def test_failed_page_raises_instead_of_ending_the_archive():
+    receipts, fetch_page, _ = archive(500)
+
+    def flaky(offset, limit):
+        return None if offset >= 200 else fetch_page(offset, limit)
+    with pytest.raises(ReceiptPageError):
+        find_first_last(flaky)
+    with pytest.raises(ReceiptPageError):
+        find_first_last(lambda offset, limit: None)
+
+def test_iter_receipts_streams_every_page():
+    receipts, fetch_page, calls = archive(450)
+    assert list(iter_receipts(fetch_page, page_size=200)) == receipts
+    assert [offset for offset, _ in calls] == [0, 200, 400]
+
+def test_iter_receipts_raises_on_a_failed_page():
+    _, fetch_page, _ = archive(450)
+    stream = iter_receipts(lambda offset, limit: None if offset == 200 else fetch_page(offset, limit))
+    with pytest.raises(ReceiptPageError):
+        list(stream)
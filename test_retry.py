@@ -0,0 +1,52 @@
+import sys
+import pytest
+
+from src.utils.retry import AuthError, RetryPolicy, TransientError, _retryable, parse_retry_after, raise_for_retry, with_retry
+
+def test_statuses_are_classified():
+    with pytest.raises(AuthError):
+        raise_for_retry(401)
+    with pytest.raises(TransientError) as error:
+        raise_for_retry(429, '7')
+    assert error.value.retry_after == 7
+    raise_for_retry(200)
+    raise_for_retry(404)
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+
+def test_transport_errors_are_retryable():
+    assert _retryable(TransientError(503))
+    assert _retryable(ConnectionResetError())
+    assert not _retryable(AuthError(401))
+    assert not _retryable(ValueError())
+
+def test_aiohttp_disconnects_are_retryable():
+    aiohttp = pytest.importorskip('aiohttp')
+    assert 'aiohttp' in sys.modules
+    assert _retryable(aiohttp.ServerDisconnectedError())
+    assert _retryable(aiohttp.ClientPayloadError("truncated"))
+
+def test_with_retry_stops_on_auth_and_after_the_policy():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TransientError(503, retry_after=0)
+        return 'ok'
+    assert with_retry(flaky, RetryPolicy(attempts=3)) == 'ok'
+
+    calls.clear()
+
+    def rejected():
+        calls.append(1)
+        raise AuthError(403)
+    with pytest.raises(AuthError):
+        with_retry(rejected, RetryPolicy(attempts=3))
+    assert len(calls) == 1
+
+    with pytest.raises(TransientError):
+        with_retry(lambda: raise_for_retry(502, '0'), RetryPolicy(attempts=2))
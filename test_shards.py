@@ -0,0 +1,49 @@
+import pytest
+
+from src.utils.shards import in_shard, load_partials, merge_partials, parse_shard, partial_path, write_partial
+
+OUTLETS = [['Mall', 'o1'], ['Airport', 'o2'], ['Mall', 'o3'], ['Station', 'o4']]
+
+def partial(index: int, count: int, rows, error=None, failed=()):
+    return {'report_date': '2024-03-01', 'shard': [index, count], 'by': 'outlet', 'accounts': [{
+        'index': 0, 'email': 'a@x', 'error': error, 'failed': list(failed), 'outlets': OUTLETS,
+        'rows': [{'outlet_id': outlet_id, 'row': [name, 1.0]} for name, outlet_id in rows]}]}
+
+def test_parse_shard():
+    assert parse_shard('2/4') == (2, 4)
+    for bad in ('0/4', '5/4', 'x', '1-4'):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+
+def test_every_outlet_lands_in_exactly_one_shard():
+    for outlet_id in (f"outlet-{number}" for number in range(200)):
+        assert sum(in_shard(outlet_id, (index, 3)) for index in (1, 2, 3)) == 1
+
+def test_merge_keeps_outlet_order_and_same_named_outlets(tmp_path):
+    # Two outlets called "Mall" in different shards must both survive, each under its own id
+    write_partial(partial_path(str(tmp_path), '2024-03-01', (2, 2)), partial(2, 2, [('Mall', 'o3'), ('Airport', 'o2')]))
+    write_partial(partial_path(str(tmp_path), '2024-03-01', (1, 2)),
+                  partial(1, 2, [('Station', 'o4'), ('Mall', 'o1')], failed=['o5']))
+    accounts, missing = merge_partials(load_partials(str(tmp_path), '2024-03-01'))
+    assert missing == []
+    assert [outlet_id for outlet_id, _ in accounts[0]['rows']] == ['o1', 'o2', 'o3', 'o4']
+    assert accounts[0]['failed'] == ['o5'] and accounts[0]['error'] is None
+
+def test_merge_reports_missing_shards():
+    accounts, missing = merge_partials([partial(1, 3, [('Mall', 'o1')], error='AuthError: no')])
+    assert missing == [2, 3]
+    assert accounts[0]['error'] == 'AuthError: no'
+
+def test_merge_refuses_mixed_shard_counts():
+    with pytest.raises(ValueError):
+        merge_partials([partial(1, 2, []), partial(2, 3, [])])
+
+def test_merge_command_reports_stale_shard_files(tmp_path, monkeypatch, capsys):
+    pytest.importorskip('dotenv')
+    from src.offline import merge_shards
+    monkeypatch.setenv('SHARD_DIR', str(tmp_path))
+    write_partial(partial_path(str(tmp_path), '2024-03-01', (1, 2)), partial(1, 2, []))
+    write_partial(partial_path(str(tmp_path), '2024-03-01', (1, 3)), partial(1, 3, []))
+    assert merge_shards('2024-03-01', send=False) is None
+    output = capsys.readouterr().out
+    assert 'shard-1-of-2.json' in output and 'shard-1-of-3.json' in output
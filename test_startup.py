@@ -0,0 +1,41 @@
+import os
+import sys
+import subprocess
+
+# Cumulative import time allowed for the CLI entry point, in milliseconds
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '150'))
+
+# Only the commands that scrape, export or analyse may load these
+HEAVY_MODULES = ['selenium', 'seleniumwire', 'webdriver_manager', 'bs4', 'requests', 'xlsxwriter',
+                 'aiohttp', 'numpy', 'pyarrow']
+
+def import_times(module: str):
+    """Cumulative microseconds per top-level package imported by `module`, from python -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+def test_import_budget():
+    """Importing the entry point stays under budget and loads no heavy dependency"""
+    times = import_times('src.cli')
+    loaded = sorted(name for name in times if name.split('.')[0] in HEAVY_MODULES)
+    assert not loaded, f"src.cli imports heavy modules at startup: {', '.join(loaded)}"
+    total_ms = times['src.cli'] / 1000
+    print(f"import src.cli: {total_ms:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    assert total_ms <= IMPORT_BUDGET_MS, f"import src.cli took {total_ms:.1f} ms, budget is {IMPORT_BUDGET_MS:.0f} ms"
+
+if __name__ == "__main__":
+    try:
+        test_import_budget()
+    except AssertionError as e:
+        print(f"\nStartup test failed: {e}")
+        exit(1)
+    print("\nStartup test passed!")